@@ -16,4 +16,4 @@ login.login_view = "login_page"
 login.login_message = "You must be logged in to access this page."
 login.login_message_category = "warning"
 
-from app import routes, models
+from app import routes, models, commands, query_stats, metrics
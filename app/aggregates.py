@@ -0,0 +1,241 @@
+'''Precomputed statistics tables.
+
+import_csv calls apply_games() with the ids of each batch of games it inserts. The
+batch's GamePlayers and GameMedals rows are aggregated with a few grouped queries and
+added onto the existing totals with INSERT ... ON CONFLICT DO UPDATE, so the cost of
+an import only depends on the number of games it inserts. rebuild() recomputes the
+tables from scratch (see `flask stats rebuild`).
+
+NOTE: the upserts use SQLite's dialect of INSERT ... ON CONFLICT.
+'''
+import sqlalchemy as sa
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app import db
+from app import models as m
+
+# Columns summed from GamePlayers into the StatTotals columns of the same name
+SUMMED_STATS = ['kills', 'deaths', 'assists', 'final_hits', 'damage', 'damage_blocked', 'healing']
+
+
+def get_or_empty(model, key):
+    '''Return the aggregate row with this primary key, or an unsaved row of zeros if
+    there is none yet (e.g. nothing has been imported).'''
+    row = db.session.get(model, key)
+    if row is None:
+        columns = model.__table__.columns
+        row = model(**dict(zip([c.name for c in model.__table__.primary_key], key)),
+                    **{c.name: 0 for c in columns if not c.primary_key})
+    return row
+
+
+def upsert_totals(model, rows, summed, maxed=()):
+    '''Insert rows into an aggregate table, adding the summed columns onto (and taking the
+    max of the maxed columns with) any row that already exists for the same key.'''
+    if not rows:
+        return
+    table = model.__table__
+    stmt = sqlite_insert(table)
+    set_ = {col: table.c[col] + stmt.excluded[col] for col in summed}
+    set_.update({col: sa.func.max(table.c[col], stmt.excluded[col]) for col in maxed})
+    stmt = stmt.on_conflict_do_update(index_elements=[c.name for c in table.primary_key], set_=set_)
+    db.session.execute(stmt, rows)
+
+
+def stat_sums(gp):
+    return [sa.func.sum(getattr(gp, col)).label(col) for col in SUMMED_STATS] + [
+        sa.func.sum(gp.accuracy_pct).label('accuracy_total'),
+    ]
+
+
+def medal_counts(game_ids, *group_by):
+    '''Count medals won in the given games by players who played in them, grouped by
+    Game/GamePlayers columns. Returns {group key tuple: count}.'''
+    gp, gm, g = m.GamePlayers, m.GameMedals, m.Game
+    rows = db.session.execute(
+        sa.select(*group_by, sa.func.count())
+        .select_from(gm)
+        .join(gp, sa.and_(gp.game_id == gm.game_id, gp.player_id == gm.player_id))
+        .join(g, g.id == gm.game_id)
+        .where(gm.game_id.in_(game_ids))
+        .group_by(*group_by)
+    )
+    return {tuple(row[:-1]): row[-1] for row in rows}
+
+
+def apply_player_stats(game_ids):
+    gp, g = m.GamePlayers, m.Game
+    key = (g.tournament_id, gp.team_id, gp.player_id)
+    rows = db.session.execute(
+        sa.select(
+            *key,
+            sa.func.count().label('games'),
+            *stat_sums(gp),
+            sa.func.max(gp.damage).label('max_damage'),
+            sa.func.max(gp.healing).label('max_healing'),
+            sa.func.max(gp.damage_blocked).label('max_blocked'),
+        )
+        .join(g, g.id == gp.game_id)
+        .where(gp.game_id.in_(game_ids))
+        .group_by(*key)
+    ).mappings().all()
+
+    medals = medal_counts(game_ids, *key)
+    upsert_totals(
+        m.PlayerTournamentStats,
+        [dict(row, medals=medals.get((row['tournament_id'], row['team_id'], row['player_id']), 0)) for row in rows],
+        summed=['games', *SUMMED_STATS, 'accuracy_total', 'medals'],
+        maxed=['max_damage', 'max_healing', 'max_blocked'],
+    )
+
+
+def apply_team_stats(game_ids):
+    gp, g = m.GamePlayers, m.Game
+    key = (g.tournament_id, gp.team_id)
+    rows = db.session.execute(
+        sa.select(
+            *key,
+            sa.func.count(sa.distinct(gp.game_id)).label('games'),
+            sa.func.count(sa.distinct(sa.case((g.winning_team == gp.team_id, g.id)))).label('wins'),
+            sa.func.count().label('player_rows'),
+            *stat_sums(gp),
+            sa.func.max(g.round).label('max_round'),
+        )
+        .join(g, g.id == gp.game_id)
+        .where(gp.game_id.in_(game_ids))
+        .group_by(*key)
+    ).mappings().all()
+
+    medals = medal_counts(game_ids, *key)
+    upsert_totals(
+        m.TeamTournamentStats,
+        [dict(row, medals=medals.get((row['tournament_id'], row['team_id']), 0)) for row in rows],
+        summed=['games', 'wins', 'player_rows', *SUMMED_STATS, 'accuracy_total', 'medals'],
+        maxed=['max_round'],
+    )
+
+
+def apply_player_hero_stats(game_ids):
+    gp, g = m.GamePlayers, m.Game
+    key = (g.tournament_id, gp.player_id, gp.hero_id)
+    rows = db.session.execute(
+        sa.select(
+            *key,
+            sa.func.count().label('games'),
+            sa.func.count(sa.case((g.winning_team == gp.team_id, 1))).label('wins'),
+            sa.func.count(sa.case((g.is_draw, 1))).label('draws'),
+            *stat_sums(gp),
+        )
+        .join(g, g.id == gp.game_id)
+        .where(gp.game_id.in_(game_ids))
+        .group_by(*key)
+    ).mappings().all()
+
+    medals = medal_counts(game_ids, *key)
+    upsert_totals(
+        m.PlayerHeroStats,
+        [dict(row, medals=medals.get((row['tournament_id'], row['player_id'], row['hero_id']), 0)) for row in rows],
+        summed=['games', 'wins', 'draws', *SUMMED_STATS, 'accuracy_total', 'medals'],
+    )
+
+
+def apply_meta_stats(game_ids):
+    gp, g = m.GamePlayers, m.Game
+    key = (g.tournament_id, gp.hero_id, g.map_id, g.game_mode_id)
+    rows = db.session.execute(
+        sa.select(
+            *key,
+            sa.func.count().label('games'),
+            sa.func.count(sa.case((g.winning_team == gp.team_id, 1))).label('wins'),
+            sa.func.count(sa.case((g.is_draw, 1))).label('draws'),
+            *stat_sums(gp),
+        )
+        .join(g, g.id == gp.game_id)
+        .where(gp.game_id.in_(game_ids))
+        .group_by(*key)
+    ).mappings().all()
+
+    medals = medal_counts(game_ids, *key)
+    upsert_totals(
+        m.HeroMetaStats,
+        [dict(row, medals=medals.get((row['tournament_id'], row['hero_id'], row['map_id'], row['game_mode_id']), 0)) for row in rows],
+        summed=['games', 'wins', 'draws', *SUMMED_STATS, 'accuracy_total', 'medals'],
+    )
+
+    map_key = (g.tournament_id, g.map_id, g.game_mode_id)
+    map_rows = db.session.execute(
+        sa.select(
+            *map_key,
+            sa.func.count().label('games'),
+            sa.func.count(sa.case((g.is_draw, 1))).label('draws'),
+        )
+        .where(g.id.in_(game_ids))
+        .group_by(*map_key)
+    ).mappings().all()
+    upsert_totals(m.MapMetaStats, [dict(row) for row in map_rows], summed=['games', 'draws'])
+
+
+# Columns summed for each side of a head-to-head pair, e.g. team_a_kills and team_b_kills
+HEAD_TO_HEAD_STATS = ['kills', 'deaths', 'damage', 'healing', 'damage_blocked']
+
+
+def apply_head_to_head_stats(game_ids):
+    gp, g = m.GamePlayers, m.Game
+    # Each pair of teams is stored once, with the lower team id first
+    low = sa.func.min(g.team_a_id, g.team_b_id)
+    high = sa.func.max(g.team_a_id, g.team_b_id)
+    rows = db.session.execute(
+        sa.select(
+            g.tournament_id,
+            low.label('team_a_id'),
+            high.label('team_b_id'),
+            sa.func.count(sa.distinct(g.id)).label('games'),
+            sa.func.count(sa.distinct(sa.case((g.winning_team == low, g.id)))).label('team_a_wins'),
+            sa.func.count(sa.distinct(sa.case((g.winning_team == high, g.id)))).label('team_b_wins'),
+            sa.func.count(sa.distinct(sa.case((g.is_draw, g.id)))).label('draws'),
+            *(
+                sa.func.sum(sa.case((gp.team_id == team, getattr(gp, col)), else_=0)).label(f'{side}_{col}')
+                for col in HEAD_TO_HEAD_STATS
+                for side, team in (('team_a', low), ('team_b', high))
+            ),
+        )
+        .join(gp, gp.game_id == g.id)
+        .where(g.id.in_(game_ids))
+        .group_by(g.tournament_id, low, high)
+    ).mappings().all()
+
+    upsert_totals(
+        m.HeadToHeadStats,
+        [dict(row) for row in rows],
+        summed=['games', 'team_a_wins', 'team_b_wins', 'draws',
+                *(f'{side}_{col}' for col in HEAD_TO_HEAD_STATS for side in ('team_a', 'team_b'))],
+    )
+
+
+def apply_games(game_ids):
+    '''Add newly inserted games onto every aggregate table.'''
+    game_ids = list(game_ids)
+    for i in range(0, len(game_ids), m.SQL_IN_BATCH):
+        batch = game_ids[i:i + m.SQL_IN_BATCH]
+        apply_player_stats(batch)
+        apply_team_stats(batch)
+        apply_player_hero_stats(batch)
+        apply_meta_stats(batch)
+        apply_head_to_head_stats(batch)
+
+
+def rebuild(tournament_id=None):
+    '''Recompute every aggregate table from the games, for one tournament or all of them.
+    Returns the number of games aggregated. Nothing is committed here.'''
+    for model in (m.PlayerTournamentStats, m.TeamTournamentStats, m.PlayerHeroStats, m.HeroMetaStats, m.MapMetaStats,
+                  m.HeadToHeadStats):
+        delete_stmt = sa.delete(model)
+        if tournament_id is not None:
+            delete_stmt = delete_stmt.where(model.tournament_id == tournament_id)
+        db.session.execute(delete_stmt)
+
+    game_ids_stmt = sa.select(m.Game.id).order_by(m.Game.id)
+    if tournament_id is not None:
+        game_ids_stmt = game_ids_stmt.where(m.Game.tournament_id == tournament_id)
+    game_ids = db.session.scalars(game_ids_stmt).all()
+    apply_games(game_ids)
+    return len(game_ids)
@@ -0,0 +1,167 @@
+'''Single-elimination brackets built from each tournament's games.
+
+A bracket node is one match: every game two teams played against each other in a
+round. The team that won more of those games wins the node, and a bracket edge
+links it to the next match its winner played in. import_csv calls rebuild() once
+per upload, after all its games are inserted, so pages and /api/bracket read the
+stored nodes and edges (one query) instead of working the bracket out from every
+game on each request.
+
+The final is the only match in the last round. Its winner is the champion once it
+has been decided, so a tournament that is still being played has no champion.
+'''
+from collections import defaultdict
+import sqlalchemy as sa
+from sqlalchemy.orm import aliased
+from app import db
+from app import models as m
+
+
+def build_nodes(games):
+    '''Group games, in (round, id) order, into bracket node dicts and link each decided
+    node to the next node its winner played in. Returns the nodes in bracket order and
+    {node index: next node index}.'''
+    by_match, order = {}, []
+    for game in games:
+        key = (game.round, frozenset((game.team_a_id, game.team_b_id)))
+        node = by_match.get(key)
+        if node is None:
+            node = by_match[key] = {
+                'round': game.round, 'team_a_id': game.team_a_id, 'team_b_id': game.team_b_id,
+                'team_a_wins': 0, 'team_b_wins': 0, 'draws': 0, 'winner_id': None, 'first_game': game.id,
+            }
+            order.append(node)
+        if game.is_draw or game.winning_team is None:
+            node['draws'] += 1
+        elif game.winning_team == node['team_a_id']:
+            node['team_a_wins'] += 1
+        elif game.winning_team == node['team_b_id']:
+            node['team_b_wins'] += 1
+
+    rounds = defaultdict(list)
+    for node in order:
+        if node['team_a_wins'] != node['team_b_wins']:
+            node['winner_id'] = node['team_a_id'] if node['team_a_wins'] > node['team_b_wins'] else node['team_b_id']
+        rounds[node['round']].append(node)
+
+    # A winner advances to the first match they play in a later round
+    next_node = {}
+    later_matches = {}
+    for round_number in sorted(rounds, reverse=True):
+        for node in rounds[round_number]:
+            if node['winner_id'] is not None and node['winner_id'] in later_matches:
+                next_node[id(node)] = later_matches[node['winner_id']]
+        for node in rounds[round_number]:
+            later_matches[node['team_a_id']] = later_matches[node['team_b_id']] = node
+
+    # Matches are placed under the matches that feed them, so the bracket's lines
+    # don't cross. Teams without a previous match come after, in game order.
+    nodes, placed = [], {}
+    for round_number in sorted(rounds):
+        fed_by = defaultdict(list)
+        for source, target in next_node.items():
+            fed_by[id(target)].append(placed.get(source, len(placed)))
+        round_nodes = sorted(
+            rounds[round_number],
+            key=lambda node: (min(fed_by[id(node)], default=len(placed)), node['first_game'])
+        )
+        for position, node in enumerate(round_nodes):
+            node['position'] = position
+            placed[id(node)] = len(placed)
+            nodes.append(node)
+
+    index = {id(node): i for i, node in enumerate(nodes)}
+    return nodes, {index[source]: index[id(target)] for source, target in next_node.items()}
+
+
+def rebuild(tournament_id=None):
+    '''Replace the stored bracket of one tournament, or of every tournament, with one
+    built from its games. Nothing is committed here.'''
+    g = m.Game
+    for model in (m.BracketEdge, m.BracketNode):
+        delete_stmt = sa.delete(model)
+        if tournament_id is not None:
+            delete_stmt = delete_stmt.where(model.tournament_id == tournament_id)
+        db.session.execute(delete_stmt)
+
+    games_stmt = (
+        sa.select(g.id, g.tournament_id, g.round, g.team_a_id, g.team_b_id, g.winning_team, g.is_draw)
+        .order_by(g.tournament_id, g.round, g.id)
+    )
+    if tournament_id is not None:
+        games_stmt = games_stmt.where(g.tournament_id == tournament_id)
+    games_by_tournament = defaultdict(list)
+    for game in db.session.execute(games_stmt):
+        games_by_tournament[game.tournament_id].append(game)
+
+    for tid, games in games_by_tournament.items():
+        nodes, next_node = build_nodes(games)
+        node_ids = db.session.scalars(
+            sa.insert(m.BracketNode).returning(m.BracketNode.id, sort_by_parameter_order=True),
+            [
+                {'tournament_id': tid, **{k: v for k, v in node.items() if k != 'first_game'}}
+                for node in nodes
+            ]
+        ).all()
+        if next_node:
+            db.session.execute(sa.insert(m.BracketEdge), [
+                {'tournament_id': tid, 'source_id': node_ids[source], 'target_id': node_ids[target],
+                 'team_id': nodes[source]['winner_id']}
+                for source, target in next_node.items()
+            ])
+
+
+def load(tournament_id):
+    '''The stored bracket as a dict that can be sent as JSON:
+
+    {'rounds': [{'round': n, 'matches': [match, ...]}, ...],
+     'teams': {team id: team name}, 'champion': team id or None}
+
+    where each match is {'id', 'teams': [a, b], 'wins': [a wins, b wins], 'draws',
+    'winner', 'next'}, and 'next' is the id of the match the winner plays next.'''
+    node, edge = m.BracketNode, m.BracketEdge
+    team_a, team_b = aliased(m.Team), aliased(m.Team)
+    rows = db.session.execute(
+        sa.select(node, edge.target_id, team_a.team_name, team_b.team_name)
+        .join(team_a, team_a.id == node.team_a_id)
+        .join(team_b, team_b.id == node.team_b_id)
+        .outerjoin(edge, edge.source_id == node.id)
+        .where(node.tournament_id == tournament_id)
+        .order_by(node.round, node.position)
+    ).all()
+
+    rounds, teams = [], {}
+    for row, next_id, team_a_name, team_b_name in rows:
+        teams[row.team_a_id], teams[row.team_b_id] = team_a_name, team_b_name
+        if not rounds or rounds[-1]['round'] != row.round:
+            rounds.append({'round': row.round, 'matches': []})
+        rounds[-1]['matches'].append({
+            'id': row.id,
+            'teams': [row.team_a_id, row.team_b_id],
+            'wins': [row.team_a_wins, row.team_b_wins],
+            'draws': row.draws,
+            'winner': row.winner_id,
+            'next': next_id,
+        })
+
+    final = rounds[-1]['matches'] if rounds else []
+    return {
+        'rounds': rounds,
+        'teams': teams,
+        'champion': final[0]['winner'] if len(final) == 1 else None,
+    }
+
+
+def team_status(bracket):
+    '''{team id: 'winner' or 'loser'} for the champion and the teams knocked out.
+    Teams still in a tournament that hasn't finished have no status.'''
+    status = {}
+    for round_ in bracket['rounds']:
+        for match in round_['matches']:
+            if match['winner'] is not None:
+                for team_id in match['teams']:
+                    if team_id != match['winner']:
+                        status[team_id] = 'loser'
+    if bracket['champion'] is not None:
+        status[bracket['champion']] = 'winner'
+    return status
@@ -0,0 +1,74 @@
+'''Career statistics for a player across the tournaments the viewer can see, summed
+from the player_hero_stats rollup table.'''
+import sqlalchemy as sa
+from app import db
+from app import models as m
+from app.reference_cache import reference_cache
+
+# Columns summed from player_hero_stats
+SUMMED = ['games', 'wins', 'draws', 'kills', 'deaths', 'assists', 'final_hits', 'damage',
+          'damage_blocked', 'healing', 'accuracy_total', 'medals']
+
+
+def select_visible_tournaments(user, player_id):
+    '''Select the tournaments the player has played in that the user can view.'''
+    phs = m.PlayerHeroStats
+    stmt = m.Tournament.select_with_access(user)
+    is_owner, is_shared, is_public = (stmt.selected_columns[name] for name in ('is_owner', 'is_shared', 'is_public'))
+    return stmt.where(
+        sa.or_(is_owner, is_shared, is_public),
+        m.Tournament.id.in_(sa.select(phs.tournament_id).where(phs.player_id == player_id))
+    )
+
+
+def visible_tournaments(user, player_id):
+    '''The tournaments the player has played in that the user can view, newest first.'''
+    return db.session.scalars(
+        select_visible_tournaments(user, player_id)
+        .order_by(m.Tournament.start_time.desc(), m.Tournament.id.desc())
+    ).all()
+
+
+def summarise(rows):
+    '''Sum rollup rows and add the rates shown on the career page.'''
+    totals = {column: sum(row[column] for row in rows) for column in SUMMED}
+    games = totals['games']
+    totals.update({
+        'losses': games - totals['wins'] - totals['draws'],
+        'win_rate': round(100 * totals['wins'] / games, 1) if games else 0,
+        'kda_ratio': round((totals['kills'] + totals['assists']) / max(totals['deaths'], 1), 2),
+        'avg_damage': round(totals['damage'] / games, 2) if games else 0,
+        'avg_healing': round(totals['healing'] / games, 2) if games else 0,
+        'avg_accuracy': round(totals['accuracy_total'] / games, 2) if games else 0,
+    })
+    return totals
+
+
+def career(user, player_id):
+    '''A player's career totals, their totals in each tournament and with each hero,
+    counting only the tournaments the user can view.'''
+    tournaments = visible_tournaments(user, player_id)
+    phs = m.PlayerHeroStats
+    rows = db.session.execute(
+        sa.select(phs.tournament_id, phs.hero_id, *(getattr(phs, column) for column in SUMMED))
+        # A subquery rather than the ids, which could be more than SQLite allows in one statement
+        .where(phs.player_id == player_id, phs.tournament_id.in_(
+            select_visible_tournaments(user, player_id).with_only_columns(m.Tournament.id)
+        ))
+    ).mappings().all()
+
+    by_tournament, by_hero = {}, {}
+    for row in rows:
+        by_tournament.setdefault(row['tournament_id'], []).append(row)
+        by_hero.setdefault(row['hero_id'], []).append(row)
+
+    heroes = [
+        dict(summarise(hero_rows), hero=reference_cache.get(m.Hero, hero_id))
+        for hero_id, hero_rows in by_hero.items()
+    ]
+    heroes.sort(key=lambda hero: -hero['games'])
+    return {
+        'totals': summarise(rows),
+        'tournaments': [dict(summarise(by_tournament[t.id]), tournament=t) for t in tournaments if t.id in by_tournament],
+        'heroes': heroes,
+    }
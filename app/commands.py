@@ -0,0 +1,39 @@
+# Flask CLI commands, run with `flask <group> <command>`.
+
+import click
+from app import app, db
+from app import aggregates
+from app import ratings
+from app import brackets
+
+
+@app.cli.group()
+def stats():
+    '''Manage the precomputed statistics tables.'''
+
+
+@stats.command('rebuild')
+@click.option('--tournament', 'tournament_id', type=int, default=None,
+              help='Only rebuild this tournament (default: all tournaments).')
+def rebuild_stats(tournament_id):
+    '''Recompute the statistics tables and brackets from the imported games.'''
+    try:
+        game_count = aggregates.rebuild(tournament_id)
+        brackets.rebuild(tournament_id)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    print(f"Rebuilt statistics from {game_count} games.")
+
+
+@stats.command('ratings')
+def rebuild_ratings():
+    '''Recompute every team and player rating from the imported games.'''
+    try:
+        game_count = ratings.rebuild()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    print(f"Rated {game_count} games.")
@@ -0,0 +1,75 @@
+'''Head-to-head records between teams, summed from the head_to_head_stats table.
+A pair is stored with the lower team id first and flipped to the order asked for.'''
+import sqlalchemy as sa
+from sqlalchemy.orm import aliased
+from app import db
+from app import models as m
+
+h2h = m.HeadToHeadStats
+
+# Output name -> column suffix in head_to_head_stats, see aggregates.HEAD_TO_HEAD_STATS
+STATS = {
+    'kills': 'kills',
+    'deaths': 'deaths',
+    'damage': 'damage',
+    'healing': 'healing',
+    'blocked': 'damage_blocked',
+}
+
+
+def to_dict(row, flip=False):
+    '''A pair's summed row as a record, with team B first if flip.'''
+    sides = ['team_b', 'team_a'] if flip else ['team_a', 'team_b']
+    games = row['games']
+    totals = {name: [row[f'{side}_{column}'] for side in sides] for name, column in STATS.items()}
+    return {
+        'teams': [{'id': row[f'{side}_id'], 'name': row[f'{side}_name']} for side in sides],
+        'games': games,
+        'wins': [row[f'{side}_wins'] for side in sides],
+        'draws': row['draws'],
+        'totals': totals,
+        # First team's total minus the second's, per game
+        'differentials': {name: round((a - b) / games, 2) if games else 0 for name, (a, b) in totals.items()},
+    }
+
+
+def records(tournament_id=None, team_ids=None):
+    '''Head-to-head records in one tournament, or every public tournament if
+    tournament_id is None. team_ids, a (first, second) pair, gives just that pair's
+    record; otherwise every pair that has played is returned, most games first.'''
+    team_a, team_b = aliased(m.Team), aliased(m.Team)
+    summed = ['games', 'team_a_wins', 'team_b_wins', 'draws',
+              *(f'{side}_{column}' for column in STATS.values() for side in ('team_a', 'team_b'))]
+
+    stmt = (
+        sa.select(
+            h2h.team_a_id,
+            h2h.team_b_id,
+            team_a.team_name.label('team_a_name'),
+            team_b.team_name.label('team_b_name'),
+            *(sa.func.sum(getattr(h2h, column)).label(column) for column in summed),
+        )
+        .join(team_a, team_a.id == h2h.team_a_id)
+        .join(team_b, team_b.id == h2h.team_b_id)
+        .group_by(h2h.team_a_id, h2h.team_b_id)
+    )
+    if tournament_id is not None:
+        stmt = stmt.where(h2h.tournament_id == tournament_id)
+    else:
+        # Joined rather than filtered with a subquery of public tournament ids, so a
+        # pair's rows are found with its index instead of each tournament's
+        stmt = (
+            stmt.join(m.Tournament, m.Tournament.id == h2h.tournament_id)
+            .join(m.Visibility, m.Visibility.id == m.Tournament.visibility_id)
+            .where(m.Visibility.visibility == 'public')
+        )
+    if team_ids is not None:
+        low, high = sorted(team_ids)
+        stmt = stmt.where(h2h.team_a_id == low, h2h.team_b_id == high)
+
+    rows = db.session.execute(stmt).mappings().all()
+
+    flip = team_ids is not None and team_ids[0] > team_ids[1]
+    results = [to_dict(row, flip) for row in rows]
+    results.sort(key=lambda record: -record['games'])
+    return results
@@ -0,0 +1,154 @@
+'''Background CSV import jobs.
+
+Uploaded files are saved to the spool directory (IMPORT_SPOOL_DIR) and imported by
+a local thread pool, so the request that uploaded them can return straight away with
+a job id. Progress is polled from /api/import-jobs/<id>.
+
+Jobs are tracked in memory, so a job can only be polled from the process that
+accepted the upload. Finished jobs are forgotten after JOB_RETENTION_SECONDS.
+'''
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from app import app, db
+from app import models
+from app import metrics
+from data_import import import_csv
+
+JOB_RETENTION_SECONDS = 60 * 60
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class ImportJob:
+    def __init__(self, tournament_id, user_id, path):
+        self.id = uuid.uuid4().hex
+        self.tournament_id = tournament_id
+        self.user_id = user_id
+        self.path = path
+        self.status = QUEUED
+        self.parsed_games = 0
+        self.inserted_games = 0
+        self.skipped_games = 0
+        self.inserted_rows = 0
+        self.duplicate_file = False
+        self.errors = []
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.future = None
+
+    @property
+    def is_finished(self):
+        return self.status in (DONE, FAILED)
+
+    @property
+    def elapsed(self):
+        '''Seconds spent importing so far, or in total once finished.'''
+        if self.started_at is None:
+            return 0
+        return (self.finished_at or time.time()) - self.started_at
+
+    def update_progress(self, summary):
+        self.parsed_games = summary.parsed_games
+        self.inserted_games = summary.inserted_games
+        self.skipped_games = summary.skipped_games
+        self.inserted_rows = summary.inserted_rows
+        self.duplicate_file = summary.duplicate_file
+
+    def wait(self, timeout=None):
+        '''Block until the job has finished (mainly for tests and scripts).'''
+        self.future.result(timeout=timeout)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'tournament_id': self.tournament_id,
+            'status': self.status,
+            'parsed_games': self.parsed_games,
+            'inserted_games': self.inserted_games,
+            'skipped_games': self.skipped_games,
+            'inserted_rows': self.inserted_rows,
+            'duplicate_file': self.duplicate_file,
+            'errors': self.errors,
+            'elapsed': round(self.elapsed, 3),
+        }
+
+
+class ImportJobQueue:
+    def __init__(self, app):
+        self.app = app
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = None
+
+    @property
+    def executor(self):
+        # Created on first use so IMPORT_WORKERS can be changed after import (e.g. in tests)
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.app.config['IMPORT_WORKERS'],
+                    thread_name_prefix='csv-import'
+                )
+            return self._executor
+
+    def submit(self, tournament_id, user_id, csv_file):
+        '''Save an uploaded file (anything with a .save(path) method) to the spool
+        directory and queue it for import. Returns the new ImportJob.'''
+        spool_dir = self.app.config['IMPORT_SPOOL_DIR']
+        os.makedirs(spool_dir, exist_ok=True)
+
+        job = ImportJob(tournament_id, user_id, None)
+        job.path = os.path.join(spool_dir, f"{job.id}.csv")
+        csv_file.save(job.path)
+        metrics.record_upload(job.path)
+
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        job.future = self.executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _prune(self):
+        cutoff = time.time() - JOB_RETENTION_SECONDS
+        for job_id in [j.id for j in self._jobs.values() if j.is_finished and j.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def _run(self, job):
+        job.status = RUNNING
+        job.started_at = time.time()
+        status = FAILED
+        with self.app.app_context():
+            try:
+                tournament = db.session.get(models.Tournament, job.tournament_id)
+                if not tournament:
+                    raise ValueError(f"Tournament with ID {job.tournament_id} not found.")
+                import_csv(job.path, tournament=tournament, commit_changes=True, progress=job.update_progress)
+                status = DONE
+
+            except Exception as e:
+                db.session.rollback()
+                job.errors.append(str(e))
+
+            finally:
+                db.session.remove()
+                try:
+                    os.remove(job.path)
+                except OSError:
+                    pass
+                # finished_at must be set before the job counts as finished
+                job.finished_at = time.time()
+                job.status = status
+
+
+import_jobs = ImportJobQueue(app)
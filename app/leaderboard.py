@@ -0,0 +1,105 @@
+'''Tournament leaderboards.
+
+Players are ranked on every metric at once with SQL window functions over the
+precomputed player_tournament_stats table (see app/aggregates.py). The query reads one
+row per player and team instead of every game, and sorting or paging by any metric
+costs the same. A player's percentile is cume_dist() over the tournament's players,
+i.e. the percentage of players with the same value or lower.
+'''
+import sqlalchemy as sa
+from app import db
+from app import models as m
+
+# Leaderboard columns: metric name -> heading
+METRICS = {
+    'kills': 'Kills',
+    'damage': 'Damage',
+    'healing': 'Healing',
+    'blocked': 'Blocked',
+    'accuracy': 'Accuracy',
+    'final_hits': 'Final Hits',
+    'kda': 'KDA',
+}
+DEFAULT_METRIC = 'kills'
+
+# Page size when no limit is given, and the largest allowed
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def player_totals(tournament_id):
+    '''Each player's totals over every team they played for in the tournament.'''
+    ps = m.PlayerTournamentStats
+    columns = ['games', 'kills', 'deaths', 'assists', 'final_hits', 'damage', 'damage_blocked', 'healing', 'accuracy_total']
+    return (
+        sa.select(ps.player_id, *(sa.func.sum(getattr(ps, col)).label(col) for col in columns))
+        .where(ps.tournament_id == tournament_id)
+        .group_by(ps.player_id)
+        .subquery()
+    )
+
+
+def metric_values(totals):
+    '''{metric name: SQL expression} for a player_totals() subquery.'''
+    c = totals.c
+    return {
+        'kills': c.kills,
+        'damage': c.damage,
+        'healing': c.healing,
+        'blocked': c.damage_blocked,
+        'accuracy': sa.cast(c.accuracy_total, sa.Float) / c.games,
+        'final_hits': c.final_hits,
+        # SQLite's two argument max() is the larger of its arguments
+        'kda': sa.cast(c.kills + c.assists, sa.Float) / sa.func.max(c.deaths, 1),
+    }
+
+
+def ranked(tournament_id):
+    '''One row per player with each metric's value, rank (1 is best, ties share a rank)
+    and percentile, and the number of players in the tournament.'''
+    totals = player_totals(tournament_id)
+    values = metric_values(totals)
+    return sa.select(
+        totals.c.player_id,
+        totals.c.games,
+        sa.func.count().over().label('players'),
+        *(value.label(name) for name, value in values.items()),
+        *(sa.func.rank().over(order_by=value.desc()).label(f'{name}_rank') for name, value in values.items()),
+        *(sa.func.cume_dist().over(order_by=value).label(f'{name}_percentile') for name, value in values.items()),
+    ).subquery()
+
+
+def page(tournament_id, sort=DEFAULT_METRIC, offset=0, limit=PAGE_SIZE):
+    '''A page of the leaderboard sorted by a metric, best first.
+    Returns (rows as dicts, total number of players).'''
+    if sort not in METRICS:
+        sort = DEFAULT_METRIC
+    board = ranked(tournament_id)
+    rows = db.session.execute(
+        sa.select(board, m.Player.gamertag)
+        .join(m.Player, m.Player.id == board.c.player_id)
+        .order_by(board.c[f'{sort}_rank'], m.Player.gamertag, board.c.player_id)
+        .offset(offset)
+        .limit(limit)
+    ).mappings().all()
+
+    total = rows[0]['players'] if rows else db.session.scalar(
+        sa.select(sa.func.count()).select_from(player_totals(tournament_id))
+    )
+    return [to_dict(row) for row in rows], total
+
+
+def to_dict(row):
+    return {
+        'player_id': row['player_id'],
+        'gamertag': row['gamertag'],
+        'games': row['games'],
+        'metrics': {
+            name: {
+                'value': round(row[name], 2) if name in ('accuracy', 'kda') else row[name],
+                'rank': row[f'{name}_rank'],
+                'percentile': round(100 * row[f'{name}_percentile']),
+            }
+            for name in METRICS
+        },
+    }
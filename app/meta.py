@@ -0,0 +1,112 @@
+'''Hero, map and game mode meta statistics, sliced from the hero_meta_stats and
+map_meta_stats cube tables.'''
+import sqlalchemy as sa
+from app import db
+from app import models as m
+from app.reference_cache import reference_cache
+
+hm, mm = m.HeroMetaStats, m.MapMetaStats
+
+# Dimension name -> (cube column, reference model, name column)
+DIMENSIONS = {
+    'hero': (hm.hero_id, m.Hero, 'hero_name'),
+    'role': (m.Hero.hero_role_id, m.HeroRole, 'role_name'),
+    'map': (hm.map_id, m.Map, 'map_name'),
+    'mode': (hm.game_mode_id, m.GameMode, 'game_mode_name'),
+}
+# Picks a hero can have in one game (one per team), and picks of any hero. Hero slices
+# use the first, other slices (roles, maps, modes) the second, so a role's pick rates add up to 1.
+HERO_PICKS_PER_GAME = 2
+PICKS_PER_GAME = 12
+
+# The same dimensions in map_meta_stats, which has no hero
+MAP_DIMENSIONS = {'map': mm.map_id, 'mode': mm.game_mode_id}
+
+# Averages per pick: output name -> summed column
+AVERAGES = {
+    'kills': 'kills',
+    'deaths': 'deaths',
+    'assists': 'assists',
+    'final_hits': 'final_hits',
+    'damage': 'damage',
+    'healing': 'healing',
+    'blocked': 'damage_blocked',
+    'accuracy': 'accuracy_total',
+    'medals': 'medals',
+}
+
+
+def public_tournament_ids():
+    '''A subquery of the ids of every public tournament.'''
+    return (
+        sa.select(m.Tournament.id)
+        .join(m.Visibility, m.Visibility.id == m.Tournament.visibility_id)
+        .where(m.Visibility.visibility == 'public')
+    )
+
+
+def meta_slice(group_by, filters=None, tournament_id=None):
+    '''Meta statistics grouped by the dimensions in group_by (e.g. ['hero', 'map']),
+    keeping cube rows whose dimensions match filters ({dimension: id}). Covers one
+    tournament, or every public tournament if tournament_id is None.
+    Returns a list of dicts, most picked first.'''
+    filters = filters or {}
+    group_columns = [DIMENSIONS[name][0].label(f'{name}_id') for name in group_by]
+
+    def scope(column):
+        if tournament_id is not None:
+            return column == tournament_id
+        return column.in_(public_tournament_ids())
+
+    rows = db.session.execute(
+        sa.select(
+            *group_columns,
+            sa.func.sum(hm.games).label('picks'),
+            sa.func.sum(hm.wins).label('wins'),
+            sa.func.sum(hm.draws).label('draws'),
+            *(sa.func.sum(getattr(hm, column)).label(column) for column in set(AVERAGES.values())),
+        )
+        .join(m.Hero, m.Hero.id == hm.hero_id)
+        .where(scope(hm.tournament_id), *(DIMENSIONS[name][0] == value for name, value in filters.items()))
+        .group_by(*group_columns)
+    ).mappings().all()
+
+    # Games played in each map/mode slice, for the pick rates. Hero filters don't apply.
+    map_group = [name for name in group_by if name in MAP_DIMENSIONS]
+    map_columns = [MAP_DIMENSIONS[name].label(f'{name}_id') for name in map_group]
+    games = {
+        tuple(row[:-1]): row[-1] for row in db.session.execute(
+            sa.select(*map_columns, sa.func.sum(mm.games))
+            .where(scope(mm.tournament_id), *(
+                MAP_DIMENSIONS[name] == value for name, value in filters.items() if name in MAP_DIMENSIONS
+            ))
+            .group_by(*map_columns)
+        )
+    }
+
+    picks_per_game = HERO_PICKS_PER_GAME if 'hero' in group_by else PICKS_PER_GAME
+    results = []
+    for row in rows:
+        picks = row['picks']
+        if not picks:
+            # Nothing has been imported in scope
+            continue
+        game_count = games.get(tuple(row[f'{name}_id'] for name in map_group), 0)
+        result = {}
+        for name in group_by:
+            _, model, name_column = DIMENSIONS[name]
+            reference = reference_cache.get(model, row[f'{name}_id'])
+            result[name] = {'id': row[f'{name}_id'], 'name': getattr(reference, name_column, None)}
+        result.update({
+            'games': game_count,
+            'picks': picks,
+            'pick_rate': round(picks / (picks_per_game * game_count), 4) if game_count else 0,
+            'wins': row['wins'],
+            'draws': row['draws'],
+            'win_rate': round(row['wins'] / picks, 4) if picks else 0,
+            'averages': {name: round(row[column] / picks, 2) if picks else 0 for name, column in AVERAGES.items()},
+        })
+        results.append(result)
+
+    results.sort(key=lambda result: -result['picks'])
+    return results
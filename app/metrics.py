@@ -0,0 +1,206 @@
+'''Request latency and import throughput metrics, served at /metrics in Prometheus'
+text format.
+
+Each process adds its measurements to an in-memory registry, guarded by a lock since
+requests and import jobs run on several threads. Every FLUSH_SECONDS the registry's
+changes are added onto the totals in a small SQLite file (METRICS_DB, see
+config.py) shared by every process, and /metrics reads the totals back from it. So a
+scrape counts the requests served by all the processes, not just the one answering it.
+
+Every series is a running total. A histogram is stored the way Prometheus exposes it:
+a _bucket series for each upper bound (le), plus _sum and _count.
+
+The file is written with the sqlite3 module rather than db.engine, so flushes don't
+show up in the statements counted by app/query_stats.py.
+
+/metrics is only served to requests with METRICS_TOKEN as their bearer token, see
+metrics_authorised.
+'''
+import atexit
+import hmac
+import os
+import sqlite3
+import threading
+import time
+from flask import g, request
+from flask.signals import before_render_template, template_rendered
+from app import app
+
+FLUSH_SECONDS = 5
+
+# Upper bounds of the histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+ROWS_PER_SECOND_BUCKETS = (1_000, 5_000, 10_000, 25_000, 50_000, 100_000, 250_000, 500_000)
+SIZE_BUCKETS = (10_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+
+# Metric name -> (type, help text, histogram buckets)
+METRICS = {
+    'http_requests_total': ('counter', 'Requests served, by endpoint, method and status.', None),
+    'http_request_duration_seconds': ('histogram', 'Time taken to serve a request, by endpoint.', LATENCY_BUCKETS),
+    'http_request_db_seconds': ('histogram', 'Time spent running SQL statements during a request, by endpoint.', LATENCY_BUCKETS),
+    'http_request_db_statements_total': ('counter', 'SQL statements run by requests, by endpoint.', None),
+    'template_render_seconds': ('histogram', 'Time taken to render a template, by template.', LATENCY_BUCKETS),
+    'import_rows_total': ('counter', 'Game, player and medal rows inserted by CSV imports.', None),
+    'import_seconds_total': ('counter', 'Time spent importing CSVs.', None),
+    'import_rows_per_second': ('histogram', 'Rows inserted per second by each CSV import.', ROWS_PER_SECOND_BUCKETS),
+    'upload_size_bytes': ('histogram', 'Size of uploaded CSV files.', SIZE_BUCKETS),
+}
+
+
+def format_labels(labels):
+    '''{name: value} as a Prometheus label set, e.g. {endpoint="home",method="GET"}.'''
+    if not labels:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels.items()
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Registry:
+    def __init__(self, app):
+        self.app = app
+        self._lock = threading.Lock()
+        # (series name, label set) -> amount added since the last flush
+        self._pending = {}
+        self._last_flush = time.monotonic()
+
+    def _add(self, name, labels, amount):
+        key = (name, labels)
+        self._pending[key] = self._pending.get(key, 0) + amount
+
+    def inc(self, name, amount=1, **labels):
+        with self._lock:
+            self._add(name, format_labels(labels), amount)
+        self.maybe_flush()
+
+    def observe(self, name, value, **labels):
+        '''Add a value to a histogram.'''
+        buckets = METRICS[name][2]
+        with self._lock:
+            # Every bucket is written, so each has a series even before a value falls in it
+            for bound in buckets:
+                self._add(f'{name}_bucket', format_labels({**labels, 'le': bound}), 1 if value <= bound else 0)
+            self._add(f'{name}_bucket', format_labels({**labels, 'le': '+Inf'}), 1)
+            self._add(f'{name}_sum', format_labels(labels), value)
+            self._add(f'{name}_count', format_labels(labels), 1)
+        self.maybe_flush()
+
+    def connect(self):
+        path = self.app.config['METRICS_DB']
+        if not path:
+            os.makedirs(self.app.instance_path, exist_ok=True)
+            path = os.path.join(self.app.instance_path, 'metrics.db')
+        connection = sqlite3.connect(path, timeout=10)
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS metric (name TEXT, labels TEXT, value REAL, PRIMARY KEY (name, labels))'
+        )
+        return connection
+
+    def maybe_flush(self):
+        if time.monotonic() - self._last_flush >= FLUSH_SECONDS:
+            self.flush()
+
+    def flush(self):
+        '''Add this process's changes since the last flush onto the shared totals.'''
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        if not pending:
+            return
+        try:
+            connection = self.connect()
+            try:
+                with connection:
+                    connection.executemany(
+                        'INSERT INTO metric (name, labels, value) VALUES (?, ?, ?) '
+                        'ON CONFLICT (name, labels) DO UPDATE SET value = value + excluded.value',
+                        [(name, labels, value) for (name, labels), value in pending.items()]
+                    )
+            finally:
+                connection.close()
+        except sqlite3.Error as e:
+            # Keep the changes for the next flush rather than losing them
+            with self._lock:
+                for key, value in pending.items():
+                    self._pending[key] = self._pending.get(key, 0) + value
+            self.app.logger.warning("Failed to write metrics: %s", e)
+
+    def render(self):
+        '''Every process's totals in Prometheus' text format.'''
+        self.flush()
+        connection = self.connect()
+        try:
+            rows = connection.execute('SELECT name, labels, value FROM metric ORDER BY name, labels').fetchall()
+        finally:
+            connection.close()
+
+        series = {}
+        for name, labels, value in rows:
+            series.setdefault(name, []).append((labels, value))
+
+        lines = []
+        for name, (metric_type, help_text, buckets) in METRICS.items():
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {metric_type}']
+            names = [f'{name}_bucket', f'{name}_sum', f'{name}_count'] if buckets else [name]
+            for series_name in names:
+                lines += [f'{series_name}{labels} {format_value(value)}' for labels, value in series.get(series_name, [])]
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Registry(app)
+atexit.register(metrics.flush)
+
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_request(response):
+    endpoint = request.endpoint or 'unmatched'
+    metrics.inc('http_requests_total', endpoint=endpoint, method=request.method, status=response.status_code)
+    if 'request_start' in g:
+        metrics.observe('http_request_duration_seconds', time.perf_counter() - g.request_start, endpoint=endpoint)
+    # Counted by app/query_stats.py
+    metrics.observe('http_request_db_seconds', g.get('query_ms', 0.0) / 1000, endpoint=endpoint)
+    metrics.inc('http_request_db_statements_total', g.get('query_count', 0), endpoint=endpoint)
+    return response
+
+
+def start_template_timer(sender, template, context, **extra):
+    g.setdefault('template_starts', []).append(time.perf_counter())
+
+
+def record_template(sender, template, context, **extra):
+    starts = g.get('template_starts')
+    if starts:
+        metrics.observe('template_render_seconds', time.perf_counter() - starts.pop(), template=template.name)
+
+
+before_render_template.connect(start_template_timer, app)
+template_rendered.connect(record_template, app)
+
+
+def metrics_authorised(authorization, token):
+    '''Whether an Authorization header carries the bearer token, compared in constant time.'''
+    scheme, _, given = authorization.partition(' ')
+    return scheme.lower() == 'bearer' and hmac.compare_digest(given.strip().encode(), token.encode())
+
+
+def record_import(rows, seconds):
+    '''Called by import_csv with the rows one file inserted and how long it took.'''
+    metrics.inc('import_rows_total', rows)
+    metrics.inc('import_seconds_total', seconds)
+    if rows and seconds > 0:
+        metrics.observe('import_rows_per_second', rows / seconds)
+
+
+def record_upload(path):
+    metrics.observe('upload_size_bytes', os.path.getsize(path))
@@ -1,6 +1,6 @@
 from typing import Optional
 import sqlalchemy as sa
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy.orm import Mapped, mapped_column, relationship, aliased
 from datetime import datetime, timezone
 from app import db, login
 from werkzeug.security import generate_password_hash, check_password_hash
@@ -13,6 +13,10 @@ from app.consts import *
 # as a TEXT type. If this were needed to be ported to another database, it would be
 # better to use a specific type and specify the length, e.g. String(256).
 
+# SQLite only allows a limited number of bound parameters per statement,
+# so large IN (...) lookups are split into batches of this size.
+SQL_IN_BATCH = 500
+
 # Create a base model inheriting from the db.Model
 # so that we can define custom methods shared by all models.
 class BaseModel(db.Model):
@@ -43,6 +47,31 @@ class BaseModel(db.Model):
         db.session.commit()
         print(f'Inserted {insertions} records. Skipped {already_exist} records.')
 
+    @classmethod
+    def get_ids(cls, field_name, values):
+        '''Return a {value: id} dict for every row whose field matches one of the values.
+        Runs one query per SQL_IN_BATCH values rather than one per value.'''
+        field = cls.get_field(field_name)
+        values = list(values)
+        ids = {}
+        for i in range(0, len(values), SQL_IN_BATCH):
+            rows = db.session.execute(
+                sa.select(field, cls.id).where(field.in_(values[i:i + SQL_IN_BATCH]))
+            )
+            ids.update({value: row_id for value, row_id in rows})
+        return ids
+
+    @classmethod
+    def get_or_create_ids(cls, field_name, values):
+        '''Like get_ids, but bulk inserts any values that don't exist yet.'''
+        values = list(dict.fromkeys(values))
+        ids = cls.get_ids(field_name, values)
+        missing = [v for v in values if v not in ids]
+        if missing:
+            db.session.execute(sa.insert(cls), [{field_name: v} for v in missing])
+            ids.update(cls.get_ids(field_name, missing))
+        return ids
+
 class Team(BaseModel):
     id: Mapped[int] = mapped_column(primary_key=True)
     team_name: Mapped[str] = mapped_column(sa.Text, unique=True, index=True)
@@ -86,6 +115,9 @@ class RolePermissions(BaseModel):
     permission_id: Mapped[int] = mapped_column(sa.ForeignKey(Permission.id), primary_key=True)
 
 class User(UserMixin, BaseModel):
+    # For case insensitive username prefix searches
+    __table_args__ = (sa.Index('ix_user_username_lower', sa.text('lower(username)')),)
+
     id: Mapped[int] = mapped_column(primary_key=True)
     username: Mapped[str] = mapped_column(sa.Text, index=True, unique=True)
     password_hash: Mapped[Optional[str]] = mapped_column(sa.Text)
@@ -129,6 +161,15 @@ class Tournament(BaseModel):
     visibility: Mapped["Visibility"] = relationship("Visibility", back_populates="tournaments")
     users: Mapped[list["TournamentUsers"]] = relationship("TournamentUsers", back_populates="tournament", cascade="all, delete-orphan")
     games: Mapped[list["Game"]] = relationship("Game", back_populates="tournament", cascade="all, delete-orphan")
+    uploads: Mapped[list["TournamentUpload"]] = relationship("TournamentUpload", back_populates="tournament", cascade="all, delete-orphan")
+    player_stats: Mapped[list["PlayerTournamentStats"]] = relationship("PlayerTournamentStats", back_populates="tournament", cascade="all, delete-orphan")
+    team_stats: Mapped[list["TeamTournamentStats"]] = relationship("TeamTournamentStats", back_populates="tournament", cascade="all, delete-orphan")
+    player_hero_stats: Mapped[list["PlayerHeroStats"]] = relationship("PlayerHeroStats", back_populates="tournament", cascade="all, delete-orphan")
+    hero_meta_stats: Mapped[list["HeroMetaStats"]] = relationship("HeroMetaStats", back_populates="tournament", cascade="all, delete-orphan")
+    map_meta_stats: Mapped[list["MapMetaStats"]] = relationship("MapMetaStats", back_populates="tournament", cascade="all, delete-orphan")
+    head_to_head_stats: Mapped[list["HeadToHeadStats"]] = relationship("HeadToHeadStats", back_populates="tournament", cascade="all, delete-orphan")
+    bracket_nodes: Mapped[list["BracketNode"]] = relationship("BracketNode", back_populates="tournament", cascade="all, delete-orphan")
+    bracket_edges: Mapped[list["BracketEdge"]] = relationship("BracketEdge", back_populates="tournament", cascade="all, delete-orphan")
 
     def __repr__(self):
         return f"<Tournament '{self.title}'>"
@@ -147,25 +188,46 @@ class Tournament(BaseModel):
 
     def get_user_role(self, user):
         '''Return the user's role for this tournamnet, if any. Returns None otherwise.'''
-        if not user.is_authenticated or user not in [tu.user for tu in self.users]:
+        role_id = permissions.tournament_role_id(user, self.id)
+        if role_id is None:
             return None
-        
-        tournament_user = db.session.query(TournamentUsers).filter_by(user_id=user.id, tournament_id=self.id).first()
-        if not tournament_user:
-            return None
-        
-        return tournament_user.tournament_role
+        return db.session.get(Role, role_id)
 
     def user_has_permission(self, user, permission):
         '''Check if a user has a permission on this tournament. '''
-        tournament_role = self.get_user_role(user)
-        if not tournament_role:
-            return False
-        if permission in [p.permission for p in tournament_role.permissions]:
-            return True
-        return False
-        
+        return permissions.has_permission(user, self.id, permission)
+
+    @classmethod
+    def select_with_access(cls, user):
+        '''Select tournaments along with is_owner, is_shared and is_public columns for a user,
+        matching get_user_role/user_has_permission but computed in SQL for every row at once.'''
+        user_id = user.id if user.is_authenticated else None
+        tournament_user = aliased(TournamentUsers)
+        role = aliased(Role)
+
+        can_read = sa.exists().where(
+            RolePermissions.role_id == tournament_user.tournament_role_id,
+            RolePermissions.permission_id == Permission.id,
+            Permission.permission == PERMISSION.READ
+        )
+        is_owner = sa.func.coalesce(role.role_name == ROLE.OWNER, False)
+        is_shared = sa.and_(can_read, sa.not_(is_owner))
+        is_public = Visibility.visibility == 'public'
+
+        return (
+            sa.select(cls, is_owner.label('is_owner'), is_shared.label('is_shared'), is_public.label('is_public'))
+            .join(Visibility, cls.visibility_id == Visibility.id)
+            .outerjoin(tournament_user, sa.and_(
+                tournament_user.tournament_id == cls.id,
+                tournament_user.user_id == user_id
+            ))
+            .outerjoin(role, role.id == tournament_user.tournament_role_id)
+        )
+
 class TournamentUsers(BaseModel):
+    # The primary key covers lookups by tournament, this covers lookups by user
+    __table_args__ = (sa.Index('ix_tournament_users_user_id_tournament_id', 'user_id', 'tournament_id'),)
+
     tournament_id: Mapped[int] = mapped_column(sa.ForeignKey(Tournament.id), primary_key=True)
     user_id: Mapped[int] = mapped_column(sa.ForeignKey(User.id), primary_key=True)
     tournament_role_id: Mapped[int] = mapped_column(sa.ForeignKey(Role.id))
@@ -174,6 +236,22 @@ class TournamentUsers(BaseModel):
     user: Mapped["User"] = relationship("User", back_populates="tournaments")
     tournament_role: Mapped["Role"] = relationship("Role")
 
+class TournamentUpload(BaseModel):
+    '''A CSV file that has been imported into a tournament, identified by its SHA-256.'''
+    __table_args__ = (sa.UniqueConstraint('tournament_id', 'sha256'),)
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    tournament_id: Mapped[int] = mapped_column(sa.ForeignKey(Tournament.id))
+    sha256: Mapped[str] = mapped_column(sa.Text)
+    uploaded_at: Mapped[datetime] = mapped_column(sa.DateTime, default=lambda: datetime.now(timezone.utc))
+    games_inserted: Mapped[int]
+    games_skipped: Mapped[int]
+
+    tournament: Mapped["Tournament"] = relationship("Tournament", back_populates="uploads")
+
+    def __repr__(self):
+        return f"<TournamentUpload '{self.sha256}'>"
+
 class GameMode(BaseModel):
     id: Mapped[int] = mapped_column(primary_key=True)
     game_mode_name: Mapped[str] = mapped_column(sa.Text, unique=True)
@@ -194,6 +272,15 @@ class Map(BaseModel):
         return f"<Map '{self.map_name}'>"
 
 class Game(BaseModel):
+    # A game is only imported once per tournament, see data_import.game_fingerprint
+    __table_args__ = (
+        sa.Index('ix_game_tournament_id_fingerprint', 'tournament_id', 'fingerprint', unique=True),
+        # Games are always listed per tournament, usually in round order
+        sa.Index('ix_game_tournament_id_round', 'tournament_id', 'round'),
+        sa.Index('ix_game_team_a_id', 'team_a_id'),
+        sa.Index('ix_game_team_b_id', 'team_b_id'),
+    )
+
     id: Mapped[int] = mapped_column(primary_key=True)
     tournament_id: Mapped[int] = mapped_column(sa.ForeignKey(Tournament.id))
     round: Mapped[int]
@@ -205,6 +292,8 @@ class Game(BaseModel):
     is_draw: Mapped[bool] = mapped_column(sa.Boolean)
     game_mode_id: Mapped[int] = mapped_column(sa.ForeignKey(GameMode.id))
     map_id: Mapped[int] = mapped_column(sa.ForeignKey(Map.id))
+    # SHA-256 of the game's round, teams and player rows in the uploaded CSV
+    fingerprint: Mapped[Optional[str]] = mapped_column(sa.Text, nullable=True)
     
     game_mode: Mapped["GameMode"] = relationship("GameMode")
     map: Mapped["Map"] = relationship("Map")
@@ -228,6 +317,9 @@ class Medal(BaseModel):
 
 
 class GameMedals(BaseModel):
+    # The primary key covers lookups by game, this covers lookups by player
+    __table_args__ = (sa.Index('ix_game_medals_player_id_game_id', 'player_id', 'game_id'),)
+
     game_id: Mapped[int] = mapped_column(sa.ForeignKey(Game.id), primary_key=True)
     medal_id: Mapped[int] = mapped_column(sa.ForeignKey(Medal.id), primary_key=True)
     player_id: Mapped[int] = mapped_column(sa.ForeignKey(Player.id), primary_key=True)
@@ -258,6 +350,12 @@ class Hero(BaseModel):
         return f"<Hero '{self.hero_name}'>"
 
 class GamePlayers(BaseModel):
+    # The primary key covers lookups by game, these cover lookups by team and by player
+    __table_args__ = (
+        sa.Index('ix_game_players_team_id_game_id', 'team_id', 'game_id'),
+        sa.Index('ix_game_players_player_id_game_id', 'player_id', 'game_id'),
+    )
+
     game_id: Mapped[int] = mapped_column(sa.ForeignKey(Game.id), primary_key=True)
     player_id: Mapped[int] = mapped_column(sa.ForeignKey(Player.id), primary_key=True)
     team_id: Mapped[int] = mapped_column(sa.ForeignKey(Team.id))  # the team the user is representing
@@ -279,7 +377,197 @@ class GamePlayers(BaseModel):
     def __repr__(self):
         return f"<GamePlayers>"
 
+# Precomputed statistics.
+# These tables are derived from GamePlayers and GameMedals. They are updated by
+# app.aggregates as games are imported and can be rebuilt with `flask stats rebuild`.
+
+class StatTotals:
+    '''Summed stat columns shared by the aggregate tables.'''
+    games: Mapped[int] = mapped_column(default=0)
+    kills: Mapped[int] = mapped_column(default=0)
+    deaths: Mapped[int] = mapped_column(default=0)
+    assists: Mapped[int] = mapped_column(default=0)
+    final_hits: Mapped[int] = mapped_column(default=0)
+    damage: Mapped[int] = mapped_column(default=0)
+    damage_blocked: Mapped[int] = mapped_column(default=0)
+    healing: Mapped[int] = mapped_column(default=0)
+    # Sum of accuracy_pct over every GamePlayers row counted
+    accuracy_total: Mapped[int] = mapped_column(default=0)
+    medals: Mapped[int] = mapped_column(default=0)
+
+class PlayerTournamentStats(StatTotals, BaseModel):
+    '''A player's totals for one tournament (per team, in case they played for more than one).'''
+    tournament_id: Mapped[int] = mapped_column(sa.ForeignKey(Tournament.id), primary_key=True)
+    team_id: Mapped[int] = mapped_column(sa.ForeignKey(Team.id), primary_key=True)
+    player_id: Mapped[int] = mapped_column(sa.ForeignKey(Player.id), primary_key=True)
+    max_damage: Mapped[int] = mapped_column(default=0)
+    max_healing: Mapped[int] = mapped_column(default=0)
+    max_blocked: Mapped[int] = mapped_column(default=0)
+
+    tournament: Mapped["Tournament"] = relationship("Tournament", back_populates="player_stats")
+    player: Mapped["Player"] = relationship("Player")
+
+    def __repr__(self):
+        return f"<PlayerTournamentStats>"
+
+class TeamTournamentStats(StatTotals, BaseModel):
+    '''A team's totals for one tournament.'''
+    tournament_id: Mapped[int] = mapped_column(sa.ForeignKey(Tournament.id), primary_key=True)
+    team_id: Mapped[int] = mapped_column(sa.ForeignKey(Team.id), primary_key=True)
+    wins: Mapped[int] = mapped_column(default=0)
+    # Number of GamePlayers rows counted, i.e. games x players
+    player_rows: Mapped[int] = mapped_column(default=0)
+    max_round: Mapped[int] = mapped_column(default=0)
+
+    tournament: Mapped["Tournament"] = relationship("Tournament", back_populates="team_stats")
+    team: Mapped["Team"] = relationship("Team")
+
+    def __repr__(self):
+        return f"<TeamTournamentStats>"
+
+class PlayerHeroStats(StatTotals, BaseModel):
+    '''A player's totals with one hero in one tournament, rolled up into career stats.'''
+    # The primary key covers lookups by tournament, this covers a player's career
+    __table_args__ = (sa.Index('ix_player_hero_stats_player_id_tournament_id', 'player_id', 'tournament_id'),)
+
+    tournament_id: Mapped[int] = mapped_column(sa.ForeignKey(Tournament.id), primary_key=True)
+    player_id: Mapped[int] = mapped_column(sa.ForeignKey(Player.id), primary_key=True)
+    hero_id: Mapped[int] = mapped_column(sa.ForeignKey(Hero.id), primary_key=True)
+    wins: Mapped[int] = mapped_column(default=0)
+    draws: Mapped[int] = mapped_column(default=0)
+
+    tournament: Mapped["Tournament"] = relationship("Tournament", back_populates="player_hero_stats")
+
+    def __repr__(self):
+        return f"<PlayerHeroStats>"
+
+class HeroMetaStats(StatTotals, BaseModel):
+    '''Totals for every time a hero was played on one map and game mode in a tournament.
+    games counts GamePlayers rows, i.e. how many times the hero was picked.'''
+    tournament_id: Mapped[int] = mapped_column(sa.ForeignKey(Tournament.id), primary_key=True)
+    hero_id: Mapped[int] = mapped_column(sa.ForeignKey(Hero.id), primary_key=True)
+    map_id: Mapped[int] = mapped_column(sa.ForeignKey(Map.id), primary_key=True)
+    game_mode_id: Mapped[int] = mapped_column(sa.ForeignKey(GameMode.id), primary_key=True)
+    wins: Mapped[int] = mapped_column(default=0)
+    draws: Mapped[int] = mapped_column(default=0)
+
+    tournament: Mapped["Tournament"] = relationship("Tournament", back_populates="hero_meta_stats")
+
+    def __repr__(self):
+        return f"<HeroMetaStats>"
+
+class MapMetaStats(BaseModel):
+    '''The number of games played on one map and game mode in a tournament.'''
+    tournament_id: Mapped[int] = mapped_column(sa.ForeignKey(Tournament.id), primary_key=True)
+    map_id: Mapped[int] = mapped_column(sa.ForeignKey(Map.id), primary_key=True)
+    game_mode_id: Mapped[int] = mapped_column(sa.ForeignKey(GameMode.id), primary_key=True)
+    games: Mapped[int] = mapped_column(default=0)
+    draws: Mapped[int] = mapped_column(default=0)
+
+    tournament: Mapped["Tournament"] = relationship("Tournament", back_populates="map_meta_stats")
+
+    def __repr__(self):
+        return f"<MapMetaStats>"
+
+class HeadToHeadStats(BaseModel):
+    '''Two teams' results and totals against each other in a tournament, see app/head_to_head.py.
+    team_a_id is always the lower team id, so each pair of teams has one row.'''
+    __table_args__ = (
+        sa.CheckConstraint('team_a_id < team_b_id', name='ck_head_to_head_stats_team_order'),
+        # A pair's games across every tournament
+        sa.Index('ix_head_to_head_stats_team_a_id_team_b_id', 'team_a_id', 'team_b_id'),
+    )
+
+    tournament_id: Mapped[int] = mapped_column(sa.ForeignKey(Tournament.id), primary_key=True)
+    team_a_id: Mapped[int] = mapped_column(sa.ForeignKey(Team.id), primary_key=True)
+    team_b_id: Mapped[int] = mapped_column(sa.ForeignKey(Team.id), primary_key=True)
+    games: Mapped[int] = mapped_column(default=0)
+    team_a_wins: Mapped[int] = mapped_column(default=0)
+    team_b_wins: Mapped[int] = mapped_column(default=0)
+    draws: Mapped[int] = mapped_column(default=0)
+    # Each team's totals over the pair's games
+    team_a_kills: Mapped[int] = mapped_column(default=0)
+    team_b_kills: Mapped[int] = mapped_column(default=0)
+    team_a_deaths: Mapped[int] = mapped_column(default=0)
+    team_b_deaths: Mapped[int] = mapped_column(default=0)
+    team_a_damage: Mapped[int] = mapped_column(default=0)
+    team_b_damage: Mapped[int] = mapped_column(default=0)
+    team_a_healing: Mapped[int] = mapped_column(default=0)
+    team_b_healing: Mapped[int] = mapped_column(default=0)
+    team_a_damage_blocked: Mapped[int] = mapped_column(default=0)
+    team_b_damage_blocked: Mapped[int] = mapped_column(default=0)
+
+    tournament: Mapped["Tournament"] = relationship("Tournament", back_populates="head_to_head_stats")
+
+    def __repr__(self):
+        return f"<HeadToHeadStats {self.team_a_id} vs. {self.team_b_id}>"
+
+class BracketNode(BaseModel):
+    '''One match in a tournament's bracket: the games two teams played in a round, see app/brackets.py.'''
+    __table_args__ = (
+        sa.Index('ix_bracket_node_tournament_id_round_position', 'tournament_id', 'round', 'position', unique=True),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    tournament_id: Mapped[int] = mapped_column(sa.ForeignKey(Tournament.id))
+    round: Mapped[int]
+    # Order of the match within its round
+    position: Mapped[int]
+    team_a_id: Mapped[int] = mapped_column(sa.ForeignKey(Team.id))
+    team_b_id: Mapped[int] = mapped_column(sa.ForeignKey(Team.id))
+    team_a_wins: Mapped[int] = mapped_column(default=0)
+    team_b_wins: Mapped[int] = mapped_column(default=0)
+    draws: Mapped[int] = mapped_column(default=0)
+    # NULL until one team has won more of the games
+    winner_id: Mapped[Optional[int]] = mapped_column(sa.ForeignKey(Team.id), nullable=True)
+
+    tournament: Mapped["Tournament"] = relationship("Tournament", back_populates="bracket_nodes")
+
+    def __repr__(self):
+        return f"<BracketNode round {self.round}, {self.position}>"
+
+class BracketEdge(BaseModel):
+    '''A match's winner advancing to the next match they played.'''
+    source_id: Mapped[int] = mapped_column(sa.ForeignKey(BracketNode.id), primary_key=True)
+    target_id: Mapped[int] = mapped_column(sa.ForeignKey(BracketNode.id))
+    tournament_id: Mapped[int] = mapped_column(sa.ForeignKey(Tournament.id), index=True)
+    team_id: Mapped[int] = mapped_column(sa.ForeignKey(Team.id))
+
+    tournament: Mapped["Tournament"] = relationship("Tournament", back_populates="bracket_edges")
+
+    def __repr__(self):
+        return f"<BracketEdge {self.source_id} -> {self.target_id}>"
+
+class RatingTotals:
+    '''Elo rating columns shared by the rating tables, see app/ratings.py.'''
+    rating: Mapped[float] = mapped_column(default=1500.0)
+    games: Mapped[int] = mapped_column(default=0)
+    wins: Mapped[int] = mapped_column(default=0)
+    losses: Mapped[int] = mapped_column(default=0)
+    draws: Mapped[int] = mapped_column(default=0)
+
+class TeamRating(RatingTotals, BaseModel):
+    '''A team's rating across every tournament.'''
+    team_id: Mapped[int] = mapped_column(sa.ForeignKey(Team.id), primary_key=True)
+
+    team: Mapped["Team"] = relationship("Team")
+
+    def __repr__(self):
+        return f"<TeamRating {self.team_id}: {self.rating:.0f}>"
+
+class PlayerRating(RatingTotals, BaseModel):
+    '''A player's rating across every tournament.'''
+    player_id: Mapped[int] = mapped_column(sa.ForeignKey(Player.id), primary_key=True)
+
+    player: Mapped["Player"] = relationship("Player")
+
+    def __repr__(self):
+        return f"<PlayerRating {self.player_id}: {self.rating:.0f}>"
+
 # TODO: is there somewhere better to put this?
 @login.user_loader
 def load_user(id):
-    return db.session.get(User, int(id))
\ No newline at end of file
+    return db.session.get(User, int(id))
+
+# Imported last as it registers events on the models above
+from app import permissions
@@ -0,0 +1,170 @@
+'''Tournament permission checks.
+
+Which permissions each role grants (the role_permissions table, seeded from
+ROLE_PERMISSIONS) is loaded once per process and kept in memory. A user's role in a
+tournament is looked up with one primary key query and remembered for the rest of
+the request, so repeated checks on the same tournament don't query again.
+share_tournament() updates who a tournament is shared with using bulk statements.
+
+The role matrix is cleared whenever Role, Permission or RolePermissions rows are
+written through the ORM. A tournament's remembered roles are forgotten when it is
+shared or its TournamentUsers rows are written through the ORM, and all of them
+whenever a session commits or rolls back, since the app context (and so g) can
+outlive a request in tests, CLI commands and workers.
+'''
+import threading
+import sqlalchemy as sa
+from flask import g, has_app_context
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from app import db
+from app import models as m
+from app.consts import ROLE
+
+
+class RoleMatrix:
+    '''{role id: (role name, frozenset of permission names)} for every role.'''
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._roles = None
+
+    def _load(self):
+        permissions = {}
+        rows = db.session.execute(
+            sa.select(m.Role.id, m.Role.role_name, m.Permission.permission)
+            .outerjoin(m.RolePermissions, m.RolePermissions.role_id == m.Role.id)
+            .outerjoin(m.Permission, m.Permission.id == m.RolePermissions.permission_id)
+        )
+        names = {}
+        for role_id, role_name, permission in rows:
+            names[role_id] = role_name
+            permissions.setdefault(role_id, set())
+            if permission is not None:
+                permissions[role_id].add(permission)
+        roles = {role_id: (names[role_id], frozenset(perms)) for role_id, perms in permissions.items()}
+        with self._lock:
+            self._roles = roles
+        return roles
+
+    def get(self, role_id):
+        '''Return (role name, permissions) for a role id, or None if there is no such role.'''
+        roles = self._roles
+        if roles is None or role_id not in roles:
+            roles = self._load()
+        return roles.get(role_id)
+
+    def id_of(self, role_name):
+        '''Return the id of the role with this name, or None if there is no such role.'''
+        roles = self._roles
+        if roles is None or role_name not in (name for name, _ in roles.values()):
+            roles = self._load()
+        return next((role_id for role_id, (name, _) in roles.items() if name == role_name), None)
+
+    def invalidate(self):
+        with self._lock:
+            self._roles = None
+
+
+role_matrix = RoleMatrix()
+
+
+def tournament_role_id(user, tournament_id):
+    '''The id of the user's role in a tournament, or None if they have no role in it.
+    Remembered for the rest of the request.'''
+    if not user.is_authenticated:
+        return None
+
+    key = (user.id, tournament_id)
+    roles = g.setdefault('_tournament_roles', {})
+    if key not in roles:
+        roles[key] = db.session.scalar(
+            sa.select(m.TournamentUsers.tournament_role_id).where(
+                m.TournamentUsers.tournament_id == tournament_id,
+                m.TournamentUsers.user_id == user.id
+            )
+        )
+    return roles[key]
+
+
+def forget_tournament_roles(tournament_id=None):
+    '''Forget the remembered roles in a tournament, or in every tournament if none is given.'''
+    if not has_app_context():
+        return
+    if tournament_id is None:
+        g.pop('_tournament_roles', None)
+        return
+    roles = g.get('_tournament_roles', {})
+    for key in [key for key in roles if key[1] == tournament_id]:
+        del roles[key]
+
+
+def has_permission(user, tournament_id, permission):
+    '''Check if the user's role in the tournament grants a permission.'''
+    role_id = tournament_role_id(user, tournament_id)
+    if role_id is None:
+        return False
+    role = role_matrix.get(role_id)
+    # PERMISSION members hash by name, so compare their values
+    return role is not None and getattr(permission, 'value', permission) in role[1]
+
+
+def share_tournament(tournament_id, user_ids):
+    '''Make the users given the ones a tournament is shared with: users not yet in the
+    tournament get the default role and other members who aren't owners lose access.
+    Unknown user ids are ignored. Returns the number of users (added, removed).
+    Nothing is committed here.'''
+    user_ids = set(user_ids)
+    tu = m.TournamentUsers
+
+    # Current members and whether they own the tournament, in one query
+    members = db.session.execute(
+        sa.select(tu.user_id, m.Role.role_name)
+        .join(m.Role, m.Role.id == tu.tournament_role_id)
+        .where(tu.tournament_id == tournament_id)
+    ).all()
+    shared = {user_id for user_id, role_name in members if role_name != ROLE.OWNER}
+    to_add = sorted(user_ids - {user_id for user_id, _ in members})
+    to_remove = sorted(shared - user_ids)
+
+    forget_tournament_roles(tournament_id)
+    added = removed = 0
+    default_role_id = role_matrix.id_of(ROLE.DEFAULT)
+    for i in range(0, len(to_add), m.SQL_IN_BATCH):
+        # Selecting from user skips ids that don't exist
+        insert_stmt = sqlite_insert(tu).from_select(
+            ['tournament_id', 'user_id', 'tournament_role_id'],
+            sa.select(sa.literal(tournament_id), m.User.id, sa.literal(default_role_id))
+            .where(m.User.id.in_(to_add[i:i + m.SQL_IN_BATCH]))
+        ).on_conflict_do_nothing()
+        added += db.session.execute(insert_stmt).rowcount
+
+    for i in range(0, len(to_remove), m.SQL_IN_BATCH):
+        removed += db.session.execute(
+            sa.delete(tu).where(
+                tu.tournament_id == tournament_id,
+                tu.user_id.in_(to_remove[i:i + m.SQL_IN_BATCH])
+            )
+        ).rowcount
+
+    return added, removed
+
+
+def _invalidate_roles(mapper, connection, target):
+    role_matrix.invalidate()
+
+for _model in (m.Role, m.Permission, m.RolePermissions):
+    for _event_name in ('after_insert', 'after_update', 'after_delete'):
+        sa.event.listen(_model, _event_name, _invalidate_roles)
+
+
+def _forget_changed_roles(mapper, connection, target):
+    forget_tournament_roles(target.tournament_id)
+
+for _event_name in ('after_insert', 'after_update', 'after_delete'):
+    sa.event.listen(m.TournamentUsers, _event_name, _forget_changed_roles)
+
+
+@sa.event.listens_for(Session, 'after_commit')
+@sa.event.listens_for(Session, 'after_rollback')
+def _forget_tournament_roles(session):
+    forget_tournament_roles()
@@ -0,0 +1,66 @@
+'''Per-request SQL statement counts and timings, and a slow statement log.
+
+Every statement run on db.engine is timed with the before/after_cursor_execute
+events. During a request the statement count and total time spent in the database
+are added up in flask.g and sent back in a Server-Timing header, e.g.
+
+    Server-Timing: db;desc="12 statements";dur=8.41
+
+which browsers' developer tools show in the request's timing tab. Statements slower
+than SLOW_QUERY_MS (see config.py) are logged with the route that ran them, including
+ones run outside a request by the import workers. Their parameters can hold password
+hashes and email addresses, so they are only logged when LOG_QUERY_PARAMETERS is on.
+'''
+import time
+import sqlalchemy as sa
+from flask import g, has_request_context, request
+from app import app, db
+
+# Longest parameter list logged with a slow statement, e.g. from a bulk insert
+MAX_LOGGED_PARAMETERS = 500
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info['query_start'] = time.perf_counter()
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed_ms = (time.perf_counter() - conn.info['query_start']) * 1000
+
+    route = None
+    if has_request_context():
+        g.query_count = g.get('query_count', 0) + 1
+        g.query_ms = g.get('query_ms', 0.0) + elapsed_ms
+        route = request.endpoint or request.path
+
+    slow_query_ms = app.config.get('SLOW_QUERY_MS')
+    if slow_query_ms is not None and elapsed_ms >= slow_query_ms:
+        message = "Slow query (%.1f ms) in %s: %s"
+        args = [elapsed_ms, route or 'no request', ' '.join(statement.split())]
+        if app.config.get('LOG_QUERY_PARAMETERS'):
+            logged_parameters = repr(parameters)
+            if len(logged_parameters) > MAX_LOGGED_PARAMETERS:
+                logged_parameters = logged_parameters[:MAX_LOGGED_PARAMETERS] + '...'
+            message += "; parameters: %s"
+            args.append(logged_parameters)
+        app.logger.warning(message, *args)
+
+
+@app.before_request
+def reset_query_stats():
+    # g normally starts empty for each request, but not if the request is handled
+    # inside an app context that's already active (e.g. in tests)
+    g.query_count = 0
+    g.query_ms = 0.0
+
+
+@app.after_request
+def add_server_timing(response):
+    count = g.get('query_count', 0)
+    response.headers.add('Server-Timing', f'db;desc="{count} statements";dur={g.get("query_ms", 0.0):.2f}')
+    return response
+
+
+with app.app_context():
+    sa.event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    sa.event.listen(db.engine, 'after_cursor_execute', after_cursor_execute)
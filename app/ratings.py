@@ -0,0 +1,140 @@
+'''Elo ratings for teams and players across every tournament.
+
+import_csv calls apply_games() with the ids of each batch of games it inserts. The
+batch's games and rosters are read with one query each, along with the current
+ratings of just the teams and players in them. The games are then replayed in
+tournament and round order, and the changed ratings are written back with one upsert.
+So an import costs O(games inserted), however many games were rated before.
+
+Teams are rated directly from their results. Each player's rating moves by the same
+amount as if their team's strength was the average rating of the players it fielded.
+
+Ratings depend on the order games are rated in. rebuild() replays every game in
+(tournament, round, game) order, which matches the incremental updates as long as
+games are uploaded to the newest tournament. Run `flask stats ratings` after uploading
+to an older tournament or deleting tournaments to bring the ratings back into order.
+
+NOTE: the upserts use SQLite's dialect of INSERT ... ON CONFLICT.
+'''
+from collections import defaultdict
+import sqlalchemy as sa
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app import db
+from app import models as m
+
+INITIAL_RATING = 1500.0
+# Largest rating change from one game
+K_FACTOR = 32
+# Games replayed together by rebuild()
+REBUILD_BATCH = 5000
+
+
+def expected_score(rating, opponent_rating):
+    '''The chance of winning against the opponent, counting a draw as half a win.'''
+    return 1 / (1 + 10 ** ((opponent_rating - rating) / 400))
+
+
+def new_rating(key_name, key):
+    return {key_name: key, 'rating': INITIAL_RATING, 'games': 0, 'wins': 0, 'losses': 0, 'draws': 0}
+
+
+def load_ratings(model, ids):
+    '''{id: rating row dict} for the given ids, with new rows for ids not rated yet.'''
+    table = model.__table__
+    key = table.primary_key.columns[0]
+    ratings = {}
+    ids = list(ids)
+    for i in range(0, len(ids), m.SQL_IN_BATCH):
+        for row in db.session.execute(sa.select(table).where(key.in_(ids[i:i + m.SQL_IN_BATCH]))).mappings():
+            ratings[row[key.name]] = dict(row)
+    return {id_: ratings.get(id_) or new_rating(key.name, id_) for id_ in ids}
+
+
+def save_ratings(model, rows):
+    if not rows:
+        return
+    table = model.__table__
+    stmt = sqlite_insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[c.name for c in table.primary_key],
+        set_={c.name: stmt.excluded[c.name] for c in table.columns if not c.primary_key}
+    )
+    db.session.execute(stmt, rows)
+
+
+def record(row, score, change):
+    row['rating'] += change
+    row['games'] += 1
+    if score == 1:
+        row['wins'] += 1
+    elif score == 0:
+        row['losses'] += 1
+    else:
+        row['draws'] += 1
+
+
+def apply_games(game_ids):
+    '''Rate newly inserted games, in tournament and round order, on top of the current ratings.'''
+    g, gp = m.Game, m.GamePlayers
+    game_ids = list(game_ids)
+    games, rosters = [], defaultdict(lambda: defaultdict(list))
+    for i in range(0, len(game_ids), m.SQL_IN_BATCH):
+        batch = game_ids[i:i + m.SQL_IN_BATCH]
+        games += db.session.execute(
+            sa.select(g.id, g.tournament_id, g.round, g.team_a_id, g.team_b_id, g.winning_team, g.is_draw)
+            .where(g.id.in_(batch))
+        ).all()
+        for game_id, team_id, player_id in db.session.execute(
+            sa.select(gp.game_id, gp.team_id, gp.player_id).where(gp.game_id.in_(batch))
+        ):
+            rosters[game_id][team_id].append(player_id)
+    if not games:
+        return
+    games.sort(key=lambda game: (game.tournament_id, game.round, game.id))
+
+    teams = load_ratings(m.TeamRating, sorted({t for game in games for t in (game.team_a_id, game.team_b_id)}))
+    players = load_ratings(m.PlayerRating, sorted({p for roster in rosters.values() for ids in roster.values() for p in ids}))
+
+    for game in games:
+        if game.is_draw or game.winning_team is None:
+            score_a = 0.5
+        else:
+            score_a = 1.0 if game.winning_team == game.team_a_id else 0.0
+        sides = [(game.team_a_id, game.team_b_id, score_a), (game.team_b_id, game.team_a_id, 1 - score_a)]
+
+        # Every change is worked out from the ratings before this game
+        team_changes = [
+            K_FACTOR * (score - expected_score(teams[team_id]['rating'], teams[opponent_id]['rating']))
+            for team_id, opponent_id, score in sides
+        ]
+        roster = rosters[game.id]
+        strength = {
+            team_id: sum(players[p]['rating'] for p in roster[team_id]) / len(roster[team_id])
+            for team_id, _, _ in sides if roster[team_id]
+        }
+        player_changes = {
+            team_id: K_FACTOR * (score - expected_score(strength[team_id], strength[opponent_id]))
+            for team_id, opponent_id, score in sides if team_id in strength and opponent_id in strength
+        }
+
+        for (team_id, _, score), change in zip(sides, team_changes):
+            record(teams[team_id], score, change)
+            for player_id in roster[team_id]:
+                record(players[player_id], score, player_changes.get(team_id, 0.0))
+
+    save_ratings(m.TeamRating, list(teams.values()))
+    save_ratings(m.PlayerRating, list(players.values()))
+
+
+def rebuild():
+    '''Recompute every rating from all the games. Returns the number of games rated.
+    Nothing is committed here.'''
+    db.session.execute(sa.delete(m.TeamRating))
+    db.session.execute(sa.delete(m.PlayerRating))
+
+    game_ids = db.session.scalars(
+        sa.select(m.Game.id).order_by(m.Game.tournament_id, m.Game.round, m.Game.id)
+    ).all()
+    for i in range(0, len(game_ids), REBUILD_BATCH):
+        apply_games(game_ids[i:i + REBUILD_BATCH])
+    return len(game_ids)
@@ -0,0 +1,135 @@
+'''In-process cache for the static reference tables.
+
+Hero, Map, GameMode, Medal and HeroRole are seeded once and almost never change,
+so they are loaded into memory the first time they are needed and served from
+there afterwards. Each table is kept as an id -> row dict and a name -> id dict.
+
+The cache only holds committed rows. When one of these models is inserted, updated
+or deleted through the ORM it is cleared, and until the session commits or rolls
+back the table is read from the database on every use instead of being cached.
+Writes that bypass the ORM inside a transaction (e.g. sa.insert(...)) must call
+reference_cache.invalidate_on_commit() themselves, and bulk writes that have already
+been committed must call reference_cache.invalidate(). Anything else built from
+these tables can register a callback with reference_cache.on_invalidate() to be
+cleared too. The cache is per process, so after seeding or migrating from another
+process, unknown names are picked up by the reload on a miss; restart the server if
+existing rows were renamed or removed.
+'''
+import threading
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+from app import db
+from app import models as m
+
+# Cached models and the column used to look rows up by name
+REFERENCE_TABLES = {
+    m.Hero: 'hero_name',
+    m.HeroRole: 'role_name',
+    m.Map: 'map_name',
+    m.GameMode: 'game_mode_name',
+    m.Medal: 'medal_name',
+}
+
+
+class ReferenceCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tables = {}
+        # Models written in a transaction that hasn't committed or rolled back yet
+        self._pending = set()
+        self._callbacks = []
+
+    def _load(self, model):
+        name_field = REFERENCE_TABLES[model]
+        rows = db.session.execute(sa.select(model.__table__).order_by(model.id)).all()
+        rows_by_id = {row.id: row for row in rows}
+        ids_by_name = {getattr(row, name_field): row.id for row in rows}
+        with self._lock:
+            # Rows read mid-transaction may include uncommitted ones, so aren't kept
+            if model not in self._pending:
+                self._tables[model] = (rows_by_id, ids_by_name)
+        return rows_by_id, ids_by_name
+
+    def _table(self, model):
+        table = self._tables.get(model)
+        if table is None:
+            table = self._load(model)
+        return table
+
+    def rows(self, model):
+        '''Return every row of the table, ordered by id.'''
+        return list(self._table(model)[0].values())
+
+    def get(self, model, row_id):
+        '''Return the row with this id, or None.'''
+        return self._table(model)[0].get(row_id)
+
+    def names(self, model):
+        '''Return the name of every row in the table, ordered by id.'''
+        return list(self._table(model)[1].keys())
+
+    def get_ids(self, model, names):
+        '''Return a {name: id} dict for the names that exist. The table is reloaded
+        once if any name is missing, in case it was added by another process.'''
+        names = set(names)
+        ids_by_name = self._table(model)[1]
+        if not names <= ids_by_name.keys():
+            ids_by_name = self._load(model)[1]
+        return {name: ids_by_name[name] for name in names if name in ids_by_name}
+
+    def on_invalidate(self, callback):
+        '''Call callback() whenever any table is cleared from the cache.'''
+        self._callbacks.append(callback)
+        return callback
+
+    def _run_callbacks(self):
+        for callback in self._callbacks:
+            callback()
+
+    def invalidate(self, *models):
+        '''Clear the given models from the cache, or every model if none are given.'''
+        with self._lock:
+            if not models:
+                self._tables.clear()
+            for model in models:
+                self._tables.pop(model, None)
+        self._run_callbacks()
+
+    def invalidate_on_commit(self, *models):
+        '''Clear the given models now, and stop caching them until the current
+        transaction commits or rolls back, when they are cleared again.'''
+        with self._lock:
+            self._pending.update(models)
+            for model in models:
+                self._tables.pop(model, None)
+        self._run_callbacks()
+
+    def _end_transaction(self):
+        with self._lock:
+            pending = bool(self._pending)
+            for model in self._pending:
+                self._tables.pop(model, None)
+            self._pending.clear()
+        if pending:
+            self._run_callbacks()
+
+
+reference_cache = ReferenceCache()
+
+
+def _invalidate_model(mapper, connection, target):
+    reference_cache.invalidate_on_commit(type(target))
+
+for _model in REFERENCE_TABLES:
+    for _event_name in ('after_insert', 'after_update', 'after_delete'):
+        sa.event.listen(_model, _event_name, _invalidate_model)
+
+@sa.event.listens_for(Session, 'after_commit')
+def _invalidate_on_commit(session):
+    reference_cache._end_transaction()
+
+# Rows loaded inside a transaction that is later rolled back may no longer exist
+@sa.event.listens_for(Session, 'after_rollback')
+def _invalidate_on_rollback(session):
+    reference_cache._end_transaction()
+    reference_cache.invalidate()
@@ -1,16 +1,28 @@
 from app import app, db, models, forms
-from flask import render_template, redirect, flash, request, jsonify
+from flask import render_template, redirect, flash, request, jsonify, Response
 import sqlalchemy as sa
 from flask_login import current_user, login_user, logout_user, login_required
-from data_import import import_csv
+from app.import_jobs import import_jobs
 from werkzeug.utils import secure_filename
 import os
+import random
 from datetime import datetime
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import selectinload, contains_eager
 from collections import defaultdict
 from functools import wraps
 from app.consts import *
 import csv_generator as csvg
+from app.reference_cache import reference_cache
+from app import search
+from app import permissions
+from app import aggregates
+from app import stats
+from app import leaderboard
+from app import meta
+from app import careers
+from app import brackets
+from app import head_to_head
+from app.metrics import metrics, metrics_authorised
 
 if not app.config.get('SECRET_KEY'):
     raise ValueError("Please set the environment variable SECRET_KEY")
@@ -190,108 +202,101 @@ def tournament_page():
         flash("Tournament ID missing in request", "warning")
         return redirect("/tournaments")
 
-    tournament = db.session.get(models.Tournament, tid)
+    tournament = db.session.get(models.Tournament, tid, options=[
+        selectinload(models.Tournament.users).options(
+            selectinload(models.TournamentUsers.user),
+            selectinload(models.TournamentUsers.tournament_role)
+        ),
+        selectinload(models.Tournament.visibility)
+    ])
     if not tournament:
         return render_template("pages/404.html", error=f"Tournament with ID {tid} not found."), 404
 
     if not tournament.user_can_view(current_user):
         return render_template("pages/404.html", error=f"You do not have access to this tournament."), 403
 
-    games = tournament.games
-    teams = sorted(
-        list({g.team_a for g in games} | {g.team_b for g in games}),
-        key=lambda t: t.team_name.lower()
+    # Everything the page shows for each game is loaded up front, so the number of
+    # queries doesn't grow with the number of games
+    games = db.session.scalars(
+        sa.select(models.Game)
+        .where(models.Game.tournament_id == tid)
+        .order_by(models.Game.id)
+        .options(
+            selectinload(models.Game.team_a),
+            selectinload(models.Game.team_b),
+            selectinload(models.Game.game_mode),
+            selectinload(models.Game.map),
+            selectinload(models.Game.game_players).options(
+                selectinload(models.GamePlayers.player),
+                selectinload(models.GamePlayers.hero)
+            )
+        )
+    ).all()
+    # The bracket, its champion and who was knocked out are worked out once per upload
+    bracket = brackets.load(tid)
+    team_status = brackets.team_status(bracket)
+    teams = sorted(bracket['teams'].items(), key=lambda team: team[1].lower())
+
+    # MVP and SVP holders for every game in one query
+    mvp_svp = {}
+    medal_rows = db.session.execute(
+        sa.select(models.GameMedals.game_id, models.Medal.medal_name, models.Player)
+        .join(models.Medal)
+        .join(models.Player)
+        .join(models.Game)
+        .where(
+            models.Game.tournament_id == tid,
+            sa.func.lower(models.Medal.medal_name).in_(["mvp", "svp"])
+        )
     )
-    # Find the final game to determine the winner
-    final_game = max(games, key=lambda g: g.round, default=None)
-    final_winner_id = final_game.winning_team if final_game else None
-
-    # Assign status to teams based on the final winner
-    team_status = {}
-    for team in teams:
-        if team.id == final_winner_id:
-            team_status[team.id] = "winner"
-        else:
-            team_status[team.id] = "loser"
-
+    for game_id, medal_name, player in medal_rows:
+        mvp_svp.setdefault((game_id, medal_name.lower()), player)
 
     for g in games:
-        mvp_medal = db.session.query(models.GameMedals)\
-            .join(models.Medal)\
-            .join(models.Player)\
-            .filter(
-                models.GameMedals.game_id == g.id,
-                models.Medal.medal_name.ilike("mvp")
-            ).first()
-
-        svp_medal = db.session.query(models.GameMedals)\
-            .join(models.Medal)\
-            .join(models.Player)\
-            .filter(
-                models.GameMedals.game_id == g.id,
-                models.Medal.medal_name.ilike("svp")
-            ).first()
-
-        g.mvp = mvp_medal.player if mvp_medal else None
-        g.svp = svp_medal.player if svp_medal else None
+        g.mvp = mvp_svp.get((g.id, "mvp"))
+        g.svp = mvp_svp.get((g.id, "svp"))
     
     # All users who have the owner role for this tournament (usually will be one, but could support more)
     owners = [tu.user for tu in tournament.users if tu.tournament_role.role_name == ROLE.OWNER]
     # All users this tournament has been shared with (i.e. all that have access to it, minus owners).
     users_shared = [tu.user for tu in tournament.users if tu.user not in owners]
 
-    # All users who don't have access to the tournament
-    users_unshared = db.session.query(models.User).filter(
-        models.User.id.not_in([u.id for u in users_shared]),
-        models.User.id.not_in([u.id for u in owners])
-    ).all()
-    
+    # Users to share with are searched for from the share form, see /api/users/search
     form = forms.UserSelectionForm()
     form.tid.data = tournament.id
 
 
-    return render_template("pages/tournament.html", tournament=tournament, games=games,teams=teams, team_status=team_status,
-                           sharedUsers=users_shared, unsharedUsers=users_unshared, owners=owners, form=form)
+    return render_template("pages/tournament.html", tournament=tournament, games=games,teams=teams, team_status=team_status, bracket=bracket,
+                           sharedUsers=users_shared, owners=owners, form=form)
 
 
 @app.route("/tournament/share", methods=["POST"])
+@login_required
 def share():
 
     form = forms.UserSelectionForm()
     if form.validate_on_submit():
+        tournament = db.session.get(models.Tournament, form.tid.data)
+        if not tournament:
+            flash("Tournament not found.", "danger")
+            return redirect("/tournaments")
+
+        # Only owners can share a tournament
+        role = tournament.get_user_role(current_user)
+        if not role or role.role_name != ROLE.OWNER:
+            flash("You do not have permission to share this tournament.", "danger")
+            return redirect(f"/tournament?id={tournament.id}")
+
         try:
-            tournament = db.session.query(models.Tournament).filter_by(id=form.tid.data).one()
-            owners = [tu.user for tu in tournament.users if tu.tournament_role.role_name == ROLE.OWNER]
-            tourn_users_shared = [tu for tu in tournament.users if tu.user not in owners]
-            
-            
             # Process form to insert values into the database
             user_ids_to_share = []
             if form.selected_users.data:
                 user_ids_to_share = [int(uid) for uid in form.selected_users.data.split(',')]
 
-            for user_id in user_ids_to_share:
-                existing_tu = db.session.query(models.TournamentUsers).filter_by(
-                    tournament_id=form.tid.data,
-                    user_id=user_id
-                ).first()
-                
-                if not existing_tu:
-                    user = db.session.query(models.User).where(models.User.id == user_id).one()
-                    role = db.session.query(models.Role).filter_by(role_name=ROLE.DEFAULT).one()
-                    tournament_user = models.TournamentUsers(
-                        tournament_id=form.tid.data,
-                        user_id=user.id,
-                        tournament_role_id=role.id
-                    )
-                    db.session.add(tournament_user)
-
-            # Revoke access to users who have already if deselected
-            for tourn_user in tourn_users_shared:
-                if tourn_user.user_id not in user_ids_to_share:
-                    db.session.delete(tourn_user)
-
+            # Users not selected any more have their access revoked
+            added, removed = permissions.share_tournament(tournament.id, user_ids_to_share)
             db.session.commit()
+            flash(f"Shared with {added} new users, removed {removed} users.", "success")
 
         except Exception as e:
             db.session.rollback()
@@ -370,11 +375,13 @@ def create_tournament():
                 tournament_role_id=tournament_role.id
             )
             db.session.add(tournament_user)
-            
+            db.session.commit()
+
             if csv_file:
-                import_csv(csv_file.stream, tournament=tournament, commit_changes=False)
+                job = import_jobs.submit(tournament.id, current_user.id, csv_file)
+                flash("Tournament created! Your CSV data is being imported.", "success")
+                return redirect(f"/tournament?id={tournament.id}&job={job.id}")
 
-            db.session.commit()
             flash("Tournament created!", "success")
             return redirect(f"/tournament?id={tournament.id}")
 
@@ -403,7 +410,6 @@ def tournament_upload():
         if not tournament:
             return "Tournament not found", 404
 
-        print(current_user, tournament.user_has_permission(current_user, PERMISSION.UPLOAD))
         if not tournament.user_has_permission(current_user, PERMISSION.UPLOAD):
             return "You do not have permission to upload data", 403
 
@@ -411,16 +417,25 @@ def tournament_upload():
         if not csv_file:
             return "No file provided", 400
 
-        #TODO: prevent uploading duplicate data. Consider comparing file hashes, etc.
-        import_csv(csv_file.stream, tournament=tournament, commit_changes=True)
-        flash("Tournament data uploaded successfully!", "success")
-        return redirect(f"/tournament?id={tid}")
+        # The import runs in the background, the page polls the job for progress.
+        # Files and games that were already imported are skipped by the import.
+        job = import_jobs.submit(tournament.id, current_user.id, csv_file)
+        return jsonify({'job_id': job.id, 'status_url': f"/api/import-jobs/{job.id}"}), 202
 
     except Exception as e:
         db.session.rollback()
         print(e)
-        flash("Failed to upload tournament data", "danger")
-        return redirect(f"/tournament?id={tid}")
+        return "Failed to upload tournament data", 500
+
+
+@app.route("/api/import-jobs/<job_id>", methods=["GET"])
+@login_required
+def api_get_import_job(job_id):
+    '''Progress of a background CSV import, only visible to the user who uploaded it.'''
+    job = import_jobs.get(job_id)
+    if not job or job.user_id != current_user.id:
+        return jsonify({'error': 'Import job not found'}), 404
+    return jsonify(job.to_dict())
 
 
 @app.route("/tournaments", methods=['GET'])
@@ -431,50 +446,66 @@ def browse_tournaments():
 
 
 
+# Page size for /api/tournaments when no limit is given, and the largest allowed
+TOURNAMENTS_PAGE_SIZE = 50
+MAX_TOURNAMENTS_PAGE_SIZE = 200
+
+
 @app.route("/api/tournaments", methods=['GET'])
 def api_get_tournaments():
-    """API endpoint to retrieve tournaments with optional search filter and category filter."""
-    search_query = request.args.get('search', '').lower()
+    """API endpoint to retrieve tournaments with optional search filter and category filter.
+    Results are ordered by id, or by how well they match the search, and paged by passing
+    the last id seen as `after`."""
+    search_query = search.match_query(request.args.get('search', ''))
     filter_type = request.args.get('filter', 'all')  # Filter parameters: 'owned', 'shared', 'discover', or 'all'
-    
-    # Start with a base query
-    stmt = sa.select(models.Tournament).options(
-        selectinload(models.Tournament.users).selectinload(models.TournamentUsers.tournament_role),
-        selectinload(models.Tournament.visibility)
-    )
-    
-    # Apply search filter if provided
+    after = request.args.get('after', type=int)
+    limit = request.args.get('limit', default=TOURNAMENTS_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, MAX_TOURNAMENTS_PAGE_SIZE))
+
+    # Ownership, sharing and visibility are worked out in the query for every tournament
+    stmt = models.Tournament.select_with_access(current_user)
+    is_owner, is_shared, is_public = (stmt.selected_columns[name] for name in ('is_owner', 'is_shared', 'is_public'))
+
+    # Apply search filter if provided, using the full-text index (see app/search.py)
     if search_query:
-        stmt = stmt.filter(models.Tournament.title.ilike(f'%{search_query}%'))
-    
-    # Get all tournaments matching the search criteria
-    tournaments = db.session.scalars(stmt).all()
-    
-    # Filter based on the filter_type
-    filtered_tournaments = []
-    
-    for t in tournaments:
-        # Get owners and shared users
-        role_name = t.get_user_role(current_user).role_name if t.get_user_role(current_user) else None
+        found = search.matches(search_query)
+        stmt = stmt.join(found, found.c.id == models.Tournament.id).add_columns(found.c.title_highlight, found.c.snippet)
+        order_by = (found.c.rank, models.Tournament.id)
+    else:
+        order_by = (models.Tournament.id,)
+
+    # Apply the category filter
+    if filter_type == 'owned':
+        stmt = stmt.where(is_owner)
+    elif filter_type == 'shared':
+        stmt = stmt.where(is_shared, sa.not_(is_public))
+    elif filter_type == 'discover':
+        stmt = stmt.where(is_public, sa.not_(is_owner), sa.not_(is_shared))
+    else:
+        stmt = stmt.where(sa.or_(is_owner, is_shared, is_public))
+
+    total = db.session.scalar(sa.select(sa.func.count()).select_from(stmt.subquery()))
+
+    if after is not None:
+        after_rank = search.rank_of(search_query, after) if search_query else None
+        if after_rank is not None:
+            # Continue from the last result in rank order, ties are ordered by id
+            stmt = stmt.where(sa.or_(
+                found.c.rank > after_rank,
+                sa.and_(found.c.rank == after_rank, models.Tournament.id > after)
+            ))
+        else:
+            stmt = stmt.where(models.Tournament.id > after)
+    rows = db.session.execute(
+        stmt.order_by(*order_by)
+        .limit(limit)
+        .options(selectinload(models.Tournament.users), selectinload(models.Tournament.visibility))
+    ).all()
 
-        is_owner = role_name == ROLE.OWNER
-        is_public = t.visibility.visibility == 'public' if hasattr(t, 'visibility') and t.visibility else False
-        is_shared = t.user_has_permission(current_user, PERMISSION.READ) and not is_owner
-        
-        # Apply filters
-        if filter_type == 'owned' and is_owner:
-            filtered_tournaments.append(t)
-        elif filter_type == 'shared' and is_shared and not is_public:
-            filtered_tournaments.append(t)
-        elif filter_type == 'discover' and is_public and not is_owner and not is_shared:
-            filtered_tournaments.append(t)
-        elif filter_type == 'all':
-            if is_owner or is_shared or is_public:
-                filtered_tournaments.append(t)
-    
     # Convert tournaments to a list of dictionaries
     tournaments_data = []
-    for t in filtered_tournaments:
+    for row in rows:
+        t = row[0]
         # Handle date formatting
         created_at = t.created_at
         start_time = t.start_time
@@ -485,10 +516,6 @@ def api_get_tournaments():
         if isinstance(start_time, str):
             start_time = datetime.fromisoformat(start_time)
         
-        role_name = t.get_user_role(current_user).role_name if t.get_user_role(current_user) else None
-        is_owner = role_name == ROLE.OWNER
-        is_public = t.visibility.visibility == 'public' if hasattr(t, 'visibility') and t.visibility else False
-        is_shared = t.user_has_permission(current_user, PERMISSION.READ) and not is_owner
         # Build the tournament data dictionary
         tournament_data = {
             'id': t.id,
@@ -497,19 +524,80 @@ def api_get_tournaments():
             'created_at': created_at.isoformat() if created_at else None,
             'start_time': start_time.isoformat() if start_time else None,
             'visibility': {
-                'visibility': t.visibility.visibility if hasattr(t, 'visibility') and t.visibility else 'Unknown'
+                'visibility': t.visibility.visibility if t.visibility else 'Unknown'
             },
-            'users': [{'user_id': link.user_id} for link in t.users] if t.users else [],
-            'is_owner': is_owner,
-            'is_shared': is_shared,
-            'is_public': is_public
+            'users': [{'user_id': link.user_id} for link in t.users],
+            'is_owner': bool(row.is_owner),
+            'is_shared': bool(row.is_shared),
+            'is_public': bool(row.is_public)
         }
+        if search_query:
+            # HTML with the matched words wrapped in <mark> tags
+            tournament_data['title_highlight'] = search.to_html(row.title_highlight)
+            tournament_data['snippet'] = search.to_html(row.snippet)
         
         tournaments_data.append(tournament_data)
-    
-    return jsonify({'tournaments': tournaments_data})
+
+    # Only set when there may be another page
+    next_after = rows[-1][0].id if len(rows) == limit else None
+
+    return jsonify({'tournaments': tournaments_data, 'total': total, 'next_after': next_after})
+
 
 
+# Page size for /api/users/search when no limit is given, and the largest allowed
+USERS_PAGE_SIZE = 20
+MAX_USERS_PAGE_SIZE = 100
+
+
+@app.route("/api/users/search", methods=['GET'])
+@login_required
+def api_search_users():
+    """Users whose username starts with `q` (ignoring case) that a tournament hasn't been
+    shared with yet, for the share form. Ordered by username and paged by passing the
+    last id seen as `after`."""
+    tid = request.args.get('tid', type=int)
+    prefix = request.args.get('q', '').strip().lower()
+    after = request.args.get('after', type=int)
+    limit = request.args.get('limit', default=USERS_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, MAX_USERS_PAGE_SIZE))
+
+    tournament = db.session.get(models.Tournament, tid) if tid else None
+    if not tournament:
+        return jsonify({'error': 'Tournament not found'}), 404
+
+    # Only owners can share a tournament
+    role = tournament.get_user_role(current_user)
+    if not role or role.role_name != ROLE.OWNER:
+        return jsonify({'error': 'You do not have permission to share this tournament'}), 403
+
+    # A range on lower(username) rather than LIKE, so the ix_user_username_lower index is used
+    username = sa.func.lower(models.User.username)
+    stmt = sa.select(models.User.id, models.User.username).where(
+        ~sa.exists().where(
+            models.TournamentUsers.tournament_id == tid,
+            models.TournamentUsers.user_id == models.User.id
+        )
+    )
+    if prefix:
+        stmt = stmt.where(username >= prefix, username < prefix + '\U0010ffff')
+
+    if after is not None:
+        after_username = db.session.scalar(sa.select(username).where(models.User.id == after))
+        if after_username is not None:
+            stmt = stmt.where(sa.or_(
+                username > after_username,
+                sa.and_(username == after_username, models.User.id > after)
+            ))
+
+    rows = db.session.execute(stmt.order_by(username, models.User.id).limit(limit)).all()
+
+    return jsonify({
+        'users': [{'id': user_id, 'username': name} for user_id, name in rows],
+        # Only set when there may be another page
+        'next_after': rows[-1].id if len(rows) == limit else None
+    })
+
 
 @app.route("/tournament/game")
 def tournament_game_view():
@@ -531,7 +619,7 @@ def tournament_game_view():
 
     medal_by_player = {}
     for gm in game.game_medals:
-        medal = db.session.get(models.Medal, gm.medal_id)
+        medal = reference_cache.get(models.Medal, gm.medal_id)
         if gm.player_id not in medal_by_player:
             medal_by_player[gm.player_id] = []
         medal_by_player[gm.player_id].append(medal.medal_name)
@@ -560,73 +648,40 @@ def team_results_page():
     if not tournament.user_can_view(current_user):
         return render_template("pages/404.html", error=f"You do not have access to this tournament."), 403
 
-    # Display tournament details for the team
-    game_players = db.session.scalars(
-        sa.select(models.GamePlayers)
-        .where(
-            models.GamePlayers.team_id == team_id,
-            models.GamePlayers.game.has(models.Game.tournament_id == tid)
-        )
-    ).all()
-    games_played = set()
-    kills = deaths = assists = damage = healing = 0
-    accuracy_list = []
-
-    for gp in game_players:
-        games_played.add(gp.game_id)
-        kills += gp.kills
-        deaths += gp.deaths
-        assists += gp.assists
-        damage += gp.damage
-        healing += gp.healing
-        accuracy_list.append(gp.accuracy_pct)
-
-    kda_ratio = round((kills + assists) / (deaths if deaths > 0 else 1), 2)
-    avg_accuracy = round(sum(accuracy_list) / len(accuracy_list), 1) if accuracy_list else 0
-    # Gather all medals belonging to players in this team and this tournament
-    total_medals = (
-        db.session.query(models.GameMedals)
-        .join(models.GameMedals.game)  # JOIN to game
-        .filter(
-            models.GameMedals.player_id.in_([gp.player_id for gp in game_players]),
-            models.Game.tournament_id == tid
-        )
-        .count()
-    )
-    total_blocked = 0
+    # Totals are precomputed as games are imported, see app/aggregates.py
+    team_stats = aggregates.get_or_empty(models.TeamTournamentStats, (tid, team_id))
+    player_totals = stats.PlayerTotals.for_team(tid, team_id)
 
-    # player stastics list
-    player_stats = defaultdict(lambda: {"damage": 0, "healing": 0, "blocked": 0, "games": 0})
+    kills = team_stats.kills
+    deaths = team_stats.deaths
+    assists = team_stats.assists
+    damage = team_stats.damage
+    healing = team_stats.healing
+    total_blocked = team_stats.damage_blocked
 
-    for gp in game_players:
-        total_blocked += gp.damage_blocked or 0
-        pid = gp.player_id
-        player_stats[pid]["damage"] += gp.damage or 0
-        player_stats[pid]["healing"] += gp.healing or 0
-        player_stats[pid]["blocked"] += gp.damage_blocked or 0
-        player_stats[pid]["games"] += 1
+    kda_ratio = round(float(stats.kda(kills, deaths, assists)), 2)
+    avg_accuracy = round(team_stats.accuracy_total / team_stats.player_rows, 1) if team_stats.player_rows else 0
+    total_medals = team_stats.medals
 
     # Average stats
-    games_played_count = len(games_played) if games_played else 1
+    games_played_count = team_stats.games or 1
 
     avg_kda_ratio = round(kda_ratio / games_played_count, 2)
     avg_damage = round(damage / games_played_count, 2)
     avg_healing = round(healing / games_played_count, 2)
     avg_blocked = round(total_blocked / games_played_count, 2)
 
-    player_ids = list(player_stats.keys())
-    players_by_id = {
-        p.id: p.gamertag for p in db.session.query(models.Player).filter(models.Player.id.in_(player_ids)).all()
-    }
+    players = player_totals.players()
+    # Elo rating over every tournament, see app/ratings.py
+    team_rating = db.session.get(models.TeamRating, team_id)
 
     # top players
     def get_top_player(metric):
-        best = max(player_stats.items(), key=lambda x: x[1][metric] / max(x[1]["games"], 1), default=None)
-        return players_by_id.get(best[0], "N/A") if best else "N/A"
+        return player_totals.top(metric) or "N/A"
 
     top_damage_player = get_top_player("damage")
     top_healing_player = get_top_player("healing")
-    top_blocked_player = get_top_player("blocked")
+    top_blocked_player = get_top_player("damage_blocked")
 
     # FMVP
     final_game = db.session.query(models.Game).filter(
@@ -636,11 +691,12 @@ def team_results_page():
     fmvp_player = "N/A"
     if final_game:
         fmvp_medal = next(
-            (gm for gm in final_game.game_medals if gm.medal.medal_name.lower() == "mvp"),
+            (gm for gm in final_game.game_medals
+             if reference_cache.get(models.Medal, gm.medal_id).medal_name.lower() == "mvp"),
             None
         )
-        if fmvp_medal and fmvp_medal.player_id in player_ids:
-            fmvp_player = players_by_id.get(fmvp_medal.player_id, "N/A")
+        if fmvp_medal:
+            fmvp_player = dict(players).get(fmvp_medal.player_id, "N/A")
 
     team_summary = {
         'games': games_played_count,
@@ -662,13 +718,9 @@ def team_results_page():
         'top_blocked_player': top_blocked_player,
         'fmvp_player': fmvp_player
     }
-    # Caluculate the max round number for specific team
-    # This is the max round number for the team in the tournament
+    # The max round number for the team in the tournament
     # This round number is used to display the correct round in the game view
-    round_numbers = [
-        gp.game.round for gp in game_players if gp.game and gp.game.round is not None
-    ]
-    max_round = max(round_numbers) if round_numbers else 1
+    max_round = team_stats.max_round or 1
 
     stats_cards = [
     {"title": "Total Kills", "value": team_summary["total_kills"]},
@@ -688,34 +740,20 @@ def team_results_page():
     {"title": "Top Healing Player", "value": team_summary.get("top_healing_player", "N/A")},
     {"title": "Top Blocked Player", "value": team_summary.get("top_blocked_player", "N/A")},
     {"title": "FMVP", "value": team_summary.get("fmvp_player", "N/A")},
+    {"title": "Rating (All Tournaments)", "value": round(team_rating.rating) if team_rating else "N/A"},
     ]
 
-    games = db.session.scalars(
-    sa.select(models.Game).where(models.Game.tournament_id == tid)
-    ).all()
+    # Team totals for each game the team played, in round order
+    rounds, game_totals = stats.team_game_series(tid, team_id)
 
     chart_data = {
-        "rounds": [],
-        "kills": [],
-        "damage": [],
-        "healing": []
+        "rounds": [f"R{r}" for r in rounds],
+        "kills": game_totals["kills"],
+        "damage": game_totals["damage"],
+        "healing": game_totals["healing"],
     }
 
-    for g in sorted(games, key=lambda x: x.round):
-        if g.team_a_id != team.id and g.team_b_id != team.id:
-            continue # Skip games not involving the team
-
-        round_label = f"R{g.round}"
-        team_gps = [gp for gp in g.game_players if gp.team_id == team.id]
-
-        chart_data["rounds"].append(round_label)
-        chart_data["kills"].append(sum(gp.kills for gp in team_gps))
-        chart_data["damage"].append(sum(gp.damage for gp in team_gps))
-        chart_data["healing"].append(sum(gp.healing for gp in team_gps))
-
-
-
-    return render_template("pages/stats_team.html", team=team, tournament=tournament, game_players=game_players, team_summary=team_summary, max_round=max_round, stats_cards=stats_cards, chart_data=chart_data)
+    return render_template("pages/stats_team.html", team=team, tournament=tournament, players=players, team_summary=team_summary, max_round=max_round, stats_cards=stats_cards, chart_data=chart_data)
 
 
 
@@ -739,24 +777,46 @@ def tournament_player_view():
     player = db.session.get(models.Player, pid)
     if not player:
         return render_template("pages/404.html", error=f"Player with ID {pid} not found."), 404
-    player_games = [gp.game for gp in player.game_players]
     current_game = db.session.get(models.Game, gid) if gid else None
-    tournament_games = [gp for gp in player.game_players if gp.game.tournament_id == tid]
-
-    total_kills = sum(gp.kills for gp in tournament_games)
-    total_deaths = sum(gp.deaths for gp in tournament_games)
-    total_assists = sum(gp.assists for gp in tournament_games)
-    total_damage = sum(gp.damage for gp in tournament_games)
-    total_healing = sum(gp.healing for gp in tournament_games)
-    total_blocked = sum(gp.damage_blocked for gp in tournament_games)
-    total_final_hits = sum(gp.final_hits for gp in tournament_games)
-    avg_accuracy = round(sum(gp.accuracy_pct for gp in tournament_games) / len(tournament_games), 2) if tournament_games else 0
-    max_damage = max((gp.damage for gp in tournament_games), default=0)
-    max_healing = max((gp.healing for gp in tournament_games), default=0)
-    max_blocked = max((gp.damage_blocked for gp in tournament_games), default=0)
-
-    kda_ratio = round((total_kills + total_assists) / (total_deaths if total_deaths > 0 else 1), 2)
-    game_count = len(tournament_games)
+
+    # The player's games in this tournament only, with the medals they won in each
+    game_players = db.session.scalars(
+        sa.select(models.GamePlayers)
+        .join(models.Game)
+        .where(models.GamePlayers.player_id == pid, models.Game.tournament_id == tid)
+        .order_by(models.Game.round, models.Game.id)
+        .options(contains_eager(models.GamePlayers.game), selectinload(models.GamePlayers.hero))
+    ).all()
+    game_medals = defaultdict(list)
+    for game_id, medal_name in db.session.execute(
+        sa.select(models.GameMedals.game_id, models.Medal.medal_name)
+        .join(models.Medal)
+        .join(models.Game)
+        .where(models.GameMedals.player_id == pid, models.Game.tournament_id == tid)
+    ):
+        game_medals[game_id].append(medal_name)
+    current_game_player = next((gp for gp in game_players if current_game and gp.game_id == current_game.id), None)
+
+    # Totals are precomputed as games are imported, see app/aggregates.py.
+    # There is one row per team the player played for, usually just one.
+    totals = stats.PlayerTotals.for_player(tid, pid)
+
+    total_kills = totals.total("kills")
+    total_deaths = totals.total("deaths")
+    total_assists = totals.total("assists")
+    total_damage = totals.total("damage")
+    total_healing = totals.total("healing")
+    total_blocked = totals.total("damage_blocked")
+    total_final_hits = totals.total("final_hits")
+    game_count = totals.total("games")
+    avg_accuracy = round(float(stats.safe_divide(totals.total("accuracy_total"), game_count)), 2)
+    max_damage = totals.max("max_damage")
+    max_healing = totals.max("max_healing")
+    max_blocked = totals.max("max_blocked")
+
+    kda_ratio = round(float(stats.kda(total_kills, total_deaths, total_assists)), 2)
+    # Elo rating over every tournament, see app/ratings.py
+    player_rating = db.session.get(models.PlayerRating, pid)
 
     player_summary = {
         "total_kills": total_kills,
@@ -792,73 +852,23 @@ def tournament_player_view():
     # team_id check
     # Get the team ID from the player's game players
 
-    team_ids = list({gp.team_id for gp in tournament_games if gp.team_id})
-    team_id = team_ids[0] if team_ids else None
-
-    if team_id:
-        # game_players for the team in the tournament
-        team_gps = db.session.scalars(
-            sa.select(models.GamePlayers)
-            .where(
-                models.GamePlayers.team_id == team_id,
-                models.GamePlayers.game.has(models.Game.tournament_id == tid)
-            )
-        ).all()
-
-        # calculate team stats
-        from collections import defaultdict
-
-        player_stats = defaultdict(lambda: {
-            "games": 0,
-            "damage": 0,
-            "kills": 0,
-            "deaths": 0,
-            "assists": 0,
-            "healing": 0,
-            "blocked": 0
-        })
-
-        for gp in team_gps:
-            pid = gp.player_id
-            player_stats[pid]["games"] += 1
-            player_stats[pid]["damage"] += gp.damage or 0
-            player_stats[pid]["kills"] += gp.kills or 0
-            player_stats[pid]["deaths"] += gp.deaths or 0
-            player_stats[pid]["assists"] += gp.assists or 0
-            player_stats[pid]["healing"] += gp.healing or 0
-            player_stats[pid]["blocked"] += gp.damage_blocked or 0
-
-        # average stats for the team
-        def safe_div(n, d): return round(n / d, 2) if d else 0
-
-        num_players = len(player_stats)
-        avg_stats = {
-            "avg_damage": 0,
-            "avg_kills": 0,
-            "avg_deaths": 0,
-            "avg_assists": 0,
-            "avg_healing": 0,
-            "avg_blocked": 0
-        }
-
-        for stat in avg_stats:
-            for s in player_stats.values():
-                avg = safe_div(s[stat.replace("avg_", "")], s["games"])
-                avg_stats[stat] += avg
-            avg_stats[stat] = round(avg_stats[stat] / num_players, 2) if num_players else 0
-
-        team_radar_data = avg_stats
-    else:
-        team_radar_data = {
-            "avg_damage": 0,
-            "avg_kills": 0,
-            "avg_deaths": 0,
-            "avg_assists": 0,
-            "avg_healing": 0,
-            "avg_blocked": 0
-        }
-
+    # The team the player played the most games for
+    team_id = totals.most_played("team_id")
 
+    stat_columns = {
+        "avg_damage": "damage",
+        "avg_kills": "kills",
+        "avg_deaths": "deaths",
+        "avg_assists": "assists",
+        "avg_healing": "healing",
+        "avg_blocked": "damage_blocked",
+    }
+    # average stats for the team, the mean of each player's per game average
+    team_totals = stats.PlayerTotals.for_team(tid, team_id) if team_id else None
+    team_radar_data = {
+        stat: round(team_totals.mean_per_game(column), 2) if team_totals else 0
+        for stat, column in stat_columns.items()
+    }
 
     player_cards = [
     {"label": "Total KDA Ratio", "value": player_summary["kda_ratio"]},
@@ -881,10 +891,150 @@ def tournament_player_view():
     {"label": "Max Damage", "value": player_summary["max_damage"]},
     {"label": "Max Healing", "value": player_summary["max_healing"]},
     {"label": "Max Blocked", "value": player_summary["max_blocked"]},
+    {"label": "Rating (All Tournaments)", "value": round(player_rating.rating) if player_rating else "N/A"},
     ]
 
 
-    return render_template("pages/stats_player.html", player=player, player_games=player_games,current_game=current_game, tournament=tournament, player_summary=player_summary, player_cards=player_cards,radar_data=radar_data, team_id=team_id, team_radar_data=team_radar_data)
+    return render_template("pages/stats_player.html", player=player, game_players=game_players, game_medals=game_medals, current_game=current_game, current_game_player=current_game_player, tournament=tournament, player_summary=player_summary, player_cards=player_cards,radar_data=radar_data, team_id=team_id, team_radar_data=team_radar_data)
+
+
+
+def leaderboard_args():
+    """The tournament, sort metric, offset and limit requested from a leaderboard."""
+    tid = request.args.get("t", type=int)
+    sort = request.args.get("sort", default=leaderboard.DEFAULT_METRIC)
+    if sort not in leaderboard.METRICS:
+        sort = leaderboard.DEFAULT_METRIC
+    offset = max(0, request.args.get("offset", default=0, type=int))
+    limit = request.args.get("limit", default=leaderboard.PAGE_SIZE, type=int)
+    limit = max(1, min(limit, leaderboard.MAX_PAGE_SIZE))
+    tournament = db.session.get(models.Tournament, tid) if tid else None
+    return tournament, sort, offset, limit
+
+
+@app.route("/tournament/leaderboard")
+def tournament_leaderboard_page():
+    """Every player in a tournament ranked on one metric, with their rank and percentile on each."""
+    tournament, sort, offset, limit = leaderboard_args()
+    if not tournament:
+        return render_template("pages/404.html", error="Invalid tournament ID"), 404
+
+    if not tournament.user_can_view(current_user):
+        return render_template("pages/404.html", error=f"You do not have access to this tournament."), 403
+
+    players, total = leaderboard.page(tournament.id, sort, offset, limit)
+    return render_template("pages/leaderboard.html", tournament=tournament, players=players, total=total,
+                           metrics=leaderboard.METRICS, sort=sort, offset=offset, limit=limit)
+
+
+@app.route("/api/leaderboard", methods=['GET'])
+def api_get_leaderboard():
+    """API endpoint for a page of a tournament's leaderboard sorted by `sort`, best first.
+    Pages are requested with `offset` and `limit`."""
+    tournament, sort, offset, limit = leaderboard_args()
+    if not tournament:
+        return jsonify({'error': 'Tournament not found'}), 404
+
+    if not tournament.user_can_view(current_user):
+        return jsonify({'error': 'You do not have access to this tournament'}), 403
+
+    players, total = leaderboard.page(tournament.id, sort, offset, limit)
+    return jsonify({'players': players, 'total': total, 'sort': sort, 'offset': offset})
+
+
+@app.route("/api/bracket", methods=['GET'])
+def api_get_bracket():
+    """API endpoint for tournament `t`'s bracket: its matches in each round, who won
+    them and which match each winner went on to, see brackets.load."""
+    tid = request.args.get('t', type=int)
+    tournament = db.session.get(models.Tournament, tid) if tid else None
+    if not tournament:
+        return jsonify({'error': 'Tournament not found'}), 404
+
+    if not tournament.user_can_view(current_user):
+        return jsonify({'error': 'You do not have access to this tournament'}), 403
+
+    return jsonify(brackets.load(tid))
+
+
+@app.route("/player")
+def player_career_page():
+    """A player's career: totals over every tournament the user can view, and their
+    totals in each of those tournaments and with each hero."""
+    pid = request.args.get("id", type=int)
+    player = db.session.get(models.Player, pid) if pid else None
+    if not player:
+        return render_template("pages/404.html", error=f"Player with ID {pid} not found."), 404
+
+    return render_template("pages/player_career.html", player=player, career=careers.career(current_user, pid))
+
+
+# /api/meta/<dimension> path segment -> dimension name in app/meta.py
+META_DIMENSIONS = {'heroes': 'hero', 'roles': 'role', 'maps': 'map', 'modes': 'mode'}
+
+
+@app.route("/api/meta/<dimension>", methods=['GET'])
+def api_get_meta(dimension):
+    """API endpoint for pick rates, win rates and average stats per hero, role, map or game
+    mode. `by` adds more dimensions to group by (e.g. /api/meta/heroes?by=map), and
+    `hero`, `role`, `map` and `mode` filter by id. Covers tournament `t`, or every
+    public tournament if it isn't given."""
+    if dimension not in META_DIMENSIONS:
+        return jsonify({'error': 'Unknown dimension'}), 404
+    group_by = [META_DIMENSIONS[dimension]]
+    for name in request.args.get('by', '').split(','):
+        name = META_DIMENSIONS.get(name, name)
+        if name in meta.DIMENSIONS and name not in group_by:
+            group_by.append(name)
+    filters = {name: request.args.get(name, type=int) for name in meta.DIMENSIONS if request.args.get(name, type=int)}
+
+    tid = request.args.get('t', type=int)
+    if tid is not None:
+        tournament = db.session.get(models.Tournament, tid)
+        if not tournament:
+            return jsonify({'error': 'Tournament not found'}), 404
+        if not tournament.user_can_view(current_user):
+            return jsonify({'error': 'You do not have access to this tournament'}), 403
+
+    return jsonify({'group_by': group_by, 'filters': filters, 'rows': meta.meta_slice(group_by, filters, tid)})
+
+
+@app.route("/api/h2h", methods=['GET'])
+def api_get_head_to_head():
+    """API endpoint for head-to-head records: wins, draws and each team's totals and per
+    game differentials against the other. Gives teams `a` and `b`'s record, or every
+    pair's if they aren't given. Covers tournament `t`, or every public tournament if
+    it isn't given."""
+    team_a = request.args.get('a', type=int)
+    team_b = request.args.get('b', type=int)
+    if (team_a is None) != (team_b is None):
+        return jsonify({'error': 'Give both teams a and b, or neither'}), 400
+    if team_a is not None and team_a == team_b:
+        return jsonify({'error': 'Teams a and b must be different'}), 400
+
+    tid = request.args.get('t', type=int)
+    if tid is not None:
+        tournament = db.session.get(models.Tournament, tid)
+        if not tournament:
+            return jsonify({'error': 'Tournament not found'}), 404
+        if not tournament.user_can_view(current_user):
+            return jsonify({'error': 'You do not have access to this tournament'}), 403
+
+    team_ids = (team_a, team_b) if team_a is not None else None
+    return jsonify({'records': head_to_head.records(tid, team_ids)})
+
+
+@app.route("/metrics")
+def metrics_page():
+    """Request, database, template and import metrics from every process, in Prometheus'
+    text format, see app/metrics.py. Scrapers send METRICS_TOKEN as a bearer token, and
+    without one configured the page doesn't exist."""
+    token = app.config['METRICS_TOKEN']
+    if not token:
+        return render_template("pages/404.html", error="Page not found"), 404
+    if not metrics_authorised(request.headers.get('Authorization', ''), token):
+        return Response("Unauthorised\n", status=401, mimetype='text/plain', headers={'WWW-Authenticate': 'Bearer'})
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 
 @app.route("/help/csv-guide/", defaults={'variant': 'example'})
@@ -903,25 +1053,26 @@ def csv_guide(variant):
     except (ValueError, TypeError):
         num_teams = 8
 
+    seed = None
     if variant == "template":
         csv_file_name = "guide_template.csv"
     elif variant == "random":
-        csv_file_name = "guide_random.csv"
-        csv_file_path = os.path.join(os.path.dirname(__file__), "static/csv_samples", csv_file_name)
-        csvg.generate_csv(
-            csv_file_path, 
-            heroes=csvg.fetch_heroes(),
-            medals=csvg.fetch_medals(),
-            maps=csvg.fetch_maps(),
-            modes=csvg.fetch_modes(),
-            num_teams=num_teams
-        )
+        # Generated in memory and cached, the seed in the page's links gives the same CSV back
+        seed = request.args.get("seed", type=int)
+        if seed is None:
+            seed = random.randrange(2 ** 31)
+        csv_data = csvg.sample_csv(num_teams, seed)
+        if request.args.get("download"):
+            return Response(csv_data, mimetype="text/csv", headers={
+                "Content-Disposition": f"attachment; filename=guide_random_{num_teams}_teams_{seed}.csv"
+            })
+        return render_template("pages/csv_guide.html", csv_data=csv_data, variant=variant, num_teams=num_teams, seed=seed)
     else:
         csv_file_name = "guide_example.csv"
     csv_file_path = os.path.join(os.path.dirname(__file__), "static/csv_samples", csv_file_name)
     with open(csv_file_path, "r", encoding="utf-8") as f:
         csv_data = f.read()
-    return render_template("pages/csv_guide.html", csv_data=csv_data, variant=variant, num_teams=num_teams)
+    return render_template("pages/csv_guide.html", csv_data=csv_data, variant=variant, num_teams=num_teams, seed=seed)
 
 # 404 not found page
 @app.errorhandler(404)
@@ -0,0 +1,93 @@
+'''Full-text search over tournament titles and descriptions.
+
+tournament_fts is an SQLite FTS5 table using the tournament table as its external
+content, so it only stores the index. Triggers on the tournament table keep it in step
+with every insert, update and delete, including bulk ones that skip the ORM. The table
+and triggers are created by a migration, and here with the tournament table for
+db.create_all() (e.g. in tests).
+
+NOTE: FTS5 is SQLite only.
+'''
+import sqlalchemy as sa
+from markupsafe import escape
+from app import db
+from app.models import Tournament
+
+FTS_TABLE = 'tournament_fts'
+
+FTS_DDL = [
+    f'''CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        title, description,
+        content='tournament', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )''',
+    f'''CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON tournament BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END''',
+    f'''CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON tournament BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+    END''',
+    f'''CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE ON tournament BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END''',
+]
+
+for statement in FTS_DDL:
+    sa.event.listen(Tournament.__table__, 'after_create', sa.DDL(statement).execute_if(dialect='sqlite'))
+sa.event.listen(Tournament.__table__, 'after_drop', sa.DDL(f'DROP TABLE IF EXISTS {FTS_TABLE}').execute_if(dialect='sqlite'))
+
+# Private use characters mark the matched terms in highlights, so the text can be
+# escaped before they are turned into <mark> tags
+MATCH_START = '\ue000'
+MATCH_END = '\ue001'
+SNIPPET_TOKENS = 16
+
+fts = sa.table(FTS_TABLE, sa.column('rowid', sa.Integer), sa.column('rank', sa.Float))
+
+
+def match_query(search):
+    '''Turn what was typed in the search box into an FTS5 query matching tournaments
+    that contain a word starting with each of the typed words.
+    Returns None if there is nothing to search for.'''
+    words = search.split()
+    if not words:
+        return None
+    # Quoting each word stops FTS5 treating characters like - or * as operators
+    return ' '.join('"' + word.replace('"', '""') + '"*' for word in words)
+
+
+def matches(query):
+    '''Subquery of the tournaments matching an FTS5 query, with their rank (lower is a
+    better match), highlighted title and a snippet of the description.'''
+    table = sa.literal_column(FTS_TABLE)
+    return (
+        sa.select(
+            fts.c.rowid.label('id'),
+            fts.c.rank.label('rank'),
+            sa.func.highlight(table, 0, MATCH_START, MATCH_END).label('title_highlight'),
+            sa.func.snippet(table, 1, MATCH_START, MATCH_END, '…', SNIPPET_TOKENS).label('snippet'),
+        )
+        .where(table.op('MATCH')(query))
+        .subquery('matches')
+    )
+
+
+def rank_of(query, tournament_id):
+    '''The rank of one tournament for a query, used to continue a ranked page after it.'''
+    return db.session.scalar(
+        sa.select(fts.c.rank)
+        .where(sa.literal_column(FTS_TABLE).op('MATCH')(query), fts.c.rowid == tournament_id)
+    )
+
+
+def to_html(text):
+    '''Escape a highlight or snippet and wrap its matched terms in <mark> tags.'''
+    if text is None:
+        return None
+    return str(escape(text)).replace(MATCH_START, '<mark>').replace(MATCH_END, '</mark>')
+
+
+def rebuild():
+    '''Rebuild the index from the tournament table, e.g. after restoring a database.'''
+    db.session.execute(sa.text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
@@ -0,0 +1,132 @@
+'''Vectorised statistics for the team and player pages.
+
+Each page selects the columns it needs with one Core query and loads them into NumPy
+arrays, so sums, averages, maxima, rates and rankings are array operations rather
+than Python loops over ORM objects. Tournament totals per player come from the
+precomputed player_tournament_stats table (see app/aggregates.py) rather than being
+reduced from game_players on every request. The team chart's series is reduced from
+game_players with grouped sums, one point per game as the chart has always shown, in
+round order; a round with several games has several points.
+'''
+import numpy as np
+import sqlalchemy as sa
+from app import db
+from app import models as m
+
+# Columns of player_tournament_stats loaded by PlayerTotals
+TOTAL_COLUMNS = [
+    'team_id', 'player_id', 'games', 'kills', 'deaths', 'assists', 'final_hits', 'damage',
+    'damage_blocked', 'healing', 'accuracy_total', 'medals', 'max_damage', 'max_healing', 'max_blocked',
+]
+
+
+def load_columns(stmt):
+    '''Run a Core select and return {column name: NumPy array} with one array per column.'''
+    result = db.session.execute(stmt)
+    names = list(result.keys())
+    rows = result.all()
+    if not rows:
+        return {name: np.zeros(0, dtype=np.int64) for name in names}
+    return {name: np.asarray(column) for name, column in zip(names, zip(*rows))}
+
+
+def safe_divide(numerator, denominator):
+    '''Element-wise numerator / denominator, with 0 where the denominator is 0.'''
+    numerator = np.asarray(numerator, dtype=np.float64)
+    denominator = np.asarray(denominator, dtype=np.float64)
+    return np.divide(numerator, denominator, out=np.zeros(np.broadcast(numerator, denominator).shape), where=denominator != 0)
+
+
+def kda(kills, deaths, assists):
+    '''(kills + assists) / deaths, counting no deaths as one.'''
+    return safe_divide(np.asarray(kills) + np.asarray(assists), np.maximum(deaths, 1))
+
+
+def group_sum(keys, values):
+    '''Sum values by key. Returns (sorted unique keys, sums).'''
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    sums = np.bincount(inverse, weights=values, minlength=len(unique_keys))
+    return unique_keys, sums.astype(np.asarray(values).dtype)
+
+
+class PlayerTotals:
+    '''Tournament totals for a set of players, one row per player and team they played
+    for, held as NumPy arrays in `columns` along with each player's gamertag.'''
+
+    def __init__(self, columns):
+        self.columns = columns
+
+    @classmethod
+    def select(cls, *where):
+        ps = m.PlayerTournamentStats
+        return cls(load_columns(
+            sa.select(*(getattr(ps, name) for name in TOTAL_COLUMNS), m.Player.gamertag)
+            .join(m.Player, m.Player.id == ps.player_id)
+            .where(*where)
+            .order_by(m.Player.gamertag, ps.team_id)
+        ))
+
+    @classmethod
+    def for_team(cls, tournament_id, team_id):
+        ps = m.PlayerTournamentStats
+        return cls.select(ps.tournament_id == tournament_id, ps.team_id == team_id)
+
+    @classmethod
+    def for_player(cls, tournament_id, player_id):
+        ps = m.PlayerTournamentStats
+        return cls.select(ps.tournament_id == tournament_id, ps.player_id == player_id)
+
+    def __len__(self):
+        return len(self.columns['player_id'])
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def total(self, name):
+        return int(self[name].sum())
+
+    def max(self, name):
+        return int(self[name].max()) if len(self) else 0
+
+    def per_game(self, name):
+        '''Each row's average of a column per game played.'''
+        return safe_divide(self[name], self['games'])
+
+    def mean_per_game(self, name):
+        '''The average over the rows of each row's per game average.'''
+        return float(self.per_game(name).mean()) if len(self) else 0.0
+
+    def top(self, name):
+        '''The gamertag with the highest per game average of a column, or None.'''
+        if not len(self):
+            return None
+        return str(self['gamertag'][np.argmax(self.per_game(name))])
+
+    def most_played(self, name):
+        '''The value of a column in the row with the most games, or None.'''
+        if not len(self):
+            return None
+        return int(self[name][np.argmax(self['games'])])
+
+    def players(self):
+        '''(player id, gamertag) for each row.'''
+        return list(zip(self['player_id'].tolist(), self['gamertag'].tolist()))
+
+
+def team_game_series(tournament_id, team_id, names=('kills', 'damage', 'healing')):
+    '''The team's total of each column for every game it played, in round order.
+    Returns (rounds, {column name: list of totals}).'''
+    gp, g = m.GamePlayers, m.Game
+    columns = load_columns(
+        sa.select(g.id.label('game_id'), g.round, *(getattr(gp, name) for name in names))
+        .join(g, g.id == gp.game_id)
+        .where(gp.team_id == team_id, g.tournament_id == tournament_id)
+    )
+    game_ids, inverse = np.unique(columns['game_id'], return_inverse=True)
+    rounds = np.zeros(len(game_ids), dtype=np.int64)
+    rounds[inverse] = columns['round']
+
+    # Games are ordered by round, then by id within a round
+    order = np.lexsort((game_ids, rounds))
+    totals = {name: group_sum(columns['game_id'], columns[name])[1][order].tolist() for name in names}
+    return rounds[order].tolist(), totals
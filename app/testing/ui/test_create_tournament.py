@@ -6,8 +6,10 @@ from selenium.webdriver.support import expected_conditions as EC
 from app.testing.ui.base_test import BaseSeleniumTests
 from app import db
 from app.models import Tournament, Visibility, Role, HeroRole, GameMode, Map, Game, Team, Player, GamePlayers, GameMedals, Medal
-from data_import import split_line, process_lines, MATCH_ROUND
+from data_import import read_rows, process_lines, MATCH_ROUND
 from seed import MAPS, populate_heros
+from app.import_jobs import import_jobs
+from urllib.parse import urlparse, parse_qs
 
 class TestUIDataImport(BaseSeleniumTests):
     """
@@ -67,6 +69,13 @@ class TestUIDataImport(BaseSeleniumTests):
         driver.find_element(By.ID, "login-button").click()
         WebDriverWait(driver, 10).until(EC.url_contains("/home"))
 
+    def wait_for_import_job(self):
+        '''Wait for the background import started by the create tournament form.'''
+        job_id = parse_qs(urlparse(self.driver.current_url).query)['job'][0]
+        job = import_jobs.get(job_id)
+        job.wait(timeout=20)
+        return job
+
     def test01_create_tournament_with_valid_csv(self):
         driver = self.driver
         driver.get(self.get_full_url("/create-tournament"))
@@ -88,15 +97,14 @@ class TestUIDataImport(BaseSeleniumTests):
         submit = WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.CSS_SELECTOR, "input[type='submit'][value='Create Tournament']")))
         submit.click()
         WebDriverWait(driver, 20).until(EC.visibility_of_element_located((By.ID, "success-message")))
-        
+        self.wait_for_import_job()
+
         # Database assertions driven by parser
         with self._app.app_context():
             tour = Tournament.query.filter_by(title=tournament_name).first()
             self.assertIsNotNone(tour, "Tournament not created.")
             # parse CSV
-            with open(valid_csv_path, 'r') as rf:
-                rows = [split_line(l) for l in rf]
-            games_data = process_lines(rows)
+            games_data = process_lines(read_rows(valid_csv_path))
             for header, medal_rows, player_rows in games_data:
                 rnd = int(header[MATCH_ROUND])
                 game_db = Game.query.filter_by(tournament_id=tour.id, round=rnd).first()
@@ -128,8 +136,11 @@ class TestUIDataImport(BaseSeleniumTests):
         driver.find_element(By.ID, "teams").send_keys("Team Test")
         btn = WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.CSS_SELECTOR, "input[type='submit'][value='Create Tournament']")))
         btn.click()
-        msg = WebDriverWait(driver, 10).until(EC.visibility_of_element_located((By.ID, "danger-message")))
-        self.assertIn("Tournament creation failed!", msg.text)
+        # The tournament is created straight away, the CSV import then fails in the background
+        msg = WebDriverWait(driver, 10).until(EC.visibility_of_element_located((By.ID, "success-message")))
+        self.assertIn("Tournament created!", msg.text)
+        job = self.wait_for_import_job()
+        self.assertEqual(job.status, 'failed')
         with self._app.app_context():
             self.assertEqual(Game.query.count(), 0)
             self.assertEqual(Player.query.count(), 0)
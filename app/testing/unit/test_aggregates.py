@@ -0,0 +1,78 @@
+import io
+import unittest
+from collections import defaultdict
+
+from unit_base import DatabaseTestCase, VALID_CSV
+from app import db, aggregates
+from app.models import (
+    Game,
+    GamePlayers,
+    GameMedals,
+    PlayerTournamentStats,
+    TeamTournamentStats,
+)
+from data_import import import_csv, read_rows, process_lines
+
+
+class TestAggregates(DatabaseTestCase):
+    """Tests for the precomputed player and team statistics tables."""
+
+    def setUp(self):
+        self.clear_tables()
+
+        self.tournament = self.add_tournament(csv=None)
+
+    def player_stats(self):
+        return {
+            (ps.team_id, ps.player_id): (ps.games, ps.kills, ps.deaths, ps.damage, ps.accuracy_total, ps.medals, ps.max_damage)
+            for ps in PlayerTournamentStats.query.filter_by(tournament_id=self.tournament.id)
+        }
+
+    def team_stats(self):
+        return {
+            ts.team_id: (ts.games, ts.wins, ts.player_rows, ts.kills, ts.healing, ts.medals, ts.max_round)
+            for ts in TeamTournamentStats.query.filter_by(tournament_id=self.tournament.id)
+        }
+
+    def test_import_matches_game_rows(self):
+        import_csv(str(VALID_CSV), self.tournament)
+
+        expected = defaultdict(lambda: [0, 0, 0, 0, 0, 0, 0])
+        for gp in GamePlayers.query.all():
+            totals = expected[(gp.team_id, gp.player_id)]
+            totals[0] += 1
+            totals[1] += gp.kills
+            totals[2] += gp.deaths
+            totals[3] += gp.damage
+            totals[4] += gp.accuracy_pct
+            totals[5] += GameMedals.query.filter_by(game_id=gp.game_id, player_id=gp.player_id).count()
+            totals[6] = max(totals[6], gp.damage)
+        self.assertEqual(self.player_stats(), {key: tuple(totals) for key, totals in expected.items()})
+
+        games = Game.query.all()
+        for team_id, (games_played, wins, player_rows, *_rest, max_round) in self.team_stats().items():
+            team_games = [g for g in games if team_id in (g.team_a_id, g.team_b_id)]
+            self.assertEqual(games_played, len(team_games))
+            self.assertEqual(wins, sum(g.winning_team == team_id for g in team_games))
+            self.assertEqual(player_rows, GamePlayers.query.filter_by(team_id=team_id).count())
+            self.assertEqual(max_round, max(g.round for g in team_games))
+
+    def test_incremental_upload_matches_rebuild(self):
+        # Import the first 3 games, then the whole file, so the totals are built in two steps
+        lines = VALID_CSV.read_text().splitlines(keepends=True)
+        first_games = list(process_lines(read_rows(str(VALID_CSV))))[:3]
+        partial_len = sum(1 + len(medals) + len(players) for _, medals, players in first_games)
+        import_csv(io.BytesIO(''.join(lines[:partial_len]).encode('utf-8')), self.tournament)
+        import_csv(str(VALID_CSV), self.tournament)
+
+        player_stats, team_stats = self.player_stats(), self.team_stats()
+        self.assertEqual(sum(games for games, *_ in team_stats.values()), 2 * Game.query.count())
+
+        self.assertEqual(aggregates.rebuild(self.tournament.id), 7)
+        db.session.commit()
+        self.assertEqual(self.player_stats(), player_stats)
+        self.assertEqual(self.team_stats(), team_stats)
+
+
+if __name__ == "__main__":
+    unittest.main()
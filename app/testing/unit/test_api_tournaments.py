@@ -0,0 +1,110 @@
+import unittest
+
+from unit_base import DatabaseTestCase
+from flask import g
+from app import db
+from app.models import (
+    Role,
+    User,
+    Tournament,
+    TournamentUsers,
+)
+from flask_login import AnonymousUserMixin
+from app.consts import ROLE, PERMISSION
+
+FILTERS = ['all', 'owned', 'shared', 'discover']
+
+
+class TestApiTournaments(DatabaseTestCase):
+    """Tests for the filtering and paging of /api/tournaments."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        owner_role = Role.query.filter_by(role_name=ROLE.OWNER).one().id
+        default_role = Role.query.filter_by(role_name=ROLE.DEFAULT).one().id
+
+        cls.owner = User(username="owner", email="owner@example.com", global_role_id=1)
+        cls.viewer = User(username="viewer", email="viewer@example.com", global_role_id=1)
+        db.session.add_all([cls.owner, cls.viewer])
+        db.session.flush()
+
+        # (title, visibility, {user: role})
+        tournaments = [
+            ("Public owned", 'public', {cls.owner: owner_role}),
+            ("Private owned", 'private', {cls.owner: owner_role}),
+            ("Private shared", 'private', {cls.owner: owner_role, cls.viewer: default_role}),
+            ("Public shared", 'public', {cls.owner: owner_role, cls.viewer: default_role}),
+            ("Public other", 'public', {}),
+            ("Private other", 'private', {}),
+        ]
+        for title, visibility, users in tournaments:
+            t = cls.add_tournament(visibility, title=title, csv=None)
+            db.session.add_all([
+                TournamentUsers(tournament_id=t.id, user_id=user.id, tournament_role_id=role_id)
+                for user, role_id in users.items()
+            ])
+        db.session.commit()
+
+    def setUp(self):
+        self.client = self.app.test_client()
+
+    def login(self, user):
+        with self.client.session_transaction() as sess:
+            sess.clear()
+            if user is not None:
+                sess['_user_id'] = str(user.id)
+        # The test's app context is shared with requests, so drop the cached login
+        g.pop('_login_user', None)
+
+    def expected_ids(self, user, filter_type, search=''):
+        '''The tournaments the filter should return, using the model's own permission checks.'''
+        user = user or AnonymousUserMixin()
+        ids = []
+        for t in Tournament.query.order_by(Tournament.id):
+            if search and search not in t.title.lower():
+                continue
+            role = t.get_user_role(user)
+            is_owner = role is not None and role.role_name == ROLE.OWNER
+            is_public = t.visibility.visibility == 'public'
+            is_shared = t.user_has_permission(user, PERMISSION.READ) and not is_owner
+            if ((filter_type == 'owned' and is_owner)
+                    or (filter_type == 'shared' and is_shared and not is_public)
+                    or (filter_type == 'discover' and is_public and not is_owner and not is_shared)
+                    or (filter_type == 'all' and (is_owner or is_shared or is_public))):
+                ids.append(t.id)
+        return ids
+
+    def test_filters_match_permissions(self):
+        for user in (self.owner, self.viewer, None):
+            self.login(user)
+            for filter_type in FILTERS:
+                with self.subTest(user=user, filter=filter_type):
+                    data = self.client.get(f"/api/tournaments?filter={filter_type}").get_json()
+                    expected = self.expected_ids(user, filter_type)
+                    self.assertEqual([t['id'] for t in data['tournaments']], expected)
+                    self.assertEqual(data['total'], len(expected))
+
+    def test_search_filters_titles(self):
+        self.login(self.viewer)
+        data = self.client.get("/api/tournaments?filter=all&search=SHARED").get_json()
+        self.assertEqual([t['id'] for t in data['tournaments']], self.expected_ids(self.viewer, 'all', 'shared'))
+        self.assertTrue(all(t['is_shared'] and not t['is_owner'] for t in data['tournaments']))
+
+    def test_keyset_pagination(self):
+        self.login(self.owner)
+        ids, after = [], None
+        while True:
+            url = "/api/tournaments?filter=all&limit=2" + (f"&after={after}" if after is not None else "")
+            data = self.client.get(url).get_json()
+            self.assertLessEqual(len(data['tournaments']), 2)
+            self.assertEqual(data['total'], len(self.expected_ids(self.owner, 'all')))
+            ids += [t['id'] for t in data['tournaments']]
+            after = data['next_after']
+            if after is None:
+                break
+        self.assertEqual(ids, self.expected_ids(self.owner, 'all'))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,41 +1,17 @@
 import os
 import unittest
-from app import app as main_app, db
+from unit_base import DatabaseTestCase
+from app import db
 from app.models import User, Visibility
 from app.forms import SignupForm, LoginForm, CreateTournamentForm
 from werkzeug.datastructures import MultiDict
 
 
-class TestForms(unittest.TestCase):
+class TestForms(DatabaseTestCase):
     """Core tests for form validation: signup, login, create tournament."""
 
-    @classmethod
-    def setUpClass(cls):
-        cls.app = main_app
-        cls.app.config['TESTING'] = True
-        cls.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
-        cls.app.config['WTF_CSRF_ENABLED'] = False
-        cls.app_context = cls.app.app_context()
-        cls.app_context.push()
-        db.drop_all()
-        db.create_all()
-        # seed visibility options
-        db.session.add_all([
-            Visibility(visibility="public"),
-            Visibility(visibility="private")
-        ])
-        db.session.commit()
-
-    @classmethod
-    def tearDownClass(cls):
-        db.session.remove()
-        db.drop_all()
-        cls.app_context.pop()
-
     def setUp(self):
-        # clear users
-        User.query.delete()
-        db.session.commit()
+        self.clear_tables()
         # add existing user
         user = User(username="existing", email="exists@example.com", global_role_id=1)
         user.set_password("password")
@@ -0,0 +1,39 @@
+import unittest
+
+from benchmarks import compare
+
+
+def results(**benchmarks):
+    return {'results': {'8 teams': benchmarks}}
+
+
+def measured(wall_ms, queries=10, peak_kib=1000):
+    return {'wall_ms': wall_ms, 'queries': queries, 'peak_kib': peak_kib}
+
+
+class TestBenchmarkCompare(unittest.TestCase):
+    """Tests for comparing benchmark results with a baseline."""
+
+    def test_regressions_are_flagged(self):
+        baseline = results(tournament_page=measured(100), import_csv=measured(500, queries=60))
+        current = results(tournament_page=measured(130), import_csv=measured(500, queries=61))
+        self.assertEqual(compare.compare(baseline, current, threshold=0.2), [
+            ('8 teams', 'tournament_page', 'wall_ms', 100, 130),
+            ('8 teams', 'import_csv', 'queries', 60, 61),
+        ])
+
+    def test_noise_and_new_benchmarks_are_ignored(self):
+        baseline = results(tournament_page=measured(1.0, peak_kib=10))
+        current = results(
+            # Doubled, but by less than the smallest increase that counts
+            tournament_page=measured(2.0, peak_kib=20),
+            api_tournaments=measured(50),
+        )
+        self.assertEqual(compare.compare(baseline, current), [])
+        # Getting faster or using fewer queries isn't a regression
+        self.assertEqual(compare.compare(results(tournament_page=measured(100, queries=12)),
+                                         results(tournament_page=measured(50, queries=8))), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
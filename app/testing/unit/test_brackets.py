@@ -0,0 +1,85 @@
+import unittest
+from types import SimpleNamespace
+
+from unit_base import DatabaseTestCase
+from app import db, brackets
+from app.models import (
+    Visibility,
+    Team,
+)
+
+
+class TestBrackets(DatabaseTestCase):
+    """Tests for the stored tournament brackets and /api/bracket."""
+
+    def setUp(self):
+        self.clear_tables()
+
+        self.tournament = self.add_tournament()
+        self.client = self.app.test_client()
+
+    def team_id(self, name):
+        return Team.query.filter_by(team_name=name).one().id
+
+    def test_bracket_from_import(self):
+        bracket = brackets.load(self.tournament.id)
+        self.assertEqual([len(r['matches']) for r in bracket['rounds']], [4, 2, 1])
+        self.assertEqual(bracket['champion'], self.team_id("Team3"))
+        self.assertEqual(bracket['teams'][self.team_id("Team8")], "Team8")
+
+        matches = {m['id']: m for r in bracket['rounds'] for m in r['matches']}
+        for match in matches.values():
+            if match['next'] is not None:
+                # The winner plays in the match they advance to
+                self.assertIn(match['winner'], matches[match['next']]['teams'])
+        self.assertIsNone(bracket['rounds'][-1]['matches'][0]['next'])
+
+        # Round 2 is in the order of the round 1 matches that feed it
+        team1, team3 = self.team_id("Team1"), self.team_id("Team3")
+        self.assertEqual(set(bracket['rounds'][1]['matches'][0]['teams']), {team1, team3})
+
+        status = brackets.team_status(bracket)
+        self.assertEqual(status[team3], 'winner')
+        self.assertEqual(list(status.values()).count('loser'), 7)
+
+        # Rebuilding gives the same bracket
+        brackets.rebuild(self.tournament.id)
+        db.session.commit()
+        rebuilt = brackets.load(self.tournament.id)
+        self.assertEqual(
+            [[(m['teams'], m['wins'], m['winner']) for m in r['matches']] for r in rebuilt['rounds']],
+            [[(m['teams'], m['wins'], m['winner']) for m in r['matches']] for r in bracket['rounds']]
+        )
+
+    def test_series_and_unfinished_final(self):
+        def game(id_, round_, team_a, team_b, winner):
+            return SimpleNamespace(id=id_, round=round_, team_a_id=team_a, team_b_id=team_b,
+                                   winning_team=winner, is_draw=winner is None)
+
+        nodes, next_node = brackets.build_nodes([
+            game(1, 1, 1, 2, 1), game(2, 1, 2, 1, 2), game(3, 1, 1, 2, 1),
+            game(4, 1, 3, 4, 4),
+            game(5, 2, 4, 1, 4), game(6, 2, 1, 4, 1), game(7, 2, 1, 4, None),
+        ])
+        # Games between the same teams in a round are one match, whichever side they're listed on
+        self.assertEqual([(n['team_a_wins'], n['team_b_wins'], n['draws']) for n in nodes], [(2, 1, 0), (0, 1, 0), (1, 1, 1)])
+        self.assertEqual([n['winner_id'] for n in nodes], [1, 4, None])
+        self.assertEqual(next_node, {0: 2, 1: 2})
+
+    def test_page_and_api(self):
+        page = self.client.get(f"/tournament?id={self.tournament.id}")
+        self.assertEqual(page.status_code, 200)
+        self.assertIn("Bracket", page.get_data(as_text=True))
+
+        data = self.client.get(f"/api/bracket?t={self.tournament.id}").get_json()
+        self.assertEqual(data['champion'], self.team_id("Team3"))
+        self.assertEqual([r['round'] for r in data['rounds']], [1, 2, 3])
+
+        self.tournament.visibility_id = Visibility.query.filter_by(visibility='private').one().id
+        db.session.commit()
+        self.assertEqual(self.client.get(f"/api/bracket?t={self.tournament.id}").status_code, 403)
+        self.assertEqual(self.client.get("/api/bracket?t=99999").status_code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
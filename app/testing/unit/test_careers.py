@@ -0,0 +1,82 @@
+import unittest
+from collections import defaultdict
+
+import sqlalchemy as sa
+from unit_base import DatabaseTestCase
+from flask_login import AnonymousUserMixin
+from app import db, careers
+from app.models import (
+    GamePlayers,
+    GameMedals,
+    Player,
+)
+
+
+class TestCareers(DatabaseTestCase):
+    """Tests for player career stats and the player page's game history."""
+
+    def setUp(self):
+        self.clear_tables()
+
+        self.first = self.add_tournament(title="First")
+        self.client = self.app.test_client()
+
+    def test_career_matches_game_rows(self):
+        second = self.add_tournament(title="Second")
+        hidden = self.add_tournament('private', title="Hidden")
+        public_ids = {self.first.id, second.id}
+
+        for player in Player.query.all():
+            rows = [gp for gp in GamePlayers.query.filter_by(player_id=player.id) if gp.game.tournament_id in public_ids]
+            career = careers.career(AnonymousUserMixin(), player.id)
+
+            # The private tournament isn't counted for someone who can't view it
+            self.assertEqual({row['tournament'].id for row in career['tournaments']}, public_ids)
+            self.assertNotIn(hidden.id, {row['tournament'].id for row in career['tournaments']})
+            self.assertEqual(career['totals']['games'], len(rows))
+            self.assertEqual(career['totals']['kills'], sum(gp.kills for gp in rows))
+            self.assertEqual(career['totals']['wins'], sum(gp.game.winning_team == gp.team_id for gp in rows))
+
+            hero_games = defaultdict(int)
+            for gp in rows:
+                hero_games[gp.hero_id] += 1
+            self.assertEqual({row['hero'].id: row['games'] for row in career['heroes']}, hero_games)
+
+    def test_career_page(self):
+        player = Player.query.first()
+        page = self.client.get(f"/player?id={player.id}")
+        self.assertEqual(page.status_code, 200)
+        self.assertIn(self.first.title, page.get_data(as_text=True))
+        self.assertEqual(self.client.get("/player?id=99999").status_code, 404)
+
+    def test_player_page_only_loads_one_tournament(self):
+        mvp = db.session.scalar(
+            sa.select(Player).join(GameMedals, GameMedals.player_id == Player.id)
+            .join(GameMedals.medal).where(sa.text("lower(medal.medal_name) = 'mvp'"))
+        )
+        url = f"/tournament/player?id={mvp.id}&t={self.first.id}"
+
+        def count_statements():
+            # Start from an empty session so both runs load the same objects
+            db.session.expunge_all()
+            statements = []
+            listener = lambda *args: statements.append(args[2])
+            sa.event.listen(db.engine, 'before_cursor_execute', listener)
+            try:
+                page = self.client.get(url).get_data(as_text=True)
+            finally:
+                sa.event.remove(db.engine, 'before_cursor_execute', listener)
+            return page, len(statements)
+
+        page, before = count_statements()
+        # Medals won in each game are listed
+        self.assertIn("MVP", page)
+
+        # Games in other tournaments aren't loaded
+        self.add_tournament(title="Second")
+        self.add_tournament(title="Third")
+        self.assertEqual(count_statements()[1], before)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import io
+import os
+import tempfile
+import unittest
+
+from unit_base import DatabaseTestCase
+from app import db
+from app.models import Hero
+import csv_generator as csvg
+
+SAMPLES_DIR = os.path.join(os.path.dirname(csvg.__file__), "app", "static", "csv_samples")
+
+
+class TestCsvGuide(DatabaseTestCase):
+    """Tests for generating random CSVs in memory for /help/csv-guide/random."""
+
+    def setUp(self):
+        csvg.sample_csv.cache_clear()
+        self.client = self.app.test_client()
+
+    def generate(self, file, seed):
+        csvg.generate_csv(file, csvg.fetch_heroes(), csvg.fetch_medals(), csvg.fetch_maps(), csvg.fetch_modes(),
+                          num_teams=4, seed=seed)
+
+    def test_streams_and_files_match(self):
+        buffer = io.StringIO()
+        self.generate(buffer, seed=5)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "random.csv")
+            self.generate(path, seed=5)
+            with open(path, newline='') as f:
+                self.assertEqual(f.read(), buffer.getvalue())
+
+        # 3 games of a header, 10 medals and 12 players
+        self.assertEqual(len(buffer.getvalue().splitlines()), 3 * 23)
+        self.assertEqual(csvg.sample_csv(4, 5), buffer.getvalue())
+        other = io.StringIO()
+        self.generate(other, seed=6)
+        self.assertNotEqual(other.getvalue(), buffer.getvalue())
+        with self.assertRaises(ValueError):
+            csvg.generate_rows([], [], [], [], num_teams=6)
+
+    def test_random_page_and_download(self):
+        before = set(os.listdir(SAMPLES_DIR))
+        page = self.client.get("/help/csv-guide/random?num_teams=4&seed=9")
+        self.assertEqual(page.status_code, 200)
+        self.assertIn(b"Team4_Player6", page.data)
+        self.assertIn(b"seed=9", page.data)
+
+        download = self.client.get("/help/csv-guide/random?num_teams=4&seed=9&download=1")
+        self.assertEqual(download.status_code, 200)
+        self.assertEqual(download.mimetype, "text/csv")
+        self.assertIn("attachment", download.headers["Content-Disposition"])
+        self.assertEqual(download.get_data(as_text=True), csvg.sample_csv(4, 9))
+        # The page and its download were generated once, without writing any files
+        self.assertEqual(csvg.sample_csv.cache_info().misses, 1)
+        self.assertEqual(set(os.listdir(SAMPLES_DIR)), before)
+
+        # Without a seed each request gets a new one
+        self.assertEqual(self.client.get("/help/csv-guide/random").status_code, 200)
+        self.assertEqual(csvg.sample_csv.cache_info().currsize, 2)
+
+    def test_reseeding_heroes_clears_samples(self):
+        csvg.sample_csv(4, 3)
+        hero = Hero.query.filter_by(hero_name=csvg.fetch_heroes()[0]).one()
+        name, hero.hero_name = hero.hero_name, "Renamed Hero"
+        db.session.commit()
+        self.assertEqual(csvg.sample_csv.cache_info().currsize, 0)
+        self.assertIn("Renamed Hero", csvg.fetch_heroes())
+        # Generated again from the renamed heroes
+        csvg.sample_csv(4, 3)
+        self.assertEqual(csvg.sample_csv.cache_info().misses, 1)
+
+        hero.hero_name = name
+        db.session.commit()
+
+
+if __name__ == "__main__":
+    unittest.main()
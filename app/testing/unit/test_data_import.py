@@ -1,78 +1,36 @@
+import io
 import os
 import unittest
+import importlib.util
 from pathlib import Path
-from datetime import datetime
 
-from app import app, db
+from unit_base import DatabaseTestCase
+from app import db
 from app.models import (
-    Role,
-    HeroRole,
-    GameMode,
-    Visibility,
-    Map,
-    Tournament,
+    TournamentUpload,
     Game,
     GamePlayers,
     GameMedals,
     Player,
 )
-from data_import import import_csv
-from seed import populate_heros
-from app.consts import MAPS
+from data_import import import_csv, read_rows, process_lines
 # define map_list for testing
-map_list = [item['name'] for gamemode in MAPS.values() for item in gamemode]
 from app.forms import CreateTournamentForm
 from werkzeug.datastructures import MultiDict
+import sqlalchemy as sa
 
+FINGERPRINT_MIGRATION = (Path(__file__).parents[3] / "migrations" / "versions"
+                         / "ac7b10ca918e_add_tournament_uploads_and_game_.py")
 
-class TestDataImport(unittest.TestCase):
-    """Tests for CSV data import using valid and invalid CSV files."""
 
-    @classmethod
-    def setUpClass(cls):
-        cls.app = app
-        cls.app.config['TESTING'] = True
-        cls.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
-        cls.app.config['WTF_CSRF_ENABLED'] = False
-        cls.app_context = cls.app.app_context()
-        cls.app_context.push()
-
-        db.drop_all()
-        db.create_all()
-
-        # seed lookup tables
-        Role.populate_with_list('role_name', ['default', 'administrator', 'moderator', 'tournament_owner'])
-        HeroRole.populate_with_list('role_name', ['vanguard', 'duelist', 'strategist'])
-        GameMode.populate_with_list('game_mode_name', ['domination', 'convoy', 'convergence'])
-        Visibility.populate_with_list('visibility', ['public', 'private'])
-        Map.populate_with_list('map_name', map_list, use_casefold=False)
-        # seed heroes
-        populate_heros()
-
-    @classmethod
-    def tearDownClass(cls):
-        db.session.remove()
-        db.drop_all()
-        cls.app_context.pop()
+class TestDataImport(DatabaseTestCase):
+    """Tests for CSV data import using valid and invalid CSV files."""
 
     def setUp(self):
-        # clear data tables
-        Game.query.delete()
-        Player.query.delete()
-        GamePlayers.query.delete()
-        GameMedals.query.delete()
-        Tournament.query.delete()
-        db.session.commit()
+        self.clear_tables()
 
         # create a tournament record for import
-        self.tournament = Tournament(
-            title="Test Tournament",
-            description="Desc",
-            visibility_id=1,
-            start_time=datetime.fromisoformat("2025-01-01T00:00")
-        )
-        db.session.add(self.tournament)
-        db.session.commit()
+        self.tournament = self.add_tournament(csv=None)
 
     def test_valid_csv_import(self):
         valid_path = Path(__file__).parent / "valid.csv"
@@ -84,6 +42,85 @@ class TestDataImport(unittest.TestCase):
         self.assertGreater(GamePlayers.query.count(), 0)
         self.assertGreater(GameMedals.query.count(), 0)
 
+    def test_csv_import_row_values(self):
+        valid_path = Path(__file__).parent / "valid.csv"
+        import_csv(str(valid_path), self.tournament)
+
+        # First game in valid.csv: Team1 beat Team2 on Central Park
+        game = Game.query.order_by(Game.id).first()
+        self.assertEqual(game.team_a.team_name, "Team1")
+        self.assertEqual(game.team_b.team_name, "Team2")
+        self.assertEqual(game.winning_team, game.team_a_id)
+        self.assertFalse(game.is_draw)
+        self.assertEqual(game.map.map_name, "Central Park")
+        self.assertEqual(game.game_mode.game_mode_name, "convoy")
+        self.assertEqual(len(game.game_players), 12)
+        self.assertEqual(len(game.game_medals), 10)
+
+        gp = next(gp for gp in game.game_players if gp.player.gamertag == "Team2_Player1")
+        self.assertEqual(gp.team_id, game.team_b_id)
+        self.assertEqual(gp.hero.hero_name, "Winter Soldier")
+        self.assertEqual((gp.kills, gp.deaths, gp.assists, gp.final_hits), (18, 6, 24, 6))
+        self.assertEqual((gp.damage, gp.damage_blocked, gp.healing, gp.accuracy_pct), (1719, 8762, 4967, 9))
+
+    def test_csv_import_from_stream_with_quoted_fields(self):
+        # Quoted fields may contain commas, and uploads arrive as byte streams
+        valid_path = Path(__file__).parent / "valid.csv"
+        csv_text = valid_path.read_text().replace("Team1,", '"Team, One",')
+        result = import_csv(io.BytesIO(csv_text.encode('utf-8')), self.tournament)
+        self.assertTrue(result)
+        self.assertEqual(Game.query.count(), 7)
+        game = Game.query.order_by(Game.id).first()
+        self.assertEqual(game.team_a.team_name, "Team, One")
+        self.assertEqual(game.winning_team, game.team_a_id)
+
+    def test_exact_reupload_is_skipped(self):
+        valid_path = str(Path(__file__).parent / "valid.csv")
+        import_csv(valid_path, self.tournament)
+        player_rows = GamePlayers.query.count()
+
+        self.assertTrue(import_csv(valid_path, self.tournament))
+        self.assertEqual(Game.query.count(), 7)
+        self.assertEqual(GamePlayers.query.count(), player_rows)
+        self.assertEqual(TournamentUpload.query.filter_by(tournament_id=self.tournament.id).count(), 1)
+
+    def test_overlapping_upload_inserts_only_new_games(self):
+        valid_path = Path(__file__).parent / "valid.csv"
+        lines = valid_path.read_text().splitlines(keepends=True)
+        # Rows used by the first 3 games: a header, its medals and its players
+        first_games = list(process_lines(read_rows(str(valid_path))))[:3]
+        partial_len = sum(1 + len(medals) + len(players) for _, medals, players in first_games)
+
+        import_csv(io.BytesIO(''.join(lines[:partial_len]).encode('utf-8')), self.tournament)
+        self.assertEqual(Game.query.count(), 3)
+
+        import_csv(str(valid_path), self.tournament)
+        self.assertEqual(Game.query.count(), 7)
+        upload = TournamentUpload.query.order_by(TournamentUpload.id.desc()).first()
+        self.assertEqual((upload.games_inserted, upload.games_skipped), (4, 3))
+
+    def test_reupload_after_fingerprint_migration(self):
+        # Games imported before game.fingerprint existed are fingerprinted by the migration
+        valid_path = Path(__file__).parent / "valid.csv"
+        first_games = list(process_lines(read_rows(str(valid_path))))[:3]
+        partial_len = sum(1 + len(medals) + len(players) for _, medals, players in first_games)
+        lines = valid_path.read_text().splitlines(keepends=True)
+        import_csv(io.BytesIO(''.join(lines[:partial_len]).encode('utf-8')), self.tournament)
+        imported = dict(db.session.execute(sa.select(Game.id, Game.fingerprint)).all())
+        db.session.execute(sa.update(Game).values(fingerprint=None))
+
+        spec = importlib.util.spec_from_file_location("fingerprint_migration", FINGERPRINT_MIGRATION)
+        migration = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(migration)
+        migration.fill_fingerprints(db.session.connection())
+        db.session.commit()
+        self.assertEqual(dict(db.session.execute(sa.select(Game.id, Game.fingerprint)).all()), imported)
+
+        import_csv(str(valid_path), self.tournament)
+        self.assertEqual(Game.query.count(), 7)
+        upload = TournamentUpload.query.order_by(TournamentUpload.id.desc()).first()
+        self.assertEqual((upload.games_inserted, upload.games_skipped), (4, 3))
+
     def test_invalid_csv_import(self):
         invalid_path = Path(__file__).parent / "invalid.csv"
         with self.assertRaises(Exception) as cm:
@@ -0,0 +1,79 @@
+import unittest
+from collections import defaultdict
+
+import sqlalchemy as sa
+from unit_base import DatabaseTestCase
+from app import db, head_to_head
+from app.models import (
+    Team,
+    Game,
+)
+
+
+class TestHeadToHead(DatabaseTestCase):
+    """Tests for the head-to-head records between teams and /api/h2h."""
+
+    def setUp(self):
+        self.clear_tables()
+
+        self.tournament = self.add_tournament()
+        self.client = self.app.test_client()
+
+    def team_id(self, name):
+        return Team.query.filter_by(team_name=name).one().id
+
+    def test_records_match_game_rows(self):
+        # {(first team, second team): [games, first team wins, first team kills, second team kills]}
+        expected = defaultdict(lambda: [0, 0, 0, 0])
+        for game in Game.query.all():
+            first, second = sorted((game.team_a_id, game.team_b_id))
+            totals = expected[(first, second)]
+            totals[0] += 1
+            totals[1] += game.winning_team == first
+            for gp in game.game_players:
+                totals[2 if gp.team_id == first else 3] += gp.kills
+
+        records = head_to_head.records(self.tournament.id)
+        self.assertEqual(
+            {(r['teams'][0]['id'], r['teams'][1]['id']): [r['games'], r['wins'][0], *r['totals']['kills']] for r in records},
+            dict(expected)
+        )
+        for record in records:
+            kills = record['totals']['kills']
+            self.assertEqual(record['differentials']['kills'], round((kills[0] - kills[1]) / record['games'], 2))
+
+    def test_pair_across_tournaments(self):
+        self.add_tournament()
+        # Private tournaments aren't counted without a tournament id
+        self.add_tournament('private')
+        team3, team8 = self.team_id("Team3"), self.team_id("Team8")
+
+        forward, = head_to_head.records(team_ids=(team3, team8))
+        backward, = head_to_head.records(team_ids=(team8, team3))
+        self.assertEqual(forward['games'], 2)
+        self.assertEqual(forward['teams'][0]['name'], "Team3")
+        self.assertEqual(backward['teams'][0]['name'], "Team8")
+        self.assertEqual(forward['wins'], backward['wins'][::-1])
+        self.assertEqual(forward['differentials']['damage'], -backward['differentials']['damage'])
+
+    def test_api_does_not_read_games(self):
+        team1, team2 = self.team_id("Team1"), self.team_id("Team2")
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        sa.event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            data = self.client.get(f"/api/h2h?t={self.tournament.id}&a={team2}&b={team1}").get_json()
+        finally:
+            sa.event.remove(db.engine, 'before_cursor_execute', listener)
+        self.assertEqual([team['id'] for team in data['records'][0]['teams']], [team2, team1])
+        self.assertFalse([sql for sql in statements if 'FROM game' in sql or 'JOIN game' in sql])
+
+        self.assertEqual(len(self.client.get("/api/h2h").get_json()['records']), Game.query.count())
+        self.assertEqual(self.client.get(f"/api/h2h?a={team1}").status_code, 400)
+        self.assertEqual(self.client.get("/api/h2h?t=99999").status_code, 404)
+        private = self.add_tournament('private')
+        self.assertEqual(self.client.get(f"/api/h2h?t={private.id}").status_code, 403)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from unit_base import DatabaseTestCase
+from flask import g
+from app import db
+from app.models import (
+    Role,
+    TournamentUsers,
+    User,
+    Game,
+)
+from app.import_jobs import import_jobs
+from app.consts import ROLE
+
+UNIT_DIR = Path(__file__).parent
+
+
+class TestImportJobs(DatabaseTestCase):
+    """Tests for background CSV imports started from /tournament/upload."""
+    # Added once for the whole class
+    kept_models = (User,)
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.spool_dir = tempfile.TemporaryDirectory()
+        cls.app.config['IMPORT_SPOOL_DIR'] = cls.spool_dir.name
+
+        owner_role = Role.query.filter_by(role_name=ROLE.OWNER).one()
+        cls.user = User(username="uploader", email="uploader@example.com", global_role_id=1)
+        cls.user.set_password("password")
+        cls.other_user = User(username="other", email="other@example.com", global_role_id=1)
+        cls.other_user.set_password("password")
+        db.session.add_all([cls.user, cls.other_user])
+        db.session.commit()
+        cls.owner_role_id = owner_role.id
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.spool_dir.cleanup()
+
+    def setUp(self):
+        self.clear_tables()
+
+        self.tournament = self.add_tournament(title="Upload Tournament", csv=None)
+        db.session.add(TournamentUsers(
+            tournament_id=self.tournament.id, user_id=self.user.id, tournament_role_id=self.owner_role_id
+        ))
+        db.session.commit()
+
+        self.client = self.app.test_client()
+        self.login(self.user)
+
+    def login(self, user):
+        with self.client.session_transaction() as sess:
+            sess['_user_id'] = str(user.id)
+        # The test's app context is shared with requests, so drop the cached login
+        g.pop('_login_user', None)
+
+    def upload(self, file_name):
+        with open(UNIT_DIR / file_name, 'rb') as f:
+            return self.client.post("/tournament/upload", data={
+                'tid': self.tournament.id,
+                'file': (f, file_name),
+            }, content_type='multipart/form-data')
+
+    def test_upload_returns_job_and_imports_in_background(self):
+        response = self.upload("valid.csv")
+        self.assertEqual(response.status_code, 202)
+        job_id = response.get_json()['job_id']
+
+        import_jobs.get(job_id).wait(timeout=30)
+
+        status = self.client.get(f"/api/import-jobs/{job_id}").get_json()
+        self.assertEqual(status['status'], 'done')
+        self.assertEqual(status['parsed_games'], 7)
+        self.assertGreater(status['inserted_rows'], 7)
+        self.assertEqual(status['errors'], [])
+        self.assertEqual(Game.query.count(), 7)
+        self.assertEqual(list(Path(self.spool_dir.name).iterdir()), [])
+
+    def test_failed_import_reports_errors(self):
+        response = self.upload("invalid.csv")
+        job_id = response.get_json()['job_id']
+        import_jobs.get(job_id).wait(timeout=30)
+
+        status = self.client.get(f"/api/import-jobs/{job_id}").get_json()
+        self.assertEqual(status['status'], 'failed')
+        self.assertTrue(status['errors'])
+        self.assertEqual(Game.query.count(), 0)
+
+    def test_job_hidden_from_other_users(self):
+        job_id = self.upload("valid.csv").get_json()['job_id']
+        import_jobs.get(job_id).wait(timeout=30)
+
+        self.login(self.other_user)
+        self.assertEqual(self.client.get(f"/api/import-jobs/{job_id}").status_code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
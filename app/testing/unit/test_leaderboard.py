@@ -0,0 +1,82 @@
+import unittest
+from collections import defaultdict
+
+from unit_base import DatabaseTestCase
+from app import db, leaderboard
+from app.models import (
+    Visibility,
+    GamePlayers,
+    Player,
+)
+
+
+class TestLeaderboard(DatabaseTestCase):
+    """Tests for tournament leaderboards and /api/leaderboard."""
+
+    def setUp(self):
+        self.clear_tables()
+
+        self.tournament = self.add_tournament()
+        self.client = self.app.test_client()
+
+    def expected_values(self):
+        '''{metric: {player id: value}} computed from the game rows.'''
+        totals = defaultdict(lambda: defaultdict(int))
+        for gp in GamePlayers.query.all():
+            for column in ('kills', 'deaths', 'assists', 'damage', 'healing', 'damage_blocked', 'final_hits', 'accuracy_pct'):
+                totals[gp.player_id][column] += getattr(gp, column)
+            totals[gp.player_id]['games'] += 1
+        return {
+            'kills': {pid: t['kills'] for pid, t in totals.items()},
+            'damage': {pid: t['damage'] for pid, t in totals.items()},
+            'healing': {pid: t['healing'] for pid, t in totals.items()},
+            'blocked': {pid: t['damage_blocked'] for pid, t in totals.items()},
+            'final_hits': {pid: t['final_hits'] for pid, t in totals.items()},
+            'accuracy': {pid: t['accuracy_pct'] / t['games'] for pid, t in totals.items()},
+            'kda': {pid: (t['kills'] + t['assists']) / max(t['deaths'], 1) for pid, t in totals.items()},
+        }
+
+    def test_ranks_and_percentiles_match_game_rows(self):
+        players, total = leaderboard.page(self.tournament.id, limit=leaderboard.MAX_PAGE_SIZE)
+        self.assertEqual(total, Player.query.count())
+        self.assertEqual(len(players), total)
+
+        for metric, values in self.expected_values().items():
+            for p in players:
+                value = values[p['player_id']]
+                m = p['metrics'][metric]
+                self.assertAlmostEqual(m['value'], value, places=2)
+                self.assertEqual(m['rank'], 1 + sum(v > value for v in values.values()))
+                self.assertEqual(m['percentile'], round(100 * sum(v <= value for v in values.values()) / total))
+
+    def test_sort_and_paging(self):
+        for metric in leaderboard.METRICS:
+            pages, offset = [], 0
+            while True:
+                data = self.client.get(f"/api/leaderboard?t={self.tournament.id}&sort={metric}&offset={offset}&limit=5").get_json()
+                pages += data['players']
+                offset += 5
+                if offset >= data['total']:
+                    break
+            ranks = [p['metrics'][metric]['rank'] for p in pages]
+            self.assertEqual(ranks, sorted(ranks))
+            self.assertEqual(len({p['player_id'] for p in pages}), Player.query.count())
+
+        # Unknown metrics fall back to the default
+        self.assertEqual(self.client.get(f"/api/leaderboard?t={self.tournament.id}&sort=nope").get_json()['sort'],
+                         leaderboard.DEFAULT_METRIC)
+
+    def test_page_and_access(self):
+        page = self.client.get(f"/tournament/leaderboard?t={self.tournament.id}&sort=kda")
+        self.assertEqual(page.status_code, 200)
+        self.assertIn(Player.query.first().gamertag, page.get_data(as_text=True))
+
+        self.assertEqual(self.client.get("/api/leaderboard?t=99999").status_code, 404)
+        self.tournament.visibility_id = Visibility.query.filter_by(visibility='private').one().id
+        db.session.commit()
+        self.assertEqual(self.client.get(f"/api/leaderboard?t={self.tournament.id}").status_code, 403)
+        self.assertEqual(self.client.get(f"/tournament/leaderboard?t={self.tournament.id}").status_code, 403)
+
+
+if __name__ == "__main__":
+    unittest.main()
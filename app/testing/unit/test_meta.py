@@ -0,0 +1,98 @@
+import unittest
+from collections import defaultdict
+
+import sqlalchemy as sa
+from unit_base import DatabaseTestCase
+from app import db, meta, aggregates
+from app.models import (
+    Hero,
+    Game,
+    GamePlayers,
+)
+
+
+class TestMeta(DatabaseTestCase):
+    """Tests for the hero and map meta statistics and /api/meta."""
+
+    def setUp(self):
+        self.clear_tables()
+
+        self.tournament = self.add_tournament()
+        self.client = self.app.test_client()
+
+    def expected(self, key):
+        '''{key(game, game player): [picks, wins, kills, damage]} computed from the game rows.'''
+        totals = defaultdict(lambda: [0, 0, 0, 0])
+        for gp in GamePlayers.query.all():
+            row = totals[key(gp.game, gp)]
+            row[0] += 1
+            row[1] += gp.game.winning_team == gp.team_id
+            row[2] += gp.kills
+            row[3] += gp.damage
+        return totals
+
+    def test_hero_by_map_matches_game_rows(self):
+        expected = self.expected(lambda g, gp: (gp.hero_id, g.map_id))
+        rows = meta.meta_slice(['hero', 'map'], tournament_id=self.tournament.id)
+        self.assertEqual(len(rows), len(expected))
+        for row in rows:
+            picks, wins, kills, damage = expected[(row['hero']['id'], row['map']['id'])]
+            self.assertEqual(row['hero']['name'], db.session.get(Hero, row['hero']['id']).hero_name)
+            self.assertEqual((row['picks'], row['wins']), (picks, wins))
+            self.assertAlmostEqual(row['win_rate'], wins / picks, places=4)
+            self.assertAlmostEqual(row['averages']['kills'], kills / picks, places=2)
+            self.assertAlmostEqual(row['averages']['damage'], damage / picks, places=2)
+
+            map_games = Game.query.filter_by(map_id=row['map']['id']).count()
+            self.assertEqual(row['games'], map_games)
+            self.assertAlmostEqual(row['pick_rate'], picks / (2 * map_games), places=4)
+
+    def test_filters_and_roles(self):
+        game = Game.query.first()
+        expected = self.expected(lambda g, gp: (gp.hero.hero_role_id, g.game_mode_id))
+        rows = meta.meta_slice(['role'], {'mode': game.game_mode_id}, self.tournament.id)
+        self.assertEqual(
+            {row['role']['id']: row['picks'] for row in rows},
+            {role_id: totals[0] for (role_id, mode_id), totals in expected.items() if mode_id == game.game_mode_id}
+        )
+        # Every pick in a game mode is one of the 12 players in each game
+        mode_games = Game.query.filter_by(game_mode_id=game.game_mode_id).count()
+        self.assertEqual(sum(row['picks'] for row in rows), 12 * mode_games)
+        for row in rows:
+            self.assertAlmostEqual(row['pick_rate'], row['picks'] / (12 * mode_games), places=4)
+        self.assertAlmostEqual(sum(row['pick_rate'] for row in rows), 1, places=3)
+
+    def test_slices_do_not_read_game_players(self):
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        sa.event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            meta.meta_slice(['hero', 'map', 'mode'], tournament_id=self.tournament.id)
+        finally:
+            sa.event.remove(db.engine, 'before_cursor_execute', listener)
+        self.assertTrue(statements)
+        self.assertFalse([sql for sql in statements if 'game_players' in sql])
+
+    def test_rebuild_matches_import(self):
+        before = meta.meta_slice(['hero', 'map', 'mode'], tournament_id=self.tournament.id)
+        aggregates.rebuild(self.tournament.id)
+        db.session.commit()
+        self.assertEqual(meta.meta_slice(['hero', 'map', 'mode'], tournament_id=self.tournament.id), before)
+
+    def test_api_scope_and_access(self):
+        # Without a tournament only public tournaments are counted
+        picks = sum(row['picks'] for row in self.client.get("/api/meta/heroes").get_json()['rows'])
+        private = self.add_tournament('private')
+        self.assertEqual(sum(row['picks'] for row in self.client.get("/api/meta/heroes").get_json()['rows']), picks)
+
+        data = self.client.get(f"/api/meta/maps?t={self.tournament.id}&by=modes").get_json()
+        self.assertEqual(data['group_by'], ['map', 'mode'])
+        self.assertEqual(sum(row['games'] for row in data['rows']), Game.query.filter_by(tournament_id=self.tournament.id).count())
+
+        self.assertEqual(self.client.get(f"/api/meta/heroes?t={private.id}").status_code, 403)
+        self.assertEqual(self.client.get("/api/meta/heroes?t=99999").status_code, 404)
+        self.assertEqual(self.client.get("/api/meta/nope").status_code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import re
+import unittest
+
+from unit_base import DatabaseTestCase, VALID_CSV
+from werkzeug.datastructures import FileStorage
+from app.metrics import metrics, Registry
+from app.import_jobs import import_jobs
+
+
+class TestMetrics(DatabaseTestCase):
+    """Tests for the /metrics endpoint and the metrics shared between processes."""
+
+    # METRICS_DB is a temporary file, see unit_base.py
+    TOKEN = "scrape-token"
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.app.config['METRICS_TOKEN'] = cls.TOKEN
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.app.config['METRICS_TOKEN'] = None
+
+    def setUp(self):
+        self.clear_tables()
+
+        self.tournament = self.add_tournament(csv=None)
+        self.client = self.app.test_client()
+
+    def scrape(self):
+        '''{series with labels: value} from /metrics.'''
+        response = self.client.get("/metrics", headers={"Authorization": f"Bearer {self.TOKEN}"})
+        self.assertEqual(response.status_code, 200)
+        values = {}
+        for line in response.get_data(as_text=True).splitlines():
+            if line and not line.startswith('#'):
+                series, value = line.rsplit(' ', 1)
+                values[series] = float(value)
+        return values
+
+    def test_request_metrics(self):
+        before = self.scrape()
+        for _ in range(3):
+            self.assertEqual(self.client.get(f"/tournament?id={self.tournament.id}").status_code, 200)
+        after = self.scrape()
+
+        def added(series):
+            return after.get(series, 0) - before.get(series, 0)
+
+        self.assertEqual(added('http_requests_total{endpoint="tournament_page",method="GET",status="200"}'), 3)
+        self.assertEqual(added('http_request_duration_seconds_count{endpoint="tournament_page"}'), 3)
+        self.assertEqual(added('http_request_duration_seconds_bucket{endpoint="tournament_page",le="+Inf"}'), 3)
+        self.assertGreaterEqual(added('http_request_db_statements_total{endpoint="tournament_page"}'), 3)
+        self.assertEqual(added('template_render_seconds_count{template="pages/tournament.html"}'), 3)
+
+        # Buckets are cumulative
+        buckets = [value for series, value in after.items()
+                   if series.startswith('http_request_duration_seconds_bucket{endpoint="tournament_page"')]
+        self.assertEqual(len(buckets), 12)
+        self.assertEqual(max(buckets), after['http_request_duration_seconds_count{endpoint="tournament_page"}'])
+
+    def test_totals_shared_between_processes(self):
+        # Another process has its own registry writing to the same file
+        other_process = Registry(self.app)
+        before = self.scrape().get('import_rows_total', 0)
+        other_process.inc('import_rows_total', 40)
+        other_process.flush()
+        metrics.inc('import_rows_total', 2)
+        self.assertEqual(self.scrape()['import_rows_total'], before + 42)
+
+    def test_import_and_upload_metrics(self):
+        before = self.scrape()
+        with open(VALID_CSV, 'rb') as f:
+            job = import_jobs.submit(self.tournament.id, None, FileStorage(f, filename="valid.csv"))
+        job.wait(timeout=30)
+        self.assertEqual(job.status, 'done')
+        after = self.scrape()
+
+        self.assertEqual(after['import_rows_total'] - before.get('import_rows_total', 0), job.inserted_rows)
+        self.assertEqual(after['import_rows_per_second_count'] - before.get('import_rows_per_second_count', 0), 1)
+        self.assertEqual(after['upload_size_bytes_sum'] - before.get('upload_size_bytes_sum', 0), VALID_CSV.stat().st_size)
+
+        page = self.client.get("/metrics", headers={"Authorization": f"Bearer {self.TOKEN}"}).get_data(as_text=True)
+        self.assertTrue(re.search(r'^# TYPE http_request_duration_seconds histogram$', page, re.MULTILINE))
+
+    def test_token_required(self):
+        for headers in ({}, {"Authorization": "Bearer wrong"}, {"Authorization": self.TOKEN}):
+            response = self.client.get("/metrics", headers=headers)
+            self.assertEqual(response.status_code, 401)
+            self.assertNotIn("http_requests_total", response.get_data(as_text=True))
+        self.app.config['METRICS_TOKEN'] = None
+        try:
+            self.assertEqual(self.client.get("/metrics", headers={"Authorization": f"Bearer {self.TOKEN}"}).status_code, 404)
+        finally:
+            self.app.config['METRICS_TOKEN'] = self.TOKEN
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import unittest
+
+import sqlalchemy as sa
+from unit_base import DatabaseTestCase
+from flask import g
+from app import db
+from app.models import Role, User, TournamentUsers
+from app.permissions import role_matrix
+from app.consts import ROLE, PERMISSION, ROLE_PERMISSIONS
+
+
+class TestPermissions(DatabaseTestCase):
+    """Tests for the cached tournament permission checks."""
+    # Added once for the whole class
+    kept_models = (User,)
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.owner_role = Role.query.filter_by(role_name=ROLE.OWNER).one().id
+        cls.default_role = Role.query.filter_by(role_name=ROLE.DEFAULT).one().id
+
+        cls.users = [User(username=f"user{i}", email=f"user{i}@example.com", global_role_id=1) for i in range(50)]
+        db.session.add_all(cls.users)
+        db.session.commit()
+
+    def setUp(self):
+        self.clear_tables()
+
+        self.tournament = self.add_tournament('private', title="Private", csv=None)
+        self.owner, self.viewer = self.users[0], self.users[1]
+        db.session.add_all([
+            TournamentUsers(tournament_id=self.tournament.id, user_id=self.owner.id, tournament_role_id=self.owner_role),
+            TournamentUsers(tournament_id=self.tournament.id, user_id=self.viewer.id, tournament_role_id=self.default_role),
+        ])
+        db.session.commit()
+
+    def count_statements(self, check):
+        # Load the objects used by the checks first, only the checks' own queries are counted
+        for obj in (self.tournament, self.owner, self.viewer):
+            db.session.refresh(obj)
+        self.tournament.visibility
+        for role_id in (self.owner_role, self.default_role):
+            role_matrix.get(role_id)
+        # Kept referenced so they stay in the session's identity map
+        self.roles = [db.session.get(Role, role_id) for role_id in (self.owner_role, self.default_role)]
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        sa.event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            with self.app.test_request_context():
+                check()
+        finally:
+            sa.event.remove(db.engine, 'before_cursor_execute', listener)
+        return len(statements)
+
+    def test_role_matrix_matches_role_permissions(self):
+        for role in Role.query.all():
+            name, permissions = role_matrix.get(role.id)
+            self.assertEqual(name, role.role_name)
+            self.assertEqual(permissions, {p.value for p in ROLE_PERMISSIONS[ROLE(role.role_name)]})
+
+    def test_repeated_checks_run_one_query(self):
+        t = self.tournament
+
+        def check():
+            self.assertTrue(t.user_has_permission(self.owner, PERMISSION.READ))
+            self.assertTrue(t.user_has_permission(self.owner, PERMISSION.UPLOAD))
+            self.assertTrue(t.user_has_permission(self.owner, PERMISSION.DELETE))
+            self.assertFalse(t.user_has_permission(self.viewer, PERMISSION.DELETE))
+            self.assertTrue(t.user_can_view(self.viewer))
+            self.assertEqual(t.get_user_role(self.owner).role_name, ROLE.OWNER)
+
+        # One role lookup for each of the two users
+        self.assertEqual(self.count_statements(check), 2)
+
+    def test_checks_do_not_scale_with_members(self):
+        t = self.tournament
+        check = lambda: t.user_has_permission(self.viewer, PERMISSION.READ)
+        before = self.count_statements(check)
+
+        db.session.add_all([
+            TournamentUsers(tournament_id=t.id, user_id=user.id, tournament_role_id=self.default_role)
+            for user in self.users[2:]
+        ])
+        db.session.commit()
+        self.assertEqual(self.count_statements(check), before)
+
+    def test_revoked_access_is_not_remembered(self):
+        with self.app.test_request_context():
+            self.assertTrue(self.tournament.user_has_permission(self.viewer, PERMISSION.READ))
+            TournamentUsers.query.filter_by(user_id=self.viewer.id).delete()
+            db.session.commit()
+            self.assertFalse(self.tournament.user_has_permission(self.viewer, PERMISSION.READ))
+            g.pop('_tournament_roles', None)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import re
+import unittest
+
+import sqlalchemy as sa
+from unit_base import DatabaseTestCase
+from app import db
+
+
+class TestQueryStats(DatabaseTestCase):
+    """Tests for the per-request Server-Timing header and the slow statement log."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.tournament = cls.add_tournament(csv=None)
+        cls.tid = cls.tournament.id
+
+    def setUp(self):
+        self.client = self.app.test_client()
+        self.slow_query_ms = self.app.config['SLOW_QUERY_MS']
+
+    def tearDown(self):
+        self.app.config['SLOW_QUERY_MS'] = self.slow_query_ms
+        self.app.config['LOG_QUERY_PARAMETERS'] = False
+
+    def test_server_timing_counts_statements(self):
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        sa.event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            response = self.client.get(f"/tournament?id={self.tid}")
+        finally:
+            sa.event.remove(db.engine, 'before_cursor_execute', listener)
+
+        self.assertEqual(response.status_code, 200)
+        match = re.fullmatch(r'db;desc="(\d+) statements";dur=(\d+\.\d\d)', response.headers['Server-Timing'])
+        self.assertIsNotNone(match)
+        self.assertEqual(int(match[1]), len(statements))
+        self.assertGreater(len(statements), 0)
+
+        # Counts start again for each request
+        self.assertEqual(self.client.get("/api/bracket").headers['Server-Timing'], 'db;desc="0 statements";dur=0.00')
+
+    def test_slow_statements_are_logged(self):
+        self.app.config['SLOW_QUERY_MS'] = 0
+        with self.assertLogs(self.app.logger, 'WARNING') as logs:
+            self.client.get(f"/api/bracket?t={self.tid}")
+        self.assertTrue([line for line in logs.output if 'api_get_bracket' in line])
+        # Parameters are left out unless asked for
+        self.assertFalse([line for line in logs.output if 'parameters' in line])
+
+        self.app.config['LOG_QUERY_PARAMETERS'] = True
+        with self.assertLogs(self.app.logger, 'WARNING') as logs:
+            self.client.get(f"/api/bracket?t={self.tid}")
+        self.assertTrue([line for line in logs.output if 'api_get_bracket' in line and f'({self.tid},)' in line])
+
+        self.app.config['SLOW_QUERY_MS'] = 60_000
+        with self.assertNoLogs(self.app.logger, 'WARNING'):
+            self.client.get(f"/api/bracket?t={self.tid}")
+
+
+if __name__ == "__main__":
+    unittest.main()
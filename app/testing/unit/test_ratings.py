@@ -0,0 +1,91 @@
+import io
+import unittest
+
+import sqlalchemy as sa
+from unit_base import DatabaseTestCase, VALID_CSV
+from app import db, ratings
+from app.models import (
+    Game,
+    Player,
+    TeamRating,
+    PlayerRating,
+)
+from data_import import import_csv, read_rows, process_lines
+
+
+class TestRatings(DatabaseTestCase):
+    """Tests for the team and player Elo ratings updated on import."""
+
+    def setUp(self):
+        self.clear_tables()
+
+        self.tournament = self.add_tournament(csv=None)
+
+    def team_ratings(self):
+        return {r.team_id: (round(r.rating, 6), r.games, r.wins, r.losses, r.draws) for r in TeamRating.query.all()}
+
+    def player_ratings(self):
+        return {r.player_id: (round(r.rating, 6), r.games, r.wins, r.losses, r.draws) for r in PlayerRating.query.all()}
+
+    def test_ratings_follow_results(self):
+        import_csv(str(VALID_CSV), self.tournament)
+        games = Game.query.order_by(Game.round, Game.id).all()
+
+        # Replay the games with the Elo formula, one game at a time
+        expected = {}
+        for g in games:
+            a, b = (expected.setdefault(t, ratings.INITIAL_RATING) for t in (g.team_a_id, g.team_b_id))
+            score_a = 0.5 if g.is_draw else float(g.winning_team == g.team_a_id)
+            change = ratings.K_FACTOR * (score_a - 1 / (1 + 10 ** ((b - a) / 400)))
+            expected[g.team_a_id], expected[g.team_b_id] = a + change, b - change
+
+        actual = self.team_ratings()
+        self.assertEqual(actual.keys(), expected.keys())
+        for team_id, rating in expected.items():
+            self.assertAlmostEqual(actual[team_id][0], rating, places=4)
+            team_games = [g for g in games if team_id in (g.team_a_id, g.team_b_id)]
+            self.assertEqual(actual[team_id][1:], (
+                len(team_games),
+                sum(g.winning_team == team_id for g in team_games),
+                sum(not g.is_draw and g.winning_team != team_id for g in team_games),
+                sum(g.is_draw for g in team_games),
+            ))
+
+        # Ratings are zero-sum, and every player who played has one
+        self.assertAlmostEqual(sum(r for r, *_ in actual.values()), ratings.INITIAL_RATING * len(actual), places=4)
+        self.assertEqual(len(self.player_ratings()), Player.query.count())
+
+    def test_incremental_upload_matches_rebuild(self):
+        # Import the first 3 games, then the whole file, so the ratings are built in two steps
+        lines = VALID_CSV.read_text().splitlines(keepends=True)
+        first_games = list(process_lines(read_rows(str(VALID_CSV))))[:3]
+        partial_len = sum(1 + len(medals) + len(players) for _, medals, players in first_games)
+        import_csv(io.BytesIO(''.join(lines[:partial_len]).encode('utf-8')), self.tournament)
+        import_csv(str(VALID_CSV), self.tournament)
+        team_ratings, player_ratings = self.team_ratings(), self.player_ratings()
+
+        self.assertEqual(ratings.rebuild(), Game.query.count())
+        db.session.commit()
+        self.assertEqual(self.team_ratings(), team_ratings)
+        self.assertEqual(self.player_ratings(), player_ratings)
+
+    def test_update_reads_only_the_new_games(self):
+        import_csv(str(VALID_CSV), self.tournament)
+        game_id = db.session.scalar(sa.select(sa.func.max(Game.id)))
+
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        sa.event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            ratings.apply_games([])
+            ratings.apply_games([game_id])
+        finally:
+            sa.event.remove(db.engine, 'before_cursor_execute', listener)
+        db.session.rollback()
+
+        # Games, rosters, team and player ratings, then one upsert for each table
+        self.assertEqual(len(statements), 6)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+import sqlalchemy as sa
+
+from unit_base import DatabaseTestCase
+from app import db
+from app.models import Hero, HeroRole, Medal
+from app.reference_cache import reference_cache
+
+
+class TestReferenceCache(DatabaseTestCase):
+    """Tests for the in-process reference table cache."""
+    with_reference_data = False
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        HeroRole.populate_with_list('role_name', ['vanguard', 'duelist', 'strategist'])
+        db.session.add(Hero(hero_name='Hulk', hero_role_id=1))
+        db.session.commit()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        reference_cache.invalidate()
+
+    def test_lookup_without_queries(self):
+        hulk = db.session.scalar(sa.select(Hero).filter_by(hero_name='Hulk'))
+        reference_cache.rows(Hero)
+
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        sa.event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            self.assertEqual(reference_cache.get_ids(Hero, ['Hulk']), {'Hulk': hulk.id})
+            self.assertEqual(reference_cache.get(Hero, hulk.id).hero_name, 'Hulk')
+            self.assertEqual(reference_cache.names(Hero), ['Hulk'])
+        finally:
+            sa.event.remove(db.engine, 'before_cursor_execute', listener)
+        self.assertEqual(statements, [])
+
+    def test_orm_insert_invalidates(self):
+        self.assertEqual(reference_cache.get_ids(Medal, ['MVP']), {})
+        db.session.add(Medal(medal_name='MVP'))
+        db.session.commit()
+        self.assertIn('MVP', reference_cache.names(Medal))
+
+    def test_uncommitted_rows_are_not_cached(self):
+        self.assertEqual(reference_cache.get_ids(Medal, ['Ace']), {})
+        db.session.add(Medal(medal_name='Ace'))
+        db.session.flush()
+        # The transaction sees its own row, but it isn't cached for other sessions
+        self.assertIn('Ace', reference_cache.get_ids(Medal, ['Ace']))
+        self.assertNotIn(Medal, reference_cache._tables)
+        db.session.remove()
+        self.assertEqual(reference_cache.get_ids(Medal, ['Ace']), {})
+
+        # Rows inserted without the ORM are cached once committed
+        db.session.execute(sa.insert(Medal).values(medal_name='Ace'))
+        reference_cache.invalidate_on_commit(Medal)
+        self.assertIn('Ace', reference_cache.names(Medal))
+        self.assertNotIn(Medal, reference_cache._tables)
+        db.session.commit()
+        self.assertIn('Ace', reference_cache.names(Medal))
+        self.assertIn(Medal, reference_cache._tables)
+
+    def test_unknown_names_are_omitted(self):
+        self.assertEqual(reference_cache.get_ids(HeroRole, ['vanguard', 'healer']).keys(), {'vanguard'})
+
+
+if __name__ == '__main__':
+    unittest.main()
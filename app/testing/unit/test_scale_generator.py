@@ -0,0 +1,93 @@
+import unittest
+
+import sqlalchemy as sa
+from unit_base import DatabaseTestCase
+from app import db
+from app.models import (
+    Role,
+    Visibility,
+    User,
+    Tournament,
+    TournamentUsers,
+    Game,
+    GamePlayers,
+    GameMedals,
+    PlayerTournamentStats,
+    BracketNode,
+    TeamRating,
+)
+from app.consts import ROLE
+import scale_generator
+
+
+class TestScaleGenerator(DatabaseTestCase):
+    """Tests for generating large databases with scale_generator.py."""
+
+    def setUp(self):
+        self.reset_database()
+
+    def dump(self):
+        '''Every generated row, in id order. Password hashes are left out, their salt is random.'''
+        return {
+            model.__tablename__: [tuple(row) for row in db.session.execute(
+                sa.select(*(column for column in model.__table__.columns if column.name != 'password_hash'))
+                .order_by(*model.__table__.primary_key.columns)
+            )]
+            for model in (User, Tournament, TournamentUsers, Game, GamePlayers, GameMedals)
+        }
+
+    def test_same_seed_same_data(self):
+        counts = scale_generator.generate(seed=7, users=40, tournaments=12)
+        first = self.dump()
+        for model in (User, Tournament, Game, GamePlayers, GameMedals):
+            self.assertEqual(counts[model.__tablename__], len(first[model.__tablename__]))
+        self.assertEqual(counts['tournament'], 12)
+        # Every game has both teams' players
+        self.assertEqual(counts['game_players'], 12 * counts['game'])
+
+        self.reset_database()
+        scale_generator.generate(seed=7, users=40, tournaments=12)
+        self.assertEqual(self.dump(), first)
+
+        self.reset_database()
+        scale_generator.generate(seed=8, users=40, tournaments=12)
+        self.assertNotEqual(self.dump()['game_players'], first['game_players'])
+
+    def test_sharing_and_stats(self):
+        scale_generator.generate(seed=1, users=120, tournaments=60, private_share=0.5, max_shares=5)
+        owner_role = Role.query.filter_by(role_name=ROLE.OWNER.value).one().id
+        private = Visibility.query.filter_by(visibility='private').one().id
+        user_ids = db.session.scalars(sa.select(User.id).order_by(User.id)).all()
+
+        visibility = dict(db.session.execute(sa.select(Tournament.id, Tournament.visibility_id)).all())
+        self.assertTrue(0 < list(visibility.values()).count(private) < 60)
+        for tid, vis in visibility.items():
+            members = db.session.execute(sa.select(TournamentUsers.user_id, TournamentUsers.tournament_role_id)
+                                         .filter_by(tournament_id=tid)).all()
+            owners = [user_id for user_id, role in members if role == owner_role]
+            self.assertEqual(len(owners), 1)
+            shared = [user_id for user_id, role in members if role != owner_role]
+            if vis != private:
+                self.assertEqual(shared, [])
+            # Shared with users in the owner's community
+            self.assertLessEqual(len(shared), 5)
+            community = user_ids.index(owners[0]) // scale_generator.COMMUNITY_USERS
+            for user_id in shared:
+                self.assertEqual(user_ids.index(user_id) // scale_generator.COMMUNITY_USERS, community)
+
+        # The statistics, brackets and ratings were rebuilt, one champion per tournament
+        self.assertGreater(PlayerTournamentStats.query.count(), 0)
+        self.assertGreater(TeamRating.query.count(), 0)
+        last_round = (sa.select(BracketNode.tournament_id, sa.func.max(BracketNode.round).label('round'))
+                      .group_by(BracketNode.tournament_id).subquery())
+        finals = db.session.scalars(
+            sa.select(BracketNode.winner_id)
+            .join(last_round, sa.and_(BracketNode.tournament_id == last_round.c.tournament_id,
+                                      BracketNode.round == last_round.c.round))
+        ).all()
+        self.assertEqual(len(finals), 60)
+        self.assertNotIn(None, finals)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+
+import sqlalchemy as sa
+from unit_base import DatabaseTestCase
+from app import db, search
+from app.models import Tournament
+
+
+class TestSearch(DatabaseTestCase):
+    """Tests for the full-text tournament search used by /api/tournaments."""
+
+    def setUp(self):
+        self.clear_tables()
+        self.client = self.app.test_client()
+
+    def search(self, text, **params):
+        query = '&'.join(f"{k}={v}" for k, v in params.items())
+        return self.client.get(f"/api/tournaments?search={text}&{query}").get_json()
+
+    def test_prefix_matches_title_and_description(self):
+        spring = self.add_tournament(title="Spring Cup", description="Regional championship qualifier", csv=None)
+        self.add_tournament(title="Autumn Cup", description="Casual games", csv=None)
+
+        data = self.search("champ")
+        self.assertEqual([t['id'] for t in data['tournaments']], [spring.id])
+        self.assertIn("<mark>championship</mark>", data['tournaments'][0]['snippet'])
+
+        data = self.search("spr cu")
+        self.assertEqual([t['id'] for t in data['tournaments']], [spring.id])
+        self.assertEqual(data['tournaments'][0]['title_highlight'], "<mark>Spring</mark> <mark>Cup</mark>")
+
+    def test_index_follows_updates_and_deletes(self):
+        t = self.add_tournament(title="Winter Cup", csv=None)
+        t.title = "Summer Cup"
+        db.session.commit()
+        self.assertEqual(self.search("winter")['total'], 0)
+        self.assertEqual(self.search("summer")['total'], 1)
+
+        # Bulk deletes skip the ORM, the triggers still remove them from the index
+        db.session.execute(sa.delete(Tournament))
+        db.session.commit()
+        self.assertEqual(self.search("summer")['total'], 0)
+
+    def test_highlights_are_escaped(self):
+        self.add_tournament(title="<b>Bold</b> Cup", csv=None)
+        title = self.search("bold")['tournaments'][0]['title_highlight']
+        self.assertEqual(title, "&lt;b&gt;<mark>Bold</mark>&lt;/b&gt; Cup")
+
+    def test_operators_are_treated_as_text(self):
+        self.add_tournament(title="Cup", csv=None)
+        self.assertEqual(self.search('"cup OR NOT -*')['total'], 0)
+        self.assertIsNone(search.match_query("   "))
+
+    def test_ranked_pagination(self):
+        ids = [self.add_tournament(title=f"League {i}", description="league " * (i % 3 + 1), csv=None).id for i in range(7)]
+
+        seen, after = [], None
+        while True:
+            data = self.search("league", limit=2, **({'after': after} if after is not None else {}))
+            self.assertEqual(data['total'], len(ids))
+            seen += [t['id'] for t in data['tournaments']]
+            after = data['next_after']
+            if after is None:
+                break
+
+        ranked = db.session.scalars(
+            sa.select(search.fts.c.rowid)
+            .where(sa.literal_column(search.FTS_TABLE).op('MATCH')('league'))
+            .order_by(search.fts.c.rank, search.fts.c.rowid)
+        ).all()
+        self.assertEqual(seen, ranked)
+        self.assertEqual(sorted(seen), ids)
+
+
+if __name__ == "__main__":
+    unittest.main()
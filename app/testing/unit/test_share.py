@@ -0,0 +1,120 @@
+import unittest
+
+import sqlalchemy as sa
+from unit_base import DatabaseTestCase
+from flask import g
+from app import db
+from app.models import Role, User, TournamentUsers
+from app.permissions import share_tournament, tournament_role_id
+from app.consts import ROLE
+
+
+class TestShare(DatabaseTestCase):
+    """Tests for sharing tournaments through /tournament/share."""
+    # Added once for the whole class
+    kept_models = (User,)
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.owner_role = Role.query.filter_by(role_name=ROLE.OWNER).one().id
+
+        db.session.execute(sa.insert(User), [
+            {'username': f"user{i}", 'email': f"user{i}@example.com", 'global_role_id': 1} for i in range(400)
+        ])
+        db.session.commit()
+        cls.user_ids = db.session.scalars(sa.select(User.id).order_by(User.id)).all()
+        cls.owner_id = cls.user_ids[0]
+
+    def setUp(self):
+        self.clear_tables()
+
+        tournament = self.add_tournament('private', title="Private", csv=None)
+        db.session.add(TournamentUsers(tournament_id=tournament.id, user_id=self.owner_id, tournament_role_id=self.owner_role))
+        db.session.commit()
+        self.tid = tournament.id
+
+        self.client = self.app.test_client()
+        self.login(self.owner_id)
+
+    def login(self, user_id):
+        with self.client.session_transaction() as sess:
+            sess['_user_id'] = str(user_id)
+        # The test's app context is shared with requests, so drop the cached login
+        g.pop('_login_user', None)
+
+    def share(self, user_ids):
+        return self.client.post("/tournament/share", data={
+            'tid': self.tid,
+            'selected_users': ','.join(str(uid) for uid in user_ids),
+        })
+
+    def member_ids(self):
+        return set(db.session.scalars(sa.select(TournamentUsers.user_id).filter_by(tournament_id=self.tid)))
+
+    def test_share_and_revoke(self):
+        self.share(self.user_ids[1:4])
+        self.assertEqual(self.member_ids(), {self.owner_id, *self.user_ids[1:4]})
+
+        # Deselecting revokes access, the owner always keeps it
+        self.share(self.user_ids[2:6])
+        self.assertEqual(self.member_ids(), {self.owner_id, *self.user_ids[2:6]})
+        self.share([])
+        self.assertEqual(self.member_ids(), {self.owner_id})
+
+    def test_counts_and_unknown_ids(self):
+        added, removed = share_tournament(self.tid, [*self.user_ids[1:4], 99999])
+        db.session.commit()
+        self.assertEqual((added, removed), (3, 0))
+
+        added, removed = share_tournament(self.tid, self.user_ids[3:5])
+        db.session.commit()
+        self.assertEqual((added, removed), (1, 2))
+
+    def test_statement_count_does_not_grow_with_users(self):
+        def count_statements(user_ids):
+            statements = []
+            listener = lambda *args: statements.append(args[2])
+            sa.event.listen(db.engine, 'before_cursor_execute', listener)
+            try:
+                share_tournament(self.tid, user_ids)
+            finally:
+                sa.event.remove(db.engine, 'before_cursor_execute', listener)
+            db.session.commit()
+            return len(statements)
+
+        # Adding a few users or a whole roster takes the same statements, revoking adds one
+        few = count_statements(self.user_ids[1:4])
+        self.assertEqual(count_statements(self.user_ids[4:7]), few + 1)
+        self.assertEqual(count_statements(self.user_ids[1:400]), few)
+        self.assertEqual(len(self.member_ids()), 400)
+
+    def test_remembered_roles_follow_sharing(self):
+        user = db.session.get(User, self.user_ids[1])
+        other = self.add_tournament('private', title="Other", csv=None)
+        self.assertIsNone(tournament_role_id(user, self.tid))
+        self.assertIsNone(tournament_role_id(user, other.id))
+
+        # Within one transaction, and so one app context, sharing is seen straight away
+        share_tournament(self.tid, [user.id])
+        self.assertIsNotNone(tournament_role_id(user, self.tid))
+        self.assertIn((user.id, other.id), g._tournament_roles)
+        share_tournament(self.tid, [])
+        self.assertIsNone(tournament_role_id(user, self.tid))
+
+        db.session.add(TournamentUsers(tournament_id=other.id, user_id=user.id, tournament_role_id=self.owner_role))
+        db.session.flush()
+        self.assertEqual(tournament_role_id(user, other.id), self.owner_role)
+        db.session.rollback()
+
+    def test_only_owners_can_share(self):
+        share_tournament(self.tid, [self.user_ids[1]])
+        db.session.commit()
+
+        self.login(self.user_ids[1])
+        self.share(self.user_ids[1:10])
+        self.assertEqual(self.member_ids(), {self.owner_id, self.user_ids[1]})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+from collections import defaultdict
+
+import numpy as np
+from unit_base import DatabaseTestCase
+from app import stats
+from app.models import (
+    Game,
+    GamePlayers,
+    Player,
+)
+
+
+class TestStats(DatabaseTestCase):
+    """Tests for the NumPy statistics used by the team and player pages."""
+
+    def setUp(self):
+        self.clear_tables()
+
+        self.tournament = self.add_tournament()
+
+    def test_player_totals_match_game_rows(self):
+        tid = self.tournament.id
+        for player in Player.query.all():
+            rows = GamePlayers.query.filter_by(player_id=player.id).all()
+            totals = stats.PlayerTotals.for_player(tid, player.id)
+            self.assertEqual(totals.total("games"), len(rows))
+            self.assertEqual(totals.total("kills"), sum(gp.kills for gp in rows))
+            self.assertEqual(totals.total("healing"), sum(gp.healing for gp in rows))
+            self.assertEqual(totals.max("max_damage"), max(gp.damage for gp in rows))
+
+            kills, deaths, assists = (sum(getattr(gp, c) for gp in rows) for c in ("kills", "deaths", "assists"))
+            self.assertAlmostEqual(float(stats.kda(kills, deaths, assists)), (kills + assists) / max(deaths, 1))
+
+    def test_team_top_players_and_averages(self):
+        tid = self.tournament.id
+        for team_id in {gp.team_id for gp in GamePlayers.query.all()}:
+            per_player = defaultdict(list)
+            for gp in GamePlayers.query.filter_by(team_id=team_id):
+                per_player[gp.player.gamertag].append(gp.damage)
+            averages = {tag: sum(values) / len(values) for tag, values in per_player.items()}
+
+            totals = stats.PlayerTotals.for_team(tid, team_id)
+            self.assertEqual([tag for _, tag in totals.players()], sorted(per_player))
+            self.assertEqual(averages[totals.top("damage")], max(averages.values()))
+            self.assertAlmostEqual(totals.mean_per_game("damage"), sum(averages.values()) / len(averages))
+
+        self.assertIsNone(stats.PlayerTotals.for_team(tid, 999999).top("damage"))
+
+    def test_team_game_series_in_round_order(self):
+        tid = self.tournament.id
+        games = sorted(Game.query.all(), key=lambda g: (g.round, g.id))
+        for team_id in {g.team_a_id for g in games} | {g.team_b_id for g in games}:
+            team_games = [g for g in games if team_id in (g.team_a_id, g.team_b_id)]
+            rounds, totals = stats.team_game_series(tid, team_id)
+            self.assertEqual(rounds, [g.round for g in team_games])
+            for column in ("kills", "damage", "healing"):
+                self.assertEqual(totals[column], [
+                    sum(getattr(gp, column) for gp in g.game_players if gp.team_id == team_id) for g in team_games
+                ])
+
+    def test_safe_divide_and_group_sum(self):
+        np.testing.assert_array_equal(stats.safe_divide([1, 4, 3], [2, 0, 3]), [0.5, 0, 1])
+        keys, sums = stats.group_sum(np.array([3, 1, 3, 2]), np.array([1, 2, 3, 4]))
+        np.testing.assert_array_equal(keys, [1, 2, 3])
+        np.testing.assert_array_equal(sums, [2, 4, 4])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import io
+import unittest
+
+import sqlalchemy as sa
+from unit_base import DatabaseTestCase, VALID_CSV
+from app import db
+from app.models import (
+    Role,
+    User,
+    TournamentUsers,
+    Game,
+)
+from data_import import read_rows, process_lines
+from app.consts import ROLE
+
+# Statements allowed for one render of the tournament page, whatever the number of games
+MAX_STATEMENTS = 15
+
+
+class TestTournamentPage(DatabaseTestCase):
+    """Tests for the number of queries run by /tournament."""
+    # Added once for the whole class
+    kept_models = (User,)
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        owner = User(username='owner', email='owner@test.com', global_role_id=1)
+        owner.set_password('password')
+        db.session.add(owner)
+        db.session.commit()
+        cls.owner_id = owner.id
+
+    def setUp(self):
+        self.clear_tables()
+
+        self.client = self.app.test_client()
+
+    def create_tournament(self, csv):
+        tournament = self.add_tournament(csv=csv)
+        owner_role = db.session.scalar(sa.select(Role).filter_by(role_name=ROLE.OWNER))
+        db.session.add(TournamentUsers(tournament_id=tournament.id, user_id=self.owner_id, tournament_role_id=owner_role.id))
+        db.session.commit()
+        return tournament.id
+
+    def count_statements(self, tid):
+        '''Render the tournament page with nothing cached in the session, returning the
+        response and the number of SQL statements it ran.'''
+        db.session.expunge_all()
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        sa.event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            response = self.client.get(f"/tournament?id={tid}")
+        finally:
+            sa.event.remove(db.engine, 'before_cursor_execute', listener)
+        return response, len(statements)
+
+    def test_statement_count_does_not_grow_with_games(self):
+        lines = VALID_CSV.read_text().splitlines(keepends=True)
+        first_game = list(process_lines(read_rows(str(VALID_CSV))))[0]
+        _, medals, players = first_game
+        one_game_csv = io.BytesIO(''.join(lines[:1 + len(medals) + len(players)]).encode('utf-8'))
+
+        small_response, small_count = self.count_statements(self.create_tournament(one_game_csv))
+        large_response, large_count = self.count_statements(self.create_tournament(VALID_CSV))
+
+        self.assertEqual(small_response.status_code, 200)
+        self.assertEqual(large_response.status_code, 200)
+        self.assertEqual(small_count, large_count)
+        self.assertLessEqual(large_count, MAX_STATEMENTS)
+
+    def test_mvp_and_svp_are_marked(self):
+        tid = self.create_tournament(VALID_CSV)
+        page = self.client.get(f"/tournament?id={tid}").get_data(as_text=True)
+        self.assertEqual(page.count('>MVP</span>'), Game.query.filter_by(tournament_id=tid).count())
+        self.assertEqual(page.count('>SVP</span>'), Game.query.filter_by(tournament_id=tid).count())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+
+from unit_base import DatabaseTestCase
+from flask import g
+from app import db
+from app.models import Role, User, TournamentUsers
+from app.consts import ROLE
+
+USERNAMES = ["owner", "Alice", "alan", "ALBERT", "alex", "bob", "al_shared"]
+
+
+class TestUserSearch(DatabaseTestCase):
+    """Tests for /api/users/search, used by the share form."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        owner_role = Role.query.filter_by(role_name=ROLE.OWNER).one().id
+        default_role = Role.query.filter_by(role_name=ROLE.DEFAULT).one().id
+
+        cls.users = {name: User(username=name, email=f"{name}@example.com", global_role_id=1) for name in USERNAMES}
+        db.session.add_all(cls.users.values())
+        tournament = cls.add_tournament('private', title="Private", csv=None)
+        db.session.add_all([
+            TournamentUsers(tournament_id=tournament.id, user_id=cls.users["owner"].id, tournament_role_id=owner_role),
+            TournamentUsers(tournament_id=tournament.id, user_id=cls.users["al_shared"].id, tournament_role_id=default_role),
+        ])
+        db.session.commit()
+        cls.tid = tournament.id
+
+    def setUp(self):
+        self.client = self.app.test_client()
+        self.login("owner")
+
+    def login(self, name):
+        with self.client.session_transaction() as sess:
+            sess['_user_id'] = str(self.users[name].id)
+        # The test's app context is shared with requests, so drop the cached login
+        g.pop('_login_user', None)
+
+    def search(self, q, **params):
+        params = '&'.join(f"{k}={v}" for k, v in params.items())
+        return self.client.get(f"/api/users/search?tid={self.tid}&q={q}&{params}")
+
+    def test_prefix_search_ignores_case_and_shared_users(self):
+        data = self.search("AL").get_json()
+        self.assertEqual([u['username'] for u in data['users']], ["alan", "ALBERT", "alex", "Alice"])
+        self.assertIsNone(data['next_after'])
+
+        # The owner and users already shared with are left out
+        everyone = [u['username'] for u in self.search("").get_json()['users']]
+        self.assertNotIn("owner", everyone)
+        self.assertNotIn("al_shared", everyone)
+
+    def test_keyset_pagination(self):
+        names, after = [], None
+        while True:
+            params = {'limit': 2, **({'after': after} if after is not None else {})}
+            data = self.search("", **params).get_json()
+            self.assertLessEqual(len(data['users']), 2)
+            names += [u['username'] for u in data['users']]
+            after = data['next_after']
+            if after is None:
+                break
+        self.assertEqual(names, ["alan", "ALBERT", "alex", "Alice", "bob"])
+
+    def test_only_owners_can_search(self):
+        self.login("al_shared")
+        self.assertEqual(self.search("a").status_code, 403)
+        self.login("bob")
+        self.assertEqual(self.search("a").status_code, 403)
+        self.assertEqual(self.client.get("/api/users/search?tid=999&q=a").status_code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+'''Shared setup for the unit tests: a temporary database and DatabaseTestCase.
+
+Importing this module points the app at a temporary SQLite database, metrics file and
+upload spool, so running the tests never touches app.db. The app reads its config when
+it is first imported, so every test module imports unit_base before anything from app.
+'''
+import atexit
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+from pathlib import Path
+
+TEST_DIR = tempfile.mkdtemp(prefix='unit-tests-')
+atexit.register(shutil.rmtree, TEST_DIR, ignore_errors=True)
+TEST_DATABASE = os.path.join(TEST_DIR, 'test.db')
+
+os.environ['DATABASE_URL'] = 'sqlite:///' + TEST_DATABASE
+os.environ['METRICS_DB'] = os.path.join(TEST_DIR, 'metrics.db')
+os.environ['IMPORT_SPOOL_DIR'] = os.path.join(TEST_DIR, 'uploads')
+os.environ.setdefault('SECRET_KEY', 'unit-tests')
+
+from app import app, db
+from app import models as m
+from app.consts import MAPS, ROLE, PERMISSION
+from app.permissions import role_matrix
+from app.reference_cache import reference_cache
+from seed import populate_heros, populate_role_permissions
+from data_import import import_csv
+
+with app.app_context():
+    if db.engine.url.database != TEST_DATABASE:
+        raise RuntimeError(f"app was imported before unit_base, the tests would run against {db.engine.url}")
+
+
+# 7 games of an 8 team bracket
+VALID_CSV = Path(__file__).parent / "valid.csv"
+
+# Seeded once per test class, clear_tables() leaves them alone
+REFERENCE_MODELS = (m.Role, m.Permission, m.RolePermissions, m.HeroRole, m.Hero, m.GameMode, m.Visibility,
+                    m.Map, m.Medal)
+
+
+def seed_reference_data():
+    # The seed functions print what they inserted
+    with contextlib.redirect_stdout(io.StringIO()):
+        m.Role.populate_with_list('role_name', [role.value for role in ROLE])
+        m.Permission.populate_with_list('permission', [p.value for p in PERMISSION])
+        populate_role_permissions()
+        m.HeroRole.populate_with_list('role_name', ['vanguard', 'duelist', 'strategist'])
+        m.GameMode.populate_with_list('game_mode_name', ['domination', 'convoy', 'convergence'])
+        m.Visibility.populate_with_list('visibility', ['public', 'private'])
+        m.Map.populate_with_list('map_name', [item['name'] for mode in MAPS.values() for item in mode],
+                                 use_casefold=False)
+        populate_heros()
+
+
+class DatabaseTestCase(unittest.TestCase):
+    '''Creates the tables and seeds the reference data once per class, with an app
+    context pushed for the whole class. Call clear_tables() in setUp to empty the other
+    tables between tests.'''
+    # Start from empty tables instead
+    with_reference_data = True
+    # Tables clear_tables() also leaves alone, e.g. users added once per class
+    kept_models = ()
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = app
+        cls.app.config['TESTING'] = True
+        cls.app.config['WTF_CSRF_ENABLED'] = False
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+        cls.reset_database()
+
+    @classmethod
+    def tearDownClass(cls):
+        db.session.remove()
+        db.drop_all()
+        cls.app_context.pop()
+
+    @classmethod
+    def reset_database(cls):
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+        # Ids cached by earlier tests don't exist in the new tables
+        reference_cache.invalidate()
+        role_matrix.invalidate()
+        if cls.with_reference_data:
+            seed_reference_data()
+
+    @classmethod
+    def add_tournament(cls, visibility='public', title="Test Tournament", csv=VALID_CSV, description="Desc"):
+        '''Add a tournament and import csv (a path or a stream) into it, or leave it empty if csv is None.'''
+        visibility_id = m.Visibility.query.filter_by(visibility=visibility).one().id
+        tournament = m.Tournament(title=title, description=description, visibility_id=visibility_id,
+                                  start_time=datetime.fromisoformat("2025-01-01T00:00"))
+        db.session.add(tournament)
+        db.session.commit()
+        if csv is not None:
+            import_csv(str(csv) if isinstance(csv, Path) else csv, tournament)
+        return tournament
+
+    def clear_tables(self):
+        '''Delete every row except the reference data and kept_models, children first.
+        New tables are covered without listing them.'''
+        kept = {model.__table__ for model in REFERENCE_MODELS + tuple(self.kept_models)}
+        for table in reversed(db.metadata.sorted_tables):
+            if table not in kept:
+                db.session.execute(table.delete())
+        db.session.commit()
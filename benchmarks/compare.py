@@ -0,0 +1,64 @@
+'''Compare benchmark results against a saved baseline.
+
+Results are the JSON written by benchmarks/run.py:
+
+    {"results": {"<teams> teams": {"<benchmark>": {"wall_ms": ..., "queries": ..., "peak_kib": ...}}}}
+
+Wall time and peak memory regress when they grow by more than the threshold (a
+fraction, 0.2 = 20%) and by more than a small absolute amount, so tiny timings don't
+flag noise. The query count is deterministic, so any increase is a regression.
+'''
+import json
+
+DEFAULT_THRESHOLD = 0.2
+# Smallest increases counted as regressions, below these it's noise
+MIN_WALL_MS = 2.0
+MIN_PEAK_KIB = 64
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    '''Return a list of (dataset, benchmark, measure, baseline value, current value)
+    for every measurement that got worse. Benchmarks missing from either side are
+    skipped.'''
+    regressions = []
+    for dataset, benchmarks in current['results'].items():
+        for name, measured in benchmarks.items():
+            saved = baseline['results'].get(dataset, {}).get(name)
+            if saved is None:
+                continue
+            for measure, minimum in (('wall_ms', MIN_WALL_MS), ('peak_kib', MIN_PEAK_KIB)):
+                increase = measured[measure] - saved[measure]
+                if increase > minimum and increase > saved[measure] * threshold:
+                    regressions.append((dataset, name, measure, saved[measure], measured[measure]))
+            if measured['queries'] > saved['queries']:
+                regressions.append((dataset, name, 'queries', saved['queries'], measured['queries']))
+    return regressions
+
+
+def report(baseline, current, threshold=DEFAULT_THRESHOLD):
+    '''Print each benchmark's change from the baseline. Returns the regressions.'''
+    for dataset, benchmarks in current['results'].items():
+        for name, measured in benchmarks.items():
+            saved = baseline['results'].get(dataset, {}).get(name)
+            if saved is None:
+                print(f'{dataset:>10}  {name:<24} (not in baseline)')
+                continue
+            change = (measured['wall_ms'] - saved['wall_ms']) / saved['wall_ms'] if saved['wall_ms'] else 0
+            print(f'{dataset:>10}  {name:<24} {saved["wall_ms"]:10.2f} -> {measured["wall_ms"]:10.2f} ms ({change:+.0%})'
+                  f'  queries {saved["queries"]} -> {measured["queries"]}'
+                  f'  peak {saved["peak_kib"]:.0f} -> {measured["peak_kib"]:.0f} KiB')
+
+    regressions = compare(baseline, current, threshold)
+    print()
+    if regressions:
+        print(f'{len(regressions)} regressions:')
+        for dataset, name, measure, before, after in regressions:
+            print(f'    {dataset} {name}: {measure} {before} -> {after}')
+    else:
+        print('No regressions.')
+    return regressions
@@ -0,0 +1,233 @@
+'''Benchmarks for CSV imports and the tournament stats routes.
+
+Builds 8, 64 and 512 team tournaments from CSVs made by csv_generator.generate_csv
+with fixed seeds, so every run imports the same games. For each one it times:
+
+    import_csv               importing the CSV into an empty database
+    tournament_page          /tournament
+    team_results_page        /tournament/team, for Team1
+    tournament_player_view   /tournament/player, for Team1_Player1
+    api_tournaments          /api/tournaments, with as many other tournaments as teams
+
+Routes are requested through the Flask test client. Each benchmark records the median
+wall time of its runs, the number of SQL statements and the peak memory allocated
+(measured with tracemalloc in a separate run, since tracing slows everything down).
+The app runs against a temporary SQLite database, so your own app.db isn't touched.
+
+    python -m benchmarks.run --output baseline.json
+    python -m benchmarks.run --compare baseline.json
+
+With --compare, exits with status 1 if anything regressed (see benchmarks/compare.py).
+'''
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+# The app reads its config on import, so the temporary database is set up first
+WORK_DIR = tempfile.mkdtemp(prefix='benchmarks-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(WORK_DIR, 'benchmark.db')
+os.environ['METRICS_DB'] = os.path.join(WORK_DIR, 'metrics.db')
+os.environ.setdefault('SECRET_KEY', 'benchmarks')
+# Slow statements are what's being measured, not something to log
+os.environ['SLOW_QUERY_MS'] = str(60_000)
+
+import sqlalchemy as sa
+import csv_generator as csvg
+from app import app, db
+from app import models as m
+from app.consts import MAPS, ROLE, PERMISSION
+from app.metrics import metrics
+from app.reference_cache import reference_cache
+from data_import import import_csv
+from seed import populate_heros, populate_role_permissions
+from benchmarks import compare
+
+SIZES = [8, 64, 512]
+# Each dataset is generated with seed SEED + its number of teams
+SEED = 1000
+REPEAT = 5
+
+
+def reset_database():
+    '''Empty every table and add the reference data the app needs.'''
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
+    reference_cache.invalidate()
+    # The seed functions print what they inserted
+    with contextlib.redirect_stdout(io.StringIO()):
+        m.Role.populate_with_list('role_name', [role.value for role in ROLE])
+        m.Permission.populate_with_list('permission', [permission.value for permission in PERMISSION])
+        populate_role_permissions()
+        m.HeroRole.populate_with_list('role_name', ['vanguard', 'duelist', 'strategist'])
+        m.GameMode.populate_with_list('game_mode_name', ['domination', 'convoy', 'convergence'])
+        m.Visibility.populate_with_list('visibility', ['public', 'private'])
+        m.Map.populate_with_list('map_name', [item['name'] for mode in MAPS.values() for item in mode], use_casefold=False)
+        populate_heros()
+
+
+def generate_dataset(teams):
+    '''Write the CSV for a tournament of this many teams. Returns its path.'''
+    path = os.path.join(WORK_DIR, f'{teams}_teams.csv')
+    csvg.generate_csv(path, csvg.fetch_heroes(), csvg.fetch_medals(), csvg.fetch_maps(), csvg.fetch_modes(), teams,
+                      seed=SEED + teams)
+    return path
+
+
+def public_visibility_id():
+    return db.session.scalar(sa.select(m.Visibility.id).where(m.Visibility.visibility == 'public'))
+
+
+def add_tournament(title):
+    tournament = m.Tournament(title=title, description="Benchmark", visibility_id=public_visibility_id(),
+                              start_time=datetime(2025, 1, 1))
+    db.session.add(tournament)
+    db.session.commit()
+    return tournament.id
+
+
+def measure(run, repeat, setup=None):
+    '''Time run() repeat times, calling setup() untimed before each run.
+    Returns the median wall time, the statements run and the peak memory.'''
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        # Each request gets an empty session, as it would outside the benchmark
+        db.session.remove()
+        statements.clear()
+        sa.event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            start = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - start)
+        finally:
+            sa.event.remove(db.engine, 'before_cursor_execute', listener)
+    queries = len(statements)
+
+    if setup:
+        setup()
+    db.session.remove()
+    tracemalloc.start()
+    try:
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'wall_ms': round(statistics.median(times) * 1000, 3),
+        'queries': queries,
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+def get(client, url):
+    def run():
+        response = client.get(url)
+        if response.status_code != 200:
+            raise RuntimeError(f'{url} returned {response.status_code}')
+    return run
+
+
+def benchmark_dataset(teams, repeat):
+    results = {}
+    reset_database()
+    csv_path = generate_dataset(teams)
+
+    # Each import starts from an empty database, so they all insert the same rows
+    tournament = {}
+
+    def fresh_tournament():
+        reset_database()
+        tournament['id'] = add_tournament(f'{teams} teams')
+
+    results['import_csv'] = measure(
+        lambda: import_csv(csv_path, db.session.get(m.Tournament, tournament['id'])),
+        repeat, setup=fresh_tournament
+    )
+
+    tid = tournament['id']
+    public = public_visibility_id()
+    db.session.execute(sa.insert(m.Tournament), [
+        {'title': f'Other tournament {i}', 'description': 'Benchmark', 'visibility_id': public,
+         'start_time': datetime(2025, 1, 1)}
+        for i in range(teams)
+    ])
+    db.session.commit()
+    team_id = db.session.scalar(sa.select(m.Team.id).where(m.Team.team_name == 'Team1'))
+    player_id = db.session.scalar(sa.select(m.Player.id).where(m.Player.gamertag == 'Team1_Player1'))
+
+    client = app.test_client()
+    for name, url in (
+        ('tournament_page', f'/tournament?id={tid}'),
+        ('team_results_page', f'/tournament/team?id={team_id}&t={tid}'),
+        ('tournament_player_view', f'/tournament/player?id={player_id}&t={tid}'),
+        ('api_tournaments', '/api/tournaments'),
+    ):
+        results[name] = measure(get(client, url), repeat)
+    return results
+
+
+def print_results(results):
+    for dataset, benchmarks in results['results'].items():
+        for name, measured in benchmarks.items():
+            print(f'{dataset:>10}  {name:<24} {measured["wall_ms"]:10.2f} ms'
+                  f'  {measured["queries"]:5} queries  {measured["peak_kib"]:10.1f} KiB peak')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark CSV imports and the stats routes.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help='Numbers of teams, powers of 2.')
+    parser.add_argument('--repeat', type=int, default=REPEAT, help='Runs of each route, the median is kept.')
+    parser.add_argument('--output', help='Save the results to this JSON file.')
+    parser.add_argument('--compare', metavar='BASELINE', help='Compare the results with a saved JSON file.')
+    parser.add_argument('--threshold', type=float, default=compare.DEFAULT_THRESHOLD,
+                        help='Fractional slowdown counted as a regression (default %(default)s).')
+    args = parser.parse_args()
+
+    results = {
+        'environment': {
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'repeat': args.repeat,
+            'seed': SEED,
+        },
+        'results': {},
+    }
+    try:
+        with app.app_context():
+            for teams in args.sizes:
+                print(f'Benchmarking {teams} teams...', file=sys.stderr)
+                results['results'][f'{teams} teams'] = benchmark_dataset(teams, args.repeat)
+            db.session.remove()
+        metrics.flush()
+    finally:
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        regressions = compare.report(compare.load(args.compare), results, args.threshold)
+        sys.exit(1 if regressions else 0)
+    print_results(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -7,4 +7,22 @@ default_db_location = "sqlite:///" + os.path.join(basedir, "app.db")
 class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get("DATABASE_URL") or default_db_location
     SECRET_KEY = os.environ.get("SECRET_KEY")
-    REMEMBER_COOKIE_DURATION = timedelta(days=7)
\ No newline at end of file
+    REMEMBER_COOKIE_DURATION = timedelta(days=7)
+
+    # Uploaded CSVs are saved here and imported by a background worker pool.
+    # SQLite only allows one writer at a time, so extra workers just wait on each other.
+    IMPORT_SPOOL_DIR = os.environ.get("IMPORT_SPOOL_DIR") or os.path.join(basedir, "uploads")
+    IMPORT_WORKERS = int(os.environ.get("IMPORT_WORKERS", 1))
+
+    # Statements slower than this many milliseconds are logged, see app/query_stats.py.
+    # Set SLOW_QUERY_MS to 0 to log every statement.
+    SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", 200))
+    # Also log slow statements' parameters. Only for debugging, they include password
+    # hashes and email addresses.
+    LOG_QUERY_PARAMETERS = os.environ.get("LOG_QUERY_PARAMETERS", "").lower() in ("1", "true", "yes")
+
+    # Metrics from every process are added up in this SQLite file, see app/metrics.py.
+    # Defaults to metrics.db in the app's instance folder.
+    METRICS_DB = os.environ.get("METRICS_DB")
+    # Bearer token scrapers send to read /metrics, which is disabled until this is set
+    METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
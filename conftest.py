@@ -0,0 +1,8 @@
+# pytest imports the unit tests as app.testing.unit.test_*, which imports the app before
+# the test module runs. Import unit_base first, the way `python -m unittest discover -s
+# app/testing/unit` finds it, so the tests still use a temporary database.
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'app', 'testing', 'unit'))
+import unit_base  # noqa: E402, F401
@@ -1,22 +1,34 @@
 import random
 import csv
+import functools
+import io
+import os
 from app import app, db
 from app.models import Hero, Medal, Map, GameMode
+from app.reference_cache import reference_cache
 import math
 
+# Random CSVs kept by sample_csv, up to 128 teams (about 150KB) each
+SAMPLE_CACHE_SIZE = 32
+
 # each time it will half (for even num of teams)
 def games_per_round(num_teams):
     n_games = [num_teams // (2 ** (i + 1)) for i in range(int(math.log2(num_teams)))]
     return n_games
 
-# Function to generate a random CSV file in the specified format
-def generate_csv(file_path, heroes, medals, maps, modes, num_teams):
-
+def generate_rows(heroes, medals, maps, modes, num_teams, seed=None):
+    '''Return an iterator over the rows of a random tournament CSV in the upload format.
+    The same seed always gives the same rows; without one, the random module's shared
+    generator is used.'''
     if num_teams <= 0:
         raise ValueError("num_teams must be a positive integer")
     if not (num_teams & (num_teams - 1)) == 0:
         raise ValueError("num_teams must be a power of 2")
 
+    rng = random if seed is None else random.Random(seed)
+    return _tournament_rows(rng, heroes, medals, maps, modes, num_teams)
+
+def _tournament_rows(rng, heroes, medals, maps, modes, num_teams):
     num_rounds = math.log2(num_teams)
     num_games = num_teams - 1
 
@@ -32,80 +44,100 @@ def generate_csv(file_path, heroes, medals, maps, modes, num_teams):
         return None
 
     def random_name(prefix='', k=8):
-        return prefix + ''.join(random.choices('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz', k=k))
+        return prefix + ''.join(rng.choices('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz', k=k))
 
     def random_stat(min_val, max_val):
-        return random.randint(min_val, max_val)
+        return rng.randint(min_val, max_val)
+
+    # Generate game header
+    teams = [f"Team{i+1}" for i in range(num_teams)]
+    # Initialize fixed teams and assign 6 players to each
+    players_by_team = {team: [f"{team}_Player{j+1}" for j in range(6)] for team in teams}
+    
+    
+    # Simulate elimination bracket (single-elimination)
+    round_teams = teams.copy()
+    round_number = 1
+
+    while len(round_teams) > 1:
+        next_round_teams = []
+
+        # Pair up teams for current round
+        for i in range(0, len(round_teams), 2):
+            team_a = round_teams[i]
+            team_b = round_teams[i+1]
+            winning_team = rng.choice([team_a, team_b])
+            game_mode = rng.choice(modes)
+            game_map = rng.choice(maps)
+
+            yield ['', team_a, team_b, winning_team, game_mode, game_map, round_number, '', '', '']
+
+            team_a_players = players_by_team[team_a]
+            team_b_players = players_by_team[team_b]
+            all_players = team_a_players + team_b_players
+
+            heroes_shuffled = heroes.copy()
+            rng.shuffle(heroes_shuffled)
+            # Assign MVP and SVP (from different teams)
+            mvp = rng.choice(team_a_players)
+            svp_candidates = [p for p in team_b_players if p != mvp]
+            svp = rng.choice(svp_candidates) if svp_candidates else rng.choice(team_b_players)
+            yield ['', "MVP", mvp, '', '', '', '', '', '', '']
+            yield ['', "SVP", svp, '', '', '', '', '', '', '']
+
+            medals_remaining = [m for m in medals if m not in ["MVP", "SVP"]]
+            rng.shuffle(medals_remaining)
+            for medal in medals_remaining:
+                yield ['', medal, rng.choice(all_players), '', '', '', '', '', '', '']
+
+            for player_name in all_players:
+                kills = random_stat(0, 30)
+                deaths = random_stat(0, 30)
+                assists = random_stat(0, 30)
+                final_hits = random_stat(0, 30)
+                damage = random_stat(1000, 10000)
+                damage_blocked = random_stat(0, 10000)
+                healing = random_stat(0, 10000)
+                accuracy = random_stat(0, 100)
+                hero = heroes_shuffled.pop()
+
+                yield [
+                    player_name, kills, deaths, assists, final_hits, damage,
+                    damage_blocked, healing, accuracy, hero
+                ]
+
+            next_round_teams.append(winning_team)
+
+        round_teams = next_round_teams
+        round_number += 1
 
-    with open(file_path, 'w', newline='') as csvfile:
-        writer = csv.writer(csvfile)
 
+# Function to generate a random CSV file in the specified format
+def generate_csv(file, heroes, medals, maps, modes, num_teams, seed=None):
+    '''Write a random tournament CSV to file, a path or any text stream (e.g. an
+    io.StringIO), see generate_rows.'''
+    rows = generate_rows(heroes, medals, maps, modes, num_teams, seed)
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, 'w', newline='') as csvfile:
+            csv.writer(csvfile).writerows(rows)
+    else:
+        csv.writer(file).writerows(rows)
 
-        # Generate game header
-        teams = [f"Team{i+1}" for i in range(num_teams)]
-        # Initialize fixed teams and assign 6 players to each
-        players_by_team = {team: [f"{team}_Player{j+1}" for j in range(6)] for team in teams}
-        
-        
-        # Simulate elimination bracket (single-elimination)
-        round_teams = teams.copy()
-        round_number = 1
-
-        while len(round_teams) > 1:
-            next_round_teams = []
-
-            # Pair up teams for current round
-            for i in range(0, len(round_teams), 2):
-                team_a = round_teams[i]
-                team_b = round_teams[i+1]
-                winning_team = random.choice([team_a, team_b])
-                game_mode = random.choice(modes)
-                game_map = random.choice(maps)
-
-                writer.writerow(['', team_a, team_b, winning_team, game_mode, game_map, round_number, '', '', ''])
-
-                team_a_players = players_by_team[team_a]
-                team_b_players = players_by_team[team_b]
-                all_players = team_a_players + team_b_players
-
-                heroes_shuffled = heroes.copy()
-                random.shuffle(heroes_shuffled)
-                # Assign MVP and SVP (from different teams)
-                mvp = random.choice(team_a_players)
-                svp_candidates = [p for p in team_b_players if p != mvp]
-                svp = random.choice(svp_candidates) if svp_candidates else random.choice(team_b_players)
-                writer.writerow(['', "MVP", mvp, '', '', '', '', '', '', ''])
-                writer.writerow(['', "SVP", svp, '', '', '', '', '', '', ''])
-
-                medals_remaining = [m for m in medals if m not in ["MVP", "SVP"]]
-                random.shuffle(medals_remaining)
-                for medal in medals_remaining:
-                    writer.writerow(['', medal, random.choice(all_players), '', '', '', '', '', '', ''])
-
-                for player_name in all_players:
-                    kills = random_stat(0, 30)
-                    deaths = random_stat(0, 30)
-                    assists = random_stat(0, 30)
-                    final_hits = random_stat(0, 30)
-                    damage = random_stat(1000, 10000)
-                    damage_blocked = random_stat(0, 10000)
-                    healing = random_stat(0, 10000)
-                    accuracy = random_stat(0, 100)
-                    hero = heroes_shuffled.pop()
-
-                    writer.writerow([
-                        player_name, kills, deaths, assists, final_hits, damage,
-                        damage_blocked, healing, accuracy, hero
-                    ])
-
-                next_round_teams.append(winning_team)
-
-            round_teams = next_round_teams
-            round_number += 1
+
+@functools.lru_cache(maxsize=SAMPLE_CACHE_SIZE)
+def sample_csv(num_teams, seed):
+    '''The text of a random CSV for the CSV guide, cached by (num_teams, seed) so a page
+    and its download don't generate it twice. Cleared along with the reference cache,
+    since the heroes and maps it picks from come from there.'''
+    buffer = io.StringIO()
+    generate_csv(buffer, fetch_heroes(), fetch_medals(), fetch_maps(), fetch_modes(), num_teams, seed)
+    return buffer.getvalue()
+
+reference_cache.on_invalidate(sample_csv.cache_clear)
 
 
 def fetch_heroes():
-    return [hero.hero_name for hero in db.session.query(Hero).all()]
+    return reference_cache.names(Hero)
 
 def fetch_medals():
     # TODO: actually store this in the db and then read from it
@@ -124,10 +156,10 @@ def fetch_medals():
     ]
 
 def fetch_maps():
-    return [game_map.map_name for game_map in db.session.query(Map).all()]
+    return reference_cache.names(Map)
 
 def fetch_modes():
-    return [game_mode.game_mode_name for game_mode in db.session.query(GameMode).all()]
+    return reference_cache.names(GameMode)
 
 
 if __name__ == "__main__":
@@ -1,13 +1,26 @@
 from app import models as m
 from app import app, db
+from app.reference_cache import reference_cache
+from app import aggregates
+from app import ratings
+from app import brackets
+from app import metrics
 from sqlalchemy.exc import IntegrityError
-from io import TextIOWrapper
+import sqlalchemy as sa
+import hashlib
+import time
+from io import TextIOWrapper, TextIOBase
+from csv import reader as csv_reader
+from itertools import islice
 
 TEST_FILE = "app/testing/test.csv"
 
 # CONSTANTS
 TEAM_SIZE = 6
 PLACEHOLDER_ID = 1
+# Number of games resolved and inserted together by each round of bulk queries
+IMPORT_BATCH_SIZE = 256
+HASH_CHUNK_SIZE = 1024 * 1024
 
 # Indexes
 MATCH_TEAM_A = 1
@@ -32,23 +45,72 @@ PLAYER_ACCURACY = 8
 PLAYER_HERO = 9
 
 
-def split_line(line: str):
-    return line.rstrip('\n').split(',')
+def read_rows(csv):
+    '''Yield the rows of a CSV file one at a time, from a file path or an uploaded stream.'''
+    # if a file path (for local testing)
+    if isinstance(csv, str):
+        with open(csv, 'r', newline='', encoding='utf-8') as rf:
+            yield from csv_reader(rf)
+        return
+
+    # already a text stream
+    if isinstance(csv, TextIOBase):
+        yield from csv_reader(csv)
+        return
+
+    # uploaded from website, convert it from bytes into readable text as it is read
+    text = TextIOWrapper(csv, encoding='utf-8', newline='')
+    try:
+        yield from csv_reader(text)
+    finally:
+        # Don't let the wrapper close the underlying upload stream
+        text.detach()
+
+def file_sha256(csv):
+    '''Return the SHA-256 of a CSV file path or stream, or None if the stream can't be rewound.'''
+    sha256 = hashlib.sha256()
+
+    if isinstance(csv, str):
+        with open(csv, 'rb') as rf:
+            while chunk := rf.read(HASH_CHUNK_SIZE):
+                sha256.update(chunk)
+        return sha256.hexdigest()
+
+    if not csv.seekable():
+        return None
+
+    start = csv.tell()
+    while chunk := csv.read(HASH_CHUNK_SIZE):
+        sha256.update(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+    csv.seek(start)
+    return sha256.hexdigest()
+
+def game_fingerprint(header_row, player_rows):
+    '''SHA-256 of a game's round, teams and player rows, used to recognise games
+    that have already been imported.'''
+    fields = [header_row[MATCH_ROUND], header_row[MATCH_TEAM_A], header_row[MATCH_TEAM_B]]
+    rows = [fields] + [row for row in player_rows]
+    text = '\x1e'.join('\x1f'.join(field.strip() for field in row) for row in rows)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
 
 def process_lines(line_list):
-    games = []
+    '''Group rows into games, yielding (header_row, medal_rows, player_rows) as each game ends.'''
     prev_started_blank = False
     header_row = None
     medal_rows = []
     player_rows = []
 
     for row in line_list:
+        # Skip blank lines
+        if not any(row):
+            continue
+
         # If this line starts with a '' value and the previous line did not
         # then a new game is being read.
         if not row[0]:
             if not prev_started_blank:
                 if header_row:
-                    games.append((header_row, medal_rows, player_rows))
+                    yield (header_row, medal_rows, player_rows)
                 header_row = row
                 medal_rows = []
                 player_rows = []
@@ -60,175 +122,254 @@ def process_lines(line_list):
             prev_started_blank = False
 
     if header_row:
-        games.append((header_row, medal_rows, player_rows))
+        yield (header_row, medal_rows, player_rows)
 
-    return games
+def batched(iterable, size):
+    '''Yield lists of up to size items from iterable.'''
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
 
 
-class CSV_Game:
-    def __init__(self, tournament: m.Tournament, game_header_row, game_medal_rows, game_player_rows):
-        self.tournament = tournament
-        self.game = None
-        self.header_row = game_header_row
-        self.medal_rows = game_medal_rows
-        self.player_rows = game_player_rows 
-
-    def create_game(self):
-        header_row = self.header_row
-
-        team_a_name = header_row[MATCH_TEAM_A]
-        team_b_name = header_row[MATCH_TEAM_B]
-        winning_team_name = header_row[MATCH_WINNER]
-        round_num = int(header_row[MATCH_ROUND])
-
-        game_mode_name = header_row[MATCH_GAME_MODE].lower()
-        map_name = header_row[MATCH_MAP]
-
-        # Find or create teams
-        team_a = db.session.query(m.Team).filter_by(team_name=team_a_name).first()
-        team_b = db.session.query(m.Team).filter_by(team_name=team_b_name).first()
-        if not team_a:
-            team_a = m.Team(team_name=team_a_name)
-            db.session.add(team_a)
-        if not team_b:
-            team_b = m.Team(team_name=team_b_name)
-            db.session.add(team_b)
-
-        winning_team_id = None
-        if winning_team_name in (team_a_name, team_b_name):
-            winning_team = db.session.query(m.Team).filter_by(team_name=winning_team_name).first()
-            winning_team_id = winning_team.id
-
-        game_mode = db.session.query(m.GameMode).filter_by(game_mode_name=game_mode_name).one()
-        game_map = db.session.query(m.Map).filter_by(map_name=map_name).one()
-        db.session.flush()
-        
-        new_game = m.Game(
-            tournament_id=self.tournament.id, 
-            round=round_num,
-            team_a_id=team_a.id,
-            team_b_id=team_b.id,
-            winning_team=winning_team_id,
-            is_draw=(winning_team_id is None),
-            game_mode_id=game_mode.id,
-            map_id=game_map.id
-        )
-
-        db.session.add(new_game)
-        db.session.flush()
-        
-        self.game = new_game
+class CSV_Import:
+    '''Imports a batch of parsed games in bulk.
 
-    def insert_players(self):
-        player_row_list = self.player_rows
+    Games already in the tournament (by fingerprint) are dropped first. Every team
+    and player name in the batch is then resolved with one set-based query per table,
+    and heroes, medals, maps and game modes come from the reference cache. Then the
+    Game, GamePlayers and GameMedals rows are written with executemany inserts.
+    Nothing is committed here, so the whole file is imported in a single transaction.'''
 
-        for i, player_row in enumerate(player_row_list):
-            if i > 11:
-                raise ValueError("Too many players in CSV file")
-            
-            player_name = player_row[PLAYER_NAME]
-
-            # Find or create players
-            player = db.session.query(m.Player).filter_by(gamertag=player_name).first()
-            if not player:
-                player = m.Player(gamertag=player_name)
-                db.session.add(player)
-            
-            # First 6 players are Team A, the next 6 are Team B. 
-            team = self.game.team_a if i < 6 else self.game.team_b
-
-            hero_name = player_row[PLAYER_HERO]
-            hero = db.session.query(m.Hero).filter_by(hero_name=hero_name).first()
-
-            kills = player_row[PLAYER_KILLS]
-            deaths = player_row[PLAYER_DEATHS]
-            assists = player_row[PLAYER_ASSISTS]
-            final_hits = player_row[PLAYER_FINAL_HITS]
-            damage = player_row[PLAYER_DAMAGE]
-            damage_blocked = player_row[PLAYER_DAMAGE_BLOCKED]
-            healing = player_row[PLAYER_HEALING]
-            accuracy_pct = player_row[PLAYER_ACCURACY]
-            
-            db.session.flush()
-
-            game_players = m.GamePlayers(
-                game_id=self.game.id,
-                player_id=player.id,
-                team_id=team.id,
-                hero_id=hero.id,
-                kills=kills,
-                deaths=deaths,
-                assists=assists,
-                final_hits=final_hits,
-                damage=damage,
-                damage_blocked=damage_blocked,
-                healing=healing,
-                accuracy_pct=accuracy_pct,
+    def __init__(self, tournament: m.Tournament, game_list):
+        self.tournament = tournament
+        self.game_list = game_list
+        self.fingerprints = []
+        self.game_ids = []
+        self.inserted_rows = 0
+        self.skipped_games = 0
+
+    def remove_duplicates(self, seen_fingerprints):
+        '''Drop games that are already in the tournament, or earlier in the same file.
+        seen_fingerprints is shared between the batches of one import.'''
+        fingerprints = [game_fingerprint(header_row, player_rows) for header_row, _, player_rows in self.game_list]
+        existing = set(db.session.scalars(
+            sa.select(m.Game.fingerprint).where(
+                m.Game.tournament_id == self.tournament.id,
+                m.Game.fingerprint.in_(fingerprints)
             )
+        ))
+
+        new_games = []
+        for fingerprint, game in zip(fingerprints, self.game_list):
+            if fingerprint in existing or fingerprint in seen_fingerprints:
+                self.skipped_games += 1
+                continue
+            seen_fingerprints.add(fingerprint)
+            self.fingerprints.append(fingerprint)
+            new_games.append(game)
+        self.game_list = new_games
+
+    def resolve_names(self):
+        team_names = []
+        player_names = []
+        medal_names = []
+        hero_names = set()
+        map_names = set()
+        game_mode_names = set()
+
+        for header_row, medal_rows, player_rows in self.game_list:
+            if len(player_rows) > TEAM_SIZE * 2:
+                raise ValueError("Too many players in CSV file")
 
-            db.session.add(game_players)
-            db.session.flush()
+            team_names += [header_row[MATCH_TEAM_A], header_row[MATCH_TEAM_B]]
+            game_mode_names.add(header_row[MATCH_GAME_MODE].lower())
+            map_names.add(header_row[MATCH_MAP])
+
+            for player_row in player_rows:
+                player_names.append(player_row[PLAYER_NAME])
+                hero_names.add(player_row[PLAYER_HERO])
+
+            for medal_row in medal_rows:
+                player_names.append(medal_row[MEDAL_PLAYER])
+                medal_names.append(medal_row[MEDAL_NAME])
+
+        # Teams and players are created if they don't exist yet
+        self.team_ids = m.Team.get_or_create_ids('team_name', team_names)
+        self.player_ids = m.Player.get_or_create_ids('gamertag', player_names)
+
+        # Medals are created if they don't exist yet
+        # TODO: these should just be stored in the DB, but need to know them all.
+        self.medal_ids = reference_cache.get_ids(m.Medal, medal_names)
+        new_medal_names = [n for n in medal_names if n not in self.medal_ids]
+        if new_medal_names:
+            self.medal_ids.update(m.Medal.get_or_create_ids('medal_name', new_medal_names))
+            # Not cached until the import commits
+            reference_cache.invalidate_on_commit(m.Medal)
+
+        # Heroes, maps and game modes must already be seeded
+        self.hero_ids = self.get_existing_ids(m.Hero, hero_names)
+        self.map_ids = self.get_existing_ids(m.Map, map_names)
+        self.game_mode_ids = self.get_existing_ids(m.GameMode, game_mode_names)
+
+    @staticmethod
+    def get_existing_ids(model, names):
+        ids = reference_cache.get_ids(model, names)
+        missing = sorted(n for n in names if n not in ids)
+        if missing:
+            raise ValueError(f"Unknown {model.__name__} value(s) in CSV file: {', '.join(missing)}")
+        return ids
+
+    def insert_games(self):
+        game_rows = []
+        for fingerprint, (header_row, _, _) in zip(self.fingerprints, self.game_list):
+            team_a_name = header_row[MATCH_TEAM_A]
+            team_b_name = header_row[MATCH_TEAM_B]
+            winning_team_name = header_row[MATCH_WINNER]
+
+            winning_team_id = None
+            if winning_team_name in (team_a_name, team_b_name):
+                winning_team_id = self.team_ids[winning_team_name]
+
+            game_rows.append({
+                'tournament_id': self.tournament.id,
+                'round': int(header_row[MATCH_ROUND]),
+                'team_a_id': self.team_ids[team_a_name],
+                'team_b_id': self.team_ids[team_b_name],
+                'winning_team': winning_team_id,
+                'is_draw': winning_team_id is None,
+                'game_mode_id': self.game_mode_ids[header_row[MATCH_GAME_MODE].lower()],
+                'map_id': self.map_ids[header_row[MATCH_MAP]],
+                'fingerprint': fingerprint,
+            })
+
+        if not game_rows:
+            return
+
+        # Ids are needed for the player and medal rows, so return them in insertion order
+        self.game_ids = db.session.scalars(
+            sa.insert(m.Game).returning(m.Game.id, sort_by_parameter_order=True),
+            game_rows
+        ).all()
+        self.inserted_rows += len(self.game_ids)
 
+    def insert_players(self):
+        game_player_rows = []
+        for game_id, (header_row, _, player_rows) in zip(self.game_ids, self.game_list):
+            team_a_id = self.team_ids[header_row[MATCH_TEAM_A]]
+            team_b_id = self.team_ids[header_row[MATCH_TEAM_B]]
+
+            for i, player_row in enumerate(player_rows):
+                game_player_rows.append({
+                    'game_id': game_id,
+                    'player_id': self.player_ids[player_row[PLAYER_NAME]],
+                    # First 6 players are Team A, the next 6 are Team B.
+                    'team_id': team_a_id if i < TEAM_SIZE else team_b_id,
+                    'hero_id': self.hero_ids[player_row[PLAYER_HERO]],
+                    'kills': int(player_row[PLAYER_KILLS]),
+                    'deaths': int(player_row[PLAYER_DEATHS]),
+                    'assists': int(player_row[PLAYER_ASSISTS]),
+                    'final_hits': int(player_row[PLAYER_FINAL_HITS]),
+                    'damage': int(player_row[PLAYER_DAMAGE]),
+                    'damage_blocked': int(player_row[PLAYER_DAMAGE_BLOCKED]),
+                    'healing': int(player_row[PLAYER_HEALING]),
+                    'accuracy_pct': int(player_row[PLAYER_ACCURACY]),
+                })
+
+        if game_player_rows:
+            db.session.execute(sa.insert(m.GamePlayers), game_player_rows)
+            self.inserted_rows += len(game_player_rows)
 
     def insert_medals(self):
-        medal_row_list = self.medal_rows
-
-        for medal_row in medal_row_list:
-            player_name = medal_row[MEDAL_PLAYER]
-            medal_name = medal_row[MEDAL_NAME]
-
-            # Find or create players
-            player = db.session.query(m.Player).filter_by(gamertag=player_name).first()
-            if not player:
-                player = m.Player(gamertag=player_name)
-                db.session.add(player)
-            
-            # Find or create medals
-            # TODO: these should just be stored in the DB, but need to know them all.
-            medal = db.session.query(m.Medal).filter_by(medal_name=medal_name).first()
-            if not medal:
-                medal = m.Medal(medal_name=medal_name)
-                db.session.add(medal)
-            
-            db.session.flush()
-
-            game_medals = m.GameMedals(
-                game_id=self.game.id, 
-                medal_id=medal.id, 
-                player_id=player.id
-            )
-
-            db.session.add(game_medals)
-            db.session.flush()
-
-    def create_changes(self):
-        self.create_game()
+        game_medal_rows = []
+        for game_id, (_, medal_rows, _) in zip(self.game_ids, self.game_list):
+            for medal_row in medal_rows:
+                game_medal_rows.append({
+                    'game_id': game_id,
+                    'medal_id': self.medal_ids[medal_row[MEDAL_NAME]],
+                    'player_id': self.player_ids[medal_row[MEDAL_PLAYER]],
+                })
+
+        if game_medal_rows:
+            db.session.execute(sa.insert(m.GameMedals), game_medal_rows)
+            self.inserted_rows += len(game_medal_rows)
+
+    def update_aggregates(self):
+        # Add the new games onto the precomputed stats tables and ratings
+        aggregates.apply_games(self.game_ids)
+        ratings.apply_games(self.game_ids)
+
+    def create_changes(self, seen_fingerprints):
+        self.remove_duplicates(seen_fingerprints)
+        self.resolve_names()
+        self.insert_games()
         self.insert_players()
         self.insert_medals()
+        self.update_aggregates()
 
     def commit_changes(self):
         db.session.commit()
 
-def import_csv(csv, tournament: m.Tournament, commit_changes=True):
-    # if a file path (for local testing)
-    if isinstance(csv, str):
-        with open(csv, 'r') as rf:
-            lines = [split_line(l) for l in rf]
-    
-    # uploaded from website
-    else:
-        # convert it from bytes into readable text
-        csv = TextIOWrapper(csv, encoding='utf-8')
-        lines = [split_line(l) for l in csv]
-
-    game_list = process_lines(lines)
-    
-    for game in game_list:
-        csvg = CSV_Game(tournament, game[0], game[1], game[2])
-        csvg.create_changes()
-        # error checking here
-        if commit_changes:
-            csvg.commit_changes()
+class ImportSummary:
+    '''Running totals for one call to import_csv.'''
+    def __init__(self):
+        self.parsed_games = 0
+        self.inserted_games = 0
+        self.skipped_games = 0
+        self.inserted_rows = 0
+        # True if this exact file had already been imported into the tournament
+        self.duplicate_file = False
+
+def import_csv(csv, tournament: m.Tournament, commit_changes=True, progress=None):
+    '''Import every game in a CSV file into the tournament.
+
+    Re-uploading a file that was already imported does nothing, and games that are
+    already in the tournament are skipped, so a growing file can be re-uploaded as
+    the tournament progresses. progress, if given, is called with the ImportSummary
+    after each batch.'''
+    summary = ImportSummary()
+    started = time.perf_counter()
+
+    sha256 = file_sha256(csv)
+    if sha256 and db.session.scalar(sa.select(m.TournamentUpload.id).where(
+        m.TournamentUpload.tournament_id == tournament.id,
+        m.TournamentUpload.sha256 == sha256
+    )):
+        summary.duplicate_file = True
+        if progress:
+            progress(summary)
+        return True
+
+    # Games are parsed as the file is read and imported in batches, so memory use
+    # stays flat no matter how large the file is. All batches share one transaction.
+    seen_fingerprints = set()
+    for game_batch in batched(process_lines(read_rows(csv)), IMPORT_BATCH_SIZE):
+        csv_import = CSV_Import(tournament, game_batch)
+        csv_import.create_changes(seen_fingerprints)
+
+        summary.parsed_games += len(game_batch)
+        summary.inserted_games += len(csv_import.game_ids)
+        summary.skipped_games += csv_import.skipped_games
+        summary.inserted_rows += csv_import.inserted_rows
+        if progress:
+            progress(summary)
+
+    # The bracket depends on every game in the tournament, so it's rebuilt once the
+    # whole file is in rather than after each batch
+    if summary.inserted_games:
+        brackets.rebuild(tournament.id)
+
+    if sha256:
+        db.session.add(m.TournamentUpload(
+            tournament_id=tournament.id,
+            sha256=sha256,
+            games_inserted=summary.inserted_games,
+            games_skipped=summary.skipped_games
+        ))
+
+    # error checking here
+    if commit_changes:
+        db.session.commit()
+    metrics.record_import(summary.inserted_rows, time.perf_counter() - started)
     
     return True
     
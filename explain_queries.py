@@ -0,0 +1,153 @@
+# Prints SQLite's EXPLAIN QUERY PLAN for each of the queries run by the stats pages,
+# to check that they use indexes rather than scanning whole tables.
+# Run after `flask db upgrade`: python explain_queries.py
+# Exits with status 1 if any query still scans a table.
+
+import sys
+import sqlalchemy as sa
+from app import app, db
+from app import models as m
+from app import careers, leaderboard
+
+# Any id works here, the plan doesn't depend on the values
+TOURNAMENT_ID = 1
+TEAM_ID = 1
+PLAYER_ID = 1
+USER_ID = 1
+
+
+def stats_queries():
+    '''The query shapes used by the tournament, team, player and search routes.'''
+    return {
+        'tournament_page: games': sa.select(m.Game)
+            .where(m.Game.tournament_id == TOURNAMENT_ID)
+            .order_by(m.Game.round),
+        'tournament_page: game players': sa.select(m.GamePlayers)
+            .join(m.Game)
+            .where(m.Game.tournament_id == TOURNAMENT_ID),
+        'tournament_page: game medals': sa.select(m.GameMedals)
+            .join(m.Game)
+            .where(m.Game.tournament_id == TOURNAMENT_ID),
+        'brackets.load: matches': sa.select(m.BracketNode, m.BracketEdge.target_id, m.Team.team_name)
+            .join(m.Team, m.Team.id == m.BracketNode.team_a_id)
+            .outerjoin(m.BracketEdge, m.BracketEdge.source_id == m.BracketNode.id)
+            .where(m.BracketNode.tournament_id == TOURNAMENT_ID)
+            .order_by(m.BracketNode.round, m.BracketNode.position),
+        'brackets.rebuild: delete edges': sa.select(m.BracketEdge)
+            .where(m.BracketEdge.tournament_id == TOURNAMENT_ID),
+        'team_results_page: team player stats': sa.select(m.PlayerTournamentStats, m.Player.gamertag)
+            .join(m.Player)
+            .where(
+                m.PlayerTournamentStats.tournament_id == TOURNAMENT_ID,
+                m.PlayerTournamentStats.team_id == TEAM_ID
+            ),
+        'team_results_page: chart games': sa.select(m.Game.id, sa.func.sum(m.GamePlayers.kills))
+            .join(m.Game)
+            .where(
+                m.GamePlayers.team_id == TEAM_ID,
+                m.Game.tournament_id == TOURNAMENT_ID
+            )
+            .group_by(m.Game.id),
+        'tournament_player_view: player stats': sa.select(m.PlayerTournamentStats)
+            .where(
+                m.PlayerTournamentStats.tournament_id == TOURNAMENT_ID,
+                m.PlayerTournamentStats.player_id == PLAYER_ID
+            ),
+        'tournament_player_view: player game players': sa.select(m.GamePlayers)
+            .join(m.Game)
+            .where(m.GamePlayers.player_id == PLAYER_ID, m.Game.tournament_id == TOURNAMENT_ID)
+            .order_by(m.Game.round, m.Game.id),
+        'tournament_player_view: player medals': sa.select(m.GameMedals.game_id, m.Medal.medal_name)
+            .join(m.Medal)
+            .join(m.Game)
+            .where(m.GameMedals.player_id == PLAYER_ID, m.Game.tournament_id == TOURNAMENT_ID),
+        'player_career_page: career rows': sa.select(m.PlayerHeroStats)
+            .where(m.PlayerHeroStats.player_id == PLAYER_ID, m.PlayerHeroStats.tournament_id.in_(
+                careers.select_visible_tournaments(m.User(id=USER_ID), PLAYER_ID).with_only_columns(m.Tournament.id)
+            )),
+        'api_get_tournaments: tournaments page': m.Tournament.select_with_access(m.User(id=USER_ID))
+            .where(m.Tournament.id > 0)
+            .order_by(m.Tournament.id)
+            .limit(50),
+        'api_search_users: username prefix': sa.select(m.User.id, m.User.username)
+            .where(
+                ~sa.exists().where(
+                    m.TournamentUsers.tournament_id == TOURNAMENT_ID,
+                    m.TournamentUsers.user_id == m.User.id
+                ),
+                sa.func.lower(m.User.username) >= 'a',
+                sa.func.lower(m.User.username) < 'a\U0010ffff'
+            )
+            .order_by(sa.func.lower(m.User.username), m.User.id)
+            .limit(20),
+        'leaderboard.page: ranked players': leaderboard_page(),
+        'meta.meta_slice: hero by map': sa.select(m.HeroMetaStats.hero_id, m.HeroMetaStats.map_id, sa.func.sum(m.HeroMetaStats.games))
+            .join(m.Hero, m.Hero.id == m.HeroMetaStats.hero_id)
+            .where(m.HeroMetaStats.tournament_id == TOURNAMENT_ID)
+            .group_by(m.HeroMetaStats.hero_id, m.HeroMetaStats.map_id),
+        'meta.meta_slice: map games': sa.select(m.MapMetaStats.map_id, sa.func.sum(m.MapMetaStats.games))
+            .where(m.MapMetaStats.tournament_id == TOURNAMENT_ID)
+            .group_by(m.MapMetaStats.map_id),
+        'head_to_head.records: tournament pairs': sa.select(m.HeadToHeadStats.team_a_id, sa.func.sum(m.HeadToHeadStats.games))
+            .join(m.Team, m.Team.id == m.HeadToHeadStats.team_b_id)
+            .where(m.HeadToHeadStats.tournament_id == TOURNAMENT_ID)
+            .group_by(m.HeadToHeadStats.team_a_id, m.HeadToHeadStats.team_b_id),
+        'head_to_head.records: pair across tournaments': sa.select(sa.func.sum(m.HeadToHeadStats.games))
+            .join(m.Tournament, m.Tournament.id == m.HeadToHeadStats.tournament_id)
+            .join(m.Visibility, m.Visibility.id == m.Tournament.visibility_id)
+            .where(
+                m.Visibility.visibility == 'public',
+                m.HeadToHeadStats.team_a_id == TEAM_ID,
+                m.HeadToHeadStats.team_b_id == TEAM_ID + 1
+            )
+            .group_by(m.HeadToHeadStats.team_a_id, m.HeadToHeadStats.team_b_id),
+    }
+
+
+def leaderboard_page():
+    board = leaderboard.ranked(TOURNAMENT_ID)
+    return (
+        sa.select(board, m.Player.gamertag)
+        .join(m.Player, m.Player.id == board.c.player_id)
+        .order_by(board.c.kills_rank, m.Player.gamertag, board.c.player_id)
+        .limit(50)
+    )
+
+
+def find_scans(plan_rows):
+    '''Return the plan steps that read a whole table or index rather than searching one.
+    Scans of subquery results (e.g. the rows a window function ranks) aren't counted.'''
+    subqueries = {row.detail.split(' ', 1)[1] for row in plan_rows
+                  if row.detail.startswith(('MATERIALIZE ', 'CO-ROUTINE '))}
+    return [
+        row.detail for row in plan_rows
+        if row.detail.startswith('SCAN')
+        and not row.detail.startswith('SCAN (subquery')
+        and row.detail.split(' ')[1] not in subqueries
+    ]
+
+
+def explain(statement):
+    sql = str(statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}))
+    return db.session.execute(sa.text(f'EXPLAIN QUERY PLAN {sql}')).all()
+
+
+if __name__ == '__main__':
+    with app.app_context():
+        if db.engine.dialect.name != 'sqlite':
+            sys.exit('EXPLAIN QUERY PLAN is only supported on SQLite.')
+
+        scanned = []
+        for name, statement in stats_queries().items():
+            plan_rows = explain(statement)
+            print(name)
+            for row in plan_rows:
+                print(f'    {row.detail}')
+            if find_scans(plan_rows):
+                scanned.append(name)
+
+        print()
+        if scanned:
+            print(f'{len(scanned)} queries scan a table: {", ".join(scanned)}')
+            sys.exit(1)
+        print('No table scans.')
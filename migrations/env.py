@@ -51,6 +51,14 @@ def get_metadata():
     return target_db.metadata
 
 
+def include_name(name, type_, parent_names):
+    # The full-text search table and its shadow tables aren't models (see app/search.py),
+    # so autogenerate shouldn't try to drop them
+    if type_ == 'table' and name.startswith('tournament_fts'):
+        return False
+    return True
+
+
 def run_migrations_offline():
     """Run migrations in 'offline' mode.
 
@@ -65,7 +73,8 @@ def run_migrations_offline():
     """
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
-        url=url, target_metadata=get_metadata(), literal_binds=True
+        url=url, target_metadata=get_metadata(), literal_binds=True,
+        include_name=include_name
     )
 
     with context.begin_transaction():
@@ -93,6 +102,7 @@ def run_migrations_online():
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    conf_args.setdefault("include_name", include_name)
 
     connectable = get_engine()
 
@@ -106,6 +116,10 @@ def run_migrations_online():
         with context.begin_transaction():
             context.run_migrations()
 
+    # Migrations may change the reference tables cached by this process
+    from app.reference_cache import reference_cache
+    reference_cache.invalidate()
+
 
 if context.is_offline_mode():
     run_migrations_offline()
@@ -0,0 +1,127 @@
+"""Add team and player ratings
+
+Revision ID: 0d058bc75da2
+Revises: b8228f5033ed
+Create Date: 2026-10-18 07:07:18.082482
+
+"""
+from itertools import groupby
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0d058bc75da2'
+down_revision = 'b8228f5033ed'
+branch_labels = None
+depends_on = None
+
+# The same constants as app/ratings.py
+INITIAL_RATING = 1500.0
+K_FACTOR = 32
+
+
+def expected_score(rating, opponent_rating):
+    return 1 / (1 + 10 ** ((opponent_rating - rating) / 400))
+
+
+def record(row, score, change):
+    row['rating'] += change
+    row['games'] += 1
+    if score == 1:
+        row['wins'] += 1
+    elif score == 0:
+        row['losses'] += 1
+    else:
+        row['draws'] += 1
+
+
+def fill_ratings(connection):
+    '''Rate the games imported before this revision, replaying them in (tournament, round, game)
+    order as ratings.rebuild() does.'''
+    rows = connection.execute(sa.text('''
+        SELECT game.id, game.team_a_id, game.team_b_id, game.winning_team, game.is_draw,
+            game_players.team_id, game_players.player_id
+        FROM game
+        LEFT JOIN game_players ON game_players.game_id = game.id
+        ORDER BY game.tournament_id, game.round, game.id, game_players.player_id
+    '''))
+
+    teams, players = {}, {}
+    def rating(ratings, id_):
+        return ratings.setdefault(id_, {'rating': INITIAL_RATING, 'games': 0, 'wins': 0, 'losses': 0, 'draws': 0})
+
+    for _, game_rows in groupby(rows, key=lambda row: row.id):
+        game_rows = list(game_rows)
+        game = game_rows[0]
+        roster = {game.team_a_id: [], game.team_b_id: []}
+        for row in game_rows:
+            if row.player_id is not None:
+                roster.setdefault(row.team_id, []).append(row.player_id)
+
+        if game.is_draw or game.winning_team is None:
+            score_a = 0.5
+        else:
+            score_a = 1.0 if game.winning_team == game.team_a_id else 0.0
+        sides = [(game.team_a_id, game.team_b_id, score_a), (game.team_b_id, game.team_a_id, 1 - score_a)]
+
+        # Every change is worked out from the ratings before this game
+        team_changes = [
+            K_FACTOR * (score - expected_score(rating(teams, team_id)['rating'], rating(teams, opponent_id)['rating']))
+            for team_id, opponent_id, score in sides
+        ]
+        strength = {
+            team_id: sum(rating(players, p)['rating'] for p in roster[team_id]) / len(roster[team_id])
+            for team_id, _, _ in sides if roster[team_id]
+        }
+        player_changes = {
+            team_id: K_FACTOR * (score - expected_score(strength[team_id], strength[opponent_id]))
+            for team_id, opponent_id, score in sides if team_id in strength and opponent_id in strength
+        }
+
+        for (team_id, _, score), change in zip(sides, team_changes):
+            record(teams[team_id], score, change)
+            for player_id in roster[team_id]:
+                record(players[player_id], score, player_changes.get(team_id, 0.0))
+
+    columns = ['rating', 'games', 'wins', 'losses', 'draws']
+    for table, key, ratings in (('team_rating', 'team_id', teams), ('player_rating', 'player_id', players)):
+        if ratings:
+            connection.execute(
+                sa.text(f"INSERT INTO {table} ({key}, {', '.join(columns)}) "
+                        f"VALUES (:id, {', '.join(':' + column for column in columns)})"),
+                [{'id': id_, **row} for id_, row in ratings.items()]
+            )
+
+
+def upgrade():
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.create_table('player_rating',
+    sa.Column('player_id', sa.Integer(), nullable=False),
+    sa.Column('rating', sa.Float(), nullable=False),
+    sa.Column('games', sa.Integer(), nullable=False),
+    sa.Column('wins', sa.Integer(), nullable=False),
+    sa.Column('losses', sa.Integer(), nullable=False),
+    sa.Column('draws', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['player_id'], ['player.id'], ),
+    sa.PrimaryKeyConstraint('player_id')
+    )
+    op.create_table('team_rating',
+    sa.Column('team_id', sa.Integer(), nullable=False),
+    sa.Column('rating', sa.Float(), nullable=False),
+    sa.Column('games', sa.Integer(), nullable=False),
+    sa.Column('wins', sa.Integer(), nullable=False),
+    sa.Column('losses', sa.Integer(), nullable=False),
+    sa.Column('draws', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['team_id'], ['team.id'], ),
+    sa.PrimaryKeyConstraint('team_id')
+    )
+    # ### end Alembic commands ###
+    fill_ratings(op.get_bind())
+
+
+def downgrade():
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.drop_table('team_rating')
+    op.drop_table('player_rating')
+    # ### end Alembic commands ###
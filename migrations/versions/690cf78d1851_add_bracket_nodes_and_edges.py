@@ -0,0 +1,165 @@
+"""add bracket nodes and edges
+
+Revision ID: 690cf78d1851
+Revises: 98c780036af4
+Create Date: 2026-10-18 07:14:17.330130
+
+"""
+from collections import defaultdict
+from itertools import groupby
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '690cf78d1851'
+down_revision = '98c780036af4'
+branch_labels = None
+depends_on = None
+
+metadata = sa.MetaData()
+bracket_node = sa.Table(
+    'bracket_node', metadata, sa.Column('id', sa.Integer, primary_key=True), sa.Column('tournament_id', sa.Integer),
+    sa.Column('round', sa.Integer), sa.Column('position', sa.Integer), sa.Column('team_a_id', sa.Integer),
+    sa.Column('team_b_id', sa.Integer), sa.Column('team_a_wins', sa.Integer), sa.Column('team_b_wins', sa.Integer),
+    sa.Column('draws', sa.Integer), sa.Column('winner_id', sa.Integer),
+)
+bracket_edge = sa.Table(
+    'bracket_edge', metadata, sa.Column('source_id', sa.Integer, primary_key=True), sa.Column('target_id', sa.Integer),
+    sa.Column('tournament_id', sa.Integer), sa.Column('team_id', sa.Integer),
+)
+
+
+# A copy of app/brackets.py build_nodes() as of this revision
+def build_nodes(games):
+    '''Group games, in (round, id) order, into bracket node dicts and link each decided
+    node to the next node its winner played in. Returns the nodes in bracket order and
+    {node index: next node index}.'''
+    by_match, order = {}, []
+    for game in games:
+        key = (game.round, frozenset((game.team_a_id, game.team_b_id)))
+        node = by_match.get(key)
+        if node is None:
+            node = by_match[key] = {
+                'round': game.round, 'team_a_id': game.team_a_id, 'team_b_id': game.team_b_id,
+                'team_a_wins': 0, 'team_b_wins': 0, 'draws': 0, 'winner_id': None, 'first_game': game.id,
+            }
+            order.append(node)
+        if game.is_draw or game.winning_team is None:
+            node['draws'] += 1
+        elif game.winning_team == node['team_a_id']:
+            node['team_a_wins'] += 1
+        elif game.winning_team == node['team_b_id']:
+            node['team_b_wins'] += 1
+
+    rounds = defaultdict(list)
+    for node in order:
+        if node['team_a_wins'] != node['team_b_wins']:
+            node['winner_id'] = node['team_a_id'] if node['team_a_wins'] > node['team_b_wins'] else node['team_b_id']
+        rounds[node['round']].append(node)
+
+    # A winner advances to the first match they play in a later round
+    next_node = {}
+    later_matches = {}
+    for round_number in sorted(rounds, reverse=True):
+        for node in rounds[round_number]:
+            if node['winner_id'] is not None and node['winner_id'] in later_matches:
+                next_node[id(node)] = later_matches[node['winner_id']]
+        for node in rounds[round_number]:
+            later_matches[node['team_a_id']] = later_matches[node['team_b_id']] = node
+
+    # Matches are placed under the matches that feed them, so the bracket's lines
+    # don't cross. Teams without a previous match come after, in game order.
+    nodes, placed = [], {}
+    for round_number in sorted(rounds):
+        fed_by = defaultdict(list)
+        for source, target in next_node.items():
+            fed_by[id(target)].append(placed.get(source, len(placed)))
+        round_nodes = sorted(
+            rounds[round_number],
+            key=lambda node: (min(fed_by[id(node)], default=len(placed)), node['first_game'])
+        )
+        for position, node in enumerate(round_nodes):
+            node['position'] = position
+            placed[id(node)] = len(placed)
+            nodes.append(node)
+
+    index = {id(node): i for i, node in enumerate(nodes)}
+    return nodes, {index[source]: index[id(target)] for source, target in next_node.items()}
+
+
+def fill_brackets(connection):
+    '''Build the brackets of the tournaments imported before this revision.'''
+    games = connection.execute(sa.text('''
+        SELECT id, tournament_id, round, team_a_id, team_b_id, winning_team, is_draw
+        FROM game
+        ORDER BY tournament_id, round, id
+    '''))
+    for tid, tournament_games in groupby(games, key=lambda game: game.tournament_id):
+        nodes, next_node = build_nodes(tournament_games)
+        node_ids = connection.execute(
+            sa.insert(bracket_node).returning(bracket_node.c.id, sort_by_parameter_order=True),
+            [
+                {'tournament_id': tid, **{k: v for k, v in node.items() if k != 'first_game'}}
+                for node in nodes
+            ]
+        ).scalars().all()
+        if next_node:
+            connection.execute(sa.insert(bracket_edge), [
+                {'tournament_id': tid, 'source_id': node_ids[source], 'target_id': node_ids[target],
+                 'team_id': nodes[source]['winner_id']}
+                for source, target in next_node.items()
+            ])
+
+
+def upgrade():
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.create_table('bracket_node',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('tournament_id', sa.Integer(), nullable=False),
+    sa.Column('round', sa.Integer(), nullable=False),
+    sa.Column('position', sa.Integer(), nullable=False),
+    sa.Column('team_a_id', sa.Integer(), nullable=False),
+    sa.Column('team_b_id', sa.Integer(), nullable=False),
+    sa.Column('team_a_wins', sa.Integer(), nullable=False),
+    sa.Column('team_b_wins', sa.Integer(), nullable=False),
+    sa.Column('draws', sa.Integer(), nullable=False),
+    sa.Column('winner_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['team_a_id'], ['team.id'], ),
+    sa.ForeignKeyConstraint(['team_b_id'], ['team.id'], ),
+    sa.ForeignKeyConstraint(['tournament_id'], ['tournament.id'], ),
+    sa.ForeignKeyConstraint(['winner_id'], ['team.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('bracket_node', schema=None) as batch_op:
+        batch_op.create_index('ix_bracket_node_tournament_id_round_position', ['tournament_id', 'round', 'position'], unique=True)
+
+    op.create_table('bracket_edge',
+    sa.Column('source_id', sa.Integer(), nullable=False),
+    sa.Column('target_id', sa.Integer(), nullable=False),
+    sa.Column('tournament_id', sa.Integer(), nullable=False),
+    sa.Column('team_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['source_id'], ['bracket_node.id'], ),
+    sa.ForeignKeyConstraint(['target_id'], ['bracket_node.id'], ),
+    sa.ForeignKeyConstraint(['team_id'], ['team.id'], ),
+    sa.ForeignKeyConstraint(['tournament_id'], ['tournament.id'], ),
+    sa.PrimaryKeyConstraint('source_id')
+    )
+    with op.batch_alter_table('bracket_edge', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_bracket_edge_tournament_id'), ['tournament_id'], unique=False)
+
+    # ### end Alembic commands ###
+    fill_brackets(op.get_bind())
+
+
+def downgrade():
+    # ### commands auto generated by Alembic - please adjust! ###
+    with op.batch_alter_table('bracket_edge', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_bracket_edge_tournament_id'))
+
+    op.drop_table('bracket_edge')
+    with op.batch_alter_table('bracket_node', schema=None) as batch_op:
+        batch_op.drop_index('ix_bracket_node_tournament_id_round_position')
+
+    op.drop_table('bracket_node')
+    # ### end Alembic commands ###
@@ -0,0 +1,113 @@
+"""Add player and team tournament stats tables
+
+Revision ID: 8e1f9c521611
+Revises: 956f70a934bf
+Create Date: 2026-10-18 06:50:45.775228
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e1f9c521611'
+down_revision = '956f70a934bf'
+branch_labels = None
+depends_on = None
+
+# Medals won by each player in each game, for the medal totals
+GAME_MEDALS = '''(
+    SELECT game_id, player_id, count(*) AS medals FROM game_medals GROUP BY game_id, player_id
+) AS game_medals ON game_medals.game_id = game_players.game_id AND game_medals.player_id = game_players.player_id'''
+
+
+def fill_stats():
+    '''Add up the games imported before this revision.'''
+    op.execute(f'''
+        INSERT INTO player_tournament_stats (
+            tournament_id, team_id, player_id, games, kills, deaths, assists, final_hits, damage,
+            damage_blocked, healing, accuracy_total, medals, max_damage, max_healing, max_blocked
+        )
+        SELECT
+            game.tournament_id, game_players.team_id, game_players.player_id, count(*),
+            sum(game_players.kills), sum(game_players.deaths), sum(game_players.assists), sum(game_players.final_hits),
+            sum(game_players.damage), sum(game_players.damage_blocked), sum(game_players.healing),
+            sum(game_players.accuracy_pct), coalesce(sum(game_medals.medals), 0),
+            max(game_players.damage), max(game_players.healing), max(game_players.damage_blocked)
+        FROM game_players
+        JOIN game ON game.id = game_players.game_id
+        LEFT JOIN {GAME_MEDALS}
+        GROUP BY game.tournament_id, game_players.team_id, game_players.player_id
+    ''')
+    op.execute(f'''
+        INSERT INTO team_tournament_stats (
+            tournament_id, team_id, games, wins, player_rows, kills, deaths, assists, final_hits, damage,
+            damage_blocked, healing, accuracy_total, medals, max_round
+        )
+        SELECT
+            game.tournament_id, game_players.team_id, count(DISTINCT game.id),
+            count(DISTINCT CASE WHEN game.winning_team = game_players.team_id THEN game.id END), count(*),
+            sum(game_players.kills), sum(game_players.deaths), sum(game_players.assists), sum(game_players.final_hits),
+            sum(game_players.damage), sum(game_players.damage_blocked), sum(game_players.healing),
+            sum(game_players.accuracy_pct), coalesce(sum(game_medals.medals), 0),
+            max(game.round)
+        FROM game_players
+        JOIN game ON game.id = game_players.game_id
+        LEFT JOIN {GAME_MEDALS}
+        GROUP BY game.tournament_id, game_players.team_id
+    ''')
+
+
+def upgrade():
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.create_table('player_tournament_stats',
+    sa.Column('tournament_id', sa.Integer(), nullable=False),
+    sa.Column('team_id', sa.Integer(), nullable=False),
+    sa.Column('player_id', sa.Integer(), nullable=False),
+    sa.Column('max_damage', sa.Integer(), nullable=False),
+    sa.Column('max_healing', sa.Integer(), nullable=False),
+    sa.Column('max_blocked', sa.Integer(), nullable=False),
+    sa.Column('games', sa.Integer(), nullable=False),
+    sa.Column('kills', sa.Integer(), nullable=False),
+    sa.Column('deaths', sa.Integer(), nullable=False),
+    sa.Column('assists', sa.Integer(), nullable=False),
+    sa.Column('final_hits', sa.Integer(), nullable=False),
+    sa.Column('damage', sa.Integer(), nullable=False),
+    sa.Column('damage_blocked', sa.Integer(), nullable=False),
+    sa.Column('healing', sa.Integer(), nullable=False),
+    sa.Column('accuracy_total', sa.Integer(), nullable=False),
+    sa.Column('medals', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['player_id'], ['player.id'], ),
+    sa.ForeignKeyConstraint(['team_id'], ['team.id'], ),
+    sa.ForeignKeyConstraint(['tournament_id'], ['tournament.id'], ),
+    sa.PrimaryKeyConstraint('tournament_id', 'team_id', 'player_id')
+    )
+    op.create_table('team_tournament_stats',
+    sa.Column('tournament_id', sa.Integer(), nullable=False),
+    sa.Column('team_id', sa.Integer(), nullable=False),
+    sa.Column('wins', sa.Integer(), nullable=False),
+    sa.Column('player_rows', sa.Integer(), nullable=False),
+    sa.Column('max_round', sa.Integer(), nullable=False),
+    sa.Column('games', sa.Integer(), nullable=False),
+    sa.Column('kills', sa.Integer(), nullable=False),
+    sa.Column('deaths', sa.Integer(), nullable=False),
+    sa.Column('assists', sa.Integer(), nullable=False),
+    sa.Column('final_hits', sa.Integer(), nullable=False),
+    sa.Column('damage', sa.Integer(), nullable=False),
+    sa.Column('damage_blocked', sa.Integer(), nullable=False),
+    sa.Column('healing', sa.Integer(), nullable=False),
+    sa.Column('accuracy_total', sa.Integer(), nullable=False),
+    sa.Column('medals', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['team_id'], ['team.id'], ),
+    sa.ForeignKeyConstraint(['tournament_id'], ['tournament.id'], ),
+    sa.PrimaryKeyConstraint('tournament_id', 'team_id')
+    )
+    # ### end Alembic commands ###
+    fill_stats()
+
+
+def downgrade():
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.drop_table('team_tournament_stats')
+    op.drop_table('player_tournament_stats')
+    # ### end Alembic commands ###
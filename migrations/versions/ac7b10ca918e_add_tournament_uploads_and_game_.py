@@ -0,0 +1,101 @@
+"""Add tournament uploads and game fingerprints
+
+Revision ID: ac7b10ca918e
+Revises: 375186703e8d
+Create Date: 2026-10-18 06:48:16.672468
+
+"""
+import hashlib
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'ac7b10ca918e'
+down_revision = '375186703e8d'
+branch_labels = None
+depends_on = None
+
+# Games fingerprinted per round of queries
+FINGERPRINT_BATCH = 500
+
+
+def game_fingerprint(header_fields, player_rows):
+    '''The same hash as data_import.game_fingerprint, from the fields it reads out of the CSV.'''
+    rows = [header_fields] + player_rows
+    text = '\x1e'.join('\x1f'.join(str(field).strip() for field in row) for row in rows)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def fill_fingerprints(connection):
+    '''Fingerprint the games imported before this revision, so re-uploading their file skips them.
+    The player rows are rebuilt in CSV column order, team A's players first, as imported.
+    If a tournament already has the same game twice, only the first copy is fingerprinted.'''
+    games = connection.execute(sa.text('''
+        SELECT game.id, game.tournament_id, game.round, game.team_a_id, team_a.team_name, team_b.team_name
+        FROM game
+        JOIN team AS team_a ON team_a.id = game.team_a_id
+        JOIN team AS team_b ON team_b.id = game.team_b_id
+        ORDER BY game.id
+    ''')).all()
+    players_stmt = sa.text('''
+        SELECT game_players.game_id, game_players.team_id, player.gamertag, game_players.kills, game_players.deaths,
+            game_players.assists, game_players.final_hits, game_players.damage, game_players.damage_blocked,
+            game_players.healing, game_players.accuracy_pct, hero.hero_name
+        FROM game_players
+        JOIN player ON player.id = game_players.player_id
+        JOIN hero ON hero.id = game_players.hero_id
+        WHERE game_players.game_id IN :game_ids
+        ORDER BY game_players.game_id, game_players.rowid
+    ''').bindparams(sa.bindparam('game_ids', expanding=True))
+
+    seen = set()
+    for i in range(0, len(games), FINGERPRINT_BATCH):
+        batch = games[i:i + FINGERPRINT_BATCH]
+        players = {}
+        for game_id, team_id, *fields in connection.execute(players_stmt, {'game_ids': [game[0] for game in batch]}):
+            players.setdefault(game_id, []).append((team_id, fields))
+
+        updates = []
+        for game_id, tournament_id, round_, team_a_id, team_a_name, team_b_name in batch:
+            rows = players.get(game_id, [])
+            player_rows = [fields for team_id, fields in rows if team_id == team_a_id]
+            player_rows += [fields for team_id, fields in rows if team_id != team_a_id]
+            fingerprint = game_fingerprint([round_, team_a_name, team_b_name], player_rows)
+            if (tournament_id, fingerprint) not in seen:
+                seen.add((tournament_id, fingerprint))
+                updates.append({'id': game_id, 'fingerprint': fingerprint})
+        if updates:
+            connection.execute(sa.text('UPDATE game SET fingerprint = :fingerprint WHERE id = :id'), updates)
+
+
+def upgrade():
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.create_table('tournament_upload',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('tournament_id', sa.Integer(), nullable=False),
+    sa.Column('sha256', sa.Text(), nullable=False),
+    sa.Column('uploaded_at', sa.DateTime(), nullable=False),
+    sa.Column('games_inserted', sa.Integer(), nullable=False),
+    sa.Column('games_skipped', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['tournament_id'], ['tournament.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('tournament_id', 'sha256')
+    )
+    with op.batch_alter_table('game', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('fingerprint', sa.Text(), nullable=True))
+
+    # ### end Alembic commands ###
+    fill_fingerprints(op.get_bind())
+    with op.batch_alter_table('game', schema=None) as batch_op:
+        batch_op.create_index('ix_game_tournament_id_fingerprint', ['tournament_id', 'fingerprint'], unique=True)
+
+
+def downgrade():
+    # ### commands auto generated by Alembic - please adjust! ###
+    with op.batch_alter_table('game', schema=None) as batch_op:
+        batch_op.drop_index('ix_game_tournament_id_fingerprint')
+        batch_op.drop_column('fingerprint')
+
+    op.drop_table('tournament_upload')
+    # ### end Alembic commands ###
@@ -0,0 +1,29 @@
+"""Add lower case username index
+
+Revision ID: b8228f5033ed
+Revises: d8836c355da7
+Create Date: 2026-10-18 07:00:05.051533
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8228f5033ed'
+down_revision = 'd8836c355da7'
+branch_labels = None
+depends_on = None
+
+
+# Autogenerate can't compare expression indexes on SQLite, so this one is written by hand
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.create_index('ix_user_username_lower', [sa.text('lower(username)')], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_username_lower')
@@ -0,0 +1,47 @@
+"""Add tournament full text search index
+
+Revision ID: d8836c355da7
+Revises: 8e1f9c521611
+Create Date: 2026-10-18 06:56:57.774535
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd8836c355da7'
+down_revision = '8e1f9c521611'
+branch_labels = None
+depends_on = None
+
+
+# The FTS5 table indexes the tournament table as external content and is kept up
+# to date by triggers, see app/search.py
+
+
+def upgrade():
+    op.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS tournament_fts USING fts5(
+        title, description,
+        content='tournament', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )''')
+    op.execute('''CREATE TRIGGER IF NOT EXISTS tournament_fts_ai AFTER INSERT ON tournament BEGIN
+        INSERT INTO tournament_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END''')
+    op.execute('''CREATE TRIGGER IF NOT EXISTS tournament_fts_ad AFTER DELETE ON tournament BEGIN
+        INSERT INTO tournament_fts(tournament_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+    END''')
+    op.execute('''CREATE TRIGGER IF NOT EXISTS tournament_fts_au AFTER UPDATE ON tournament BEGIN
+        INSERT INTO tournament_fts(tournament_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO tournament_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END''')
+    # Index the existing tournaments
+    op.execute("INSERT INTO tournament_fts(tournament_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    op.execute('DROP TRIGGER IF EXISTS tournament_fts_au')
+    op.execute('DROP TRIGGER IF EXISTS tournament_fts_ad')
+    op.execute('DROP TRIGGER IF EXISTS tournament_fts_ai')
+    op.execute('DROP TABLE IF EXISTS tournament_fts')
@@ -0,0 +1,290 @@
+'''Fill the database with a production sized set of users, tournaments and games, for
+profiling the stats pages and search locally.
+
+csv_generator.py writes one tournament as a CSV to upload. This writes straight to the
+database with bulk inserts instead, so it can make thousands of tournaments and millions
+of GamePlayers rows in minutes:
+
+    users        each owns some tournaments (a few users own most of them) and has
+                 private tournaments shared with them by users in their community
+    teams        6 player rosters in regions. Every tournament draws its teams from
+                 one region, so teams meet again across tournaments
+    tournaments  mostly private, 8 to 64 team single-elimination brackets, each round
+                 best of 1 or best of 3. Stronger teams win more often and stronger
+                 players have better stats, so the leaderboards aren't flat
+
+The same seed and counts always generate the same data (in an empty database, the row
+ids match too), apart from the salt of the password hash. The statistics tables,
+brackets and ratings are rebuilt afterwards.
+Run seed.py first, the generator uses its heroes, maps, game modes, roles and
+visibilities. Every generated user's password is GENERATED_PASSWORD.
+
+    python scale_generator.py --users 5000 --tournaments 20000 --seed 1
+'''
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+import sqlalchemy as sa
+from werkzeug.security import generate_password_hash
+from app import app, db
+from app import models as m
+from app import aggregates
+from app import brackets
+from app import ratings
+from app.consts import ROLE
+from app.reference_cache import reference_cache
+from csv_generator import fetch_medals
+
+# Rows inserted per statement batch
+INSERT_BATCH = 10_000
+GENERATED_PASSWORD = 'password'
+
+# Teams that can meet in a tournament
+REGION_TEAMS = 128
+# Users who share private tournaments with each other
+COMMUNITY_USERS = 50
+PLAYERS_PER_TEAM = 6
+# Bracket sizes and how often they are picked
+TOURNAMENT_SIZES = {8: 50, 16: 30, 32: 15, 64: 5}
+# Share of users linked to one of the players
+PLAYER_ACCOUNT_SHARE = 0.2
+START = datetime(2024, 1, 1)
+
+PLACES = ['Northern', 'Southern', 'Eastern', 'Western', 'Coastal', 'Metro', 'Campus', 'Highland',
+          'Harbour', 'Valley', 'Summit', 'Riverside', 'Midnight', 'Weekend', 'Community', 'Open']
+SERIES = ['Invitational', 'Cup', 'Clash', 'League', 'Showdown', 'Masters', 'Championship',
+          'Scrims', 'Series', 'Qualifier', 'Brawl', 'Classic']
+TEAM_ADJECTIVES = ['Crimson', 'Iron', 'Silent', 'Golden', 'Frozen', 'Rogue', 'Cosmic', 'Savage',
+                   'Phantom', 'Neon', 'Shadow', 'Thunder', 'Velvet', 'Atomic', 'Lunar', 'Wild']
+TEAM_NOUNS = ['Wolves', 'Ravens', 'Titans', 'Vipers', 'Sentinels', 'Knights', 'Comets', 'Hydras',
+              'Falcons', 'Spectres', 'Rhinos', 'Giants', 'Cobras', 'Wardens', 'Jaguars', 'Storms']
+DESCRIPTIONS = [
+    'Weekly {series} for {place} teams.',
+    'Single elimination, {size} teams. Casters wanted!',
+    '{place} {series} season {season}, finals streamed on Saturday.',
+    'Practice bracket for the {place} league.',
+    'Open {series} with prizes for the top two teams.',
+]
+
+
+def first_id(model):
+    return (db.session.scalar(sa.select(sa.func.max(model.id))) or 0) + 1
+
+
+def random_date(rng, days=730):
+    return START + timedelta(days=rng.randrange(days), seconds=rng.randrange(86400))
+
+
+class Inserter:
+    '''Buffers rows per model and bulk inserts each buffer when it fills up. Buffers
+    are written parents first, so foreign keys always point at inserted rows.'''
+
+    def __init__(self, models):
+        self.rows = {model: [] for model in models}
+        self.counts = {model: 0 for model in models}
+
+    def add(self, model, row):
+        self.rows[model].append(row)
+        if len(self.rows[model]) >= INSERT_BATCH:
+            self.flush()
+
+    def flush(self):
+        for model, rows in self.rows.items():
+            if rows:
+                db.session.execute(sa.insert(model), rows)
+                self.counts[model] += len(rows)
+                rows.clear()
+
+
+def generate_users(rng, inserter, count, default_role_id, player_ids):
+    '''Returns the new user ids.'''
+    # Hashing is deliberately slow, so every user shares one hash
+    password_hash = generate_password_hash(GENERATED_PASSWORD)
+    start = first_id(m.User)
+    accounts = iter(rng.sample(player_ids, min(len(player_ids), int(count * PLAYER_ACCOUNT_SHARE))))
+    user_ids = []
+    for user_id in range(start, start + count):
+        created = random_date(rng)
+        inserter.add(m.User, {
+            'id': user_id, 'username': f'user{user_id}', 'email': f'user{user_id}@example.com',
+            'password_hash': password_hash, 'global_role_id': default_role_id,
+            'player_id': next(accounts, None), 'created_at': created, 'updated_at': created,
+        })
+        user_ids.append(user_id)
+    return user_ids
+
+
+def generate_teams(rng, inserter, count):
+    '''Returns [(team id, [(player id, skill)])] with each player's skill, which scales
+    their stats.'''
+    team_start, player_start = first_id(m.Team), first_id(m.Player)
+    teams = []
+    for i in range(count):
+        team_id = team_start + i
+        inserter.add(m.Team, {'id': team_id,
+                              'team_name': f'{rng.choice(TEAM_ADJECTIVES)} {rng.choice(TEAM_NOUNS)} {team_id}'})
+        roster = []
+        for j in range(PLAYERS_PER_TEAM):
+            player_id = player_start + i * PLAYERS_PER_TEAM + j
+            inserter.add(m.Player, {'id': player_id, 'gamertag': f'player{player_id}'})
+            roster.append((player_id, min(max(rng.gauss(1.0, 0.25), 0.4), 1.8)))
+        teams.append((team_id, roster))
+    return teams
+
+
+def player_row(rng, game_id, team_id, player_id, skill, hero_id):
+    def stat(low, high):
+        return int(rng.randint(low, high) * skill)
+
+    return {
+        'game_id': game_id, 'player_id': player_id, 'team_id': team_id, 'hero_id': hero_id,
+        'kills': stat(0, 30), 'deaths': int(rng.randint(0, 30) / skill), 'assists': stat(0, 30),
+        'final_hits': stat(0, 30), 'damage': stat(1000, 10000), 'damage_blocked': stat(0, 10000),
+        'healing': stat(0, 10000), 'accuracy_pct': min(stat(0, 100), 100),
+    }
+
+
+def generate_games(rng, inserter, tournament_id, teams, game_id, ref):
+    '''Play a single-elimination bracket between the teams, from game_id on. Returns
+    the next free game id.'''
+    strength = {team_id: sum(skill for _, skill in roster) / len(roster) for team_id, roster in teams}
+    rosters = dict(teams)
+    round_teams = [team_id for team_id, _ in teams]
+    best_of = rng.choice((1, 3))
+    round_number = 1
+    while len(round_teams) > 1:
+        next_round = []
+        for team_a, team_b in zip(round_teams[::2], round_teams[1::2]):
+            a, b = strength[team_a] ** 4, strength[team_b] ** 4
+            wins = {team_a: 0, team_b: 0}
+            while max(wins.values()) <= best_of // 2:
+                winner, loser = (team_a, team_b) if rng.random() < a / (a + b) else (team_b, team_a)
+                wins[winner] += 1
+                inserter.add(m.Game, {
+                    'id': game_id, 'tournament_id': tournament_id, 'round': round_number,
+                    'team_a_id': team_a, 'team_b_id': team_b, 'winning_team': winner, 'is_draw': False,
+                    'game_mode_id': rng.choice(ref['modes']), 'map_id': rng.choice(ref['maps']),
+                })
+                heroes = iter(rng.sample(ref['heroes'], 2 * PLAYERS_PER_TEAM))
+                for team_id in (team_a, team_b):
+                    for player_id, skill in rosters[team_id]:
+                        inserter.add(m.GamePlayers, player_row(rng, game_id, team_id, player_id, skill, next(heroes)))
+                players = [player_id for team_id in (team_a, team_b) for player_id, _ in rosters[team_id]]
+                for medal, player_id in (
+                    ('MVP', rng.choice(rosters[winner])[0]),
+                    ('SVP', rng.choice(rosters[loser])[0]),
+                    *((medal, rng.choice(players)) for medal in ref['medals'] if medal not in ('MVP', 'SVP')),
+                ):
+                    inserter.add(m.GameMedals, {'game_id': game_id, 'medal_id': ref['medal_ids'][medal],
+                                                'player_id': player_id})
+                game_id += 1
+            next_round.append(team_a if wins[team_a] > wins[team_b] else team_b)
+        round_teams = next_round
+        round_number += 1
+    return game_id
+
+
+def reference_ids():
+    heroes = sorted(reference_cache.get_ids(m.Hero, reference_cache.names(m.Hero)).values())
+    if len(heroes) < 2 * PLAYERS_PER_TEAM:
+        raise RuntimeError('Not enough heroes for a game, run seed.py first')
+    medals = fetch_medals()
+    return {
+        'heroes': heroes,
+        'maps': sorted(reference_cache.get_ids(m.Map, reference_cache.names(m.Map)).values()),
+        'modes': sorted(reference_cache.get_ids(m.GameMode, reference_cache.names(m.GameMode)).values()),
+        'medals': medals,
+        'medal_ids': m.Medal.get_or_create_ids('medal_name', medals),
+        'roles': m.Role.get_ids('role_name', [role.value for role in ROLE]),
+        'visibility': m.Visibility.get_ids('visibility', ['public', 'private']),
+    }
+
+
+def generate(seed, users, tournaments, teams=None, private_share=0.7, max_shares=20, stats=True):
+    '''Insert the generated data and commit it. teams defaults to one team per 4
+    tournaments, and at least one region's worth. Returns {table name: rows inserted}.'''
+    rng = random.Random(seed)
+    ref = reference_ids()
+    if len(ref['roles']) < len(ROLE) or len(ref['visibility']) < 2:
+        raise RuntimeError('Roles and visibilities are missing, run seed.py first')
+    teams = teams or max(tournaments // 4, REGION_TEAMS)
+
+    inserter = Inserter([m.Team, m.Player, m.User, m.Tournament, m.TournamentUsers, m.Game,
+                         m.GamePlayers, m.GameMedals])
+    try:
+        team_rosters = generate_teams(rng, inserter, teams)
+        player_ids = [player_id for _, roster in team_rosters for player_id, _ in roster]
+        user_ids = generate_users(rng, inserter, users, ref['roles'][ROLE.DEFAULT.value], player_ids)
+        regions = [team_rosters[i:i + REGION_TEAMS] for i in range(0, len(team_rosters), REGION_TEAMS)]
+
+        tournament_id, game_id = first_id(m.Tournament), first_id(m.Game)
+        for _ in range(tournaments):
+            # Cubing skews owners towards the first users, so a few own most tournaments
+            owner = int(len(user_ids) * rng.random() ** 3)
+            private = rng.random() < private_share
+            region = rng.choice(regions)
+            size = rng.choices(list(TOURNAMENT_SIZES), weights=list(TOURNAMENT_SIZES.values()))[0]
+            # Small regions get the largest bracket that fits
+            while size > len(region):
+                size //= 2
+            place, series = rng.choice(PLACES), rng.choice(SERIES)
+            start_time = random_date(rng)
+            inserter.add(m.Tournament, {
+                'id': tournament_id, 'title': f'{place} {series} {tournament_id}',
+                'description': rng.choice(DESCRIPTIONS).format(place=place, series=series, size=size,
+                                                               season=rng.randint(1, 9)),
+                'visibility_id': ref['visibility']['private' if private else 'public'],
+                'created_at': start_time - timedelta(days=rng.randint(1, 60)), 'start_time': start_time,
+            })
+
+            inserter.add(m.TournamentUsers, {'tournament_id': tournament_id, 'user_id': user_ids[owner],
+                                             'tournament_role_id': ref['roles'][ROLE.OWNER.value]})
+            if private:
+                # Most private tournaments are shared with a few people, some with many
+                shares = min(int(rng.paretovariate(1.2)) - 1, max_shares)
+                community = owner - owner % COMMUNITY_USERS
+                members = [i for i in range(community, min(community + COMMUNITY_USERS, len(user_ids))) if i != owner]
+                for member in rng.sample(members, min(shares, len(members))):
+                    inserter.add(m.TournamentUsers, {'tournament_id': tournament_id, 'user_id': user_ids[member],
+                                                     'tournament_role_id': ref['roles'][ROLE.DEFAULT.value]})
+
+            game_id = generate_games(rng, inserter, tournament_id, rng.sample(region, size), game_id, ref)
+            tournament_id += 1
+        inserter.flush()
+
+        if stats:
+            aggregates.rebuild()
+            brackets.rebuild()
+            ratings.rebuild()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return {model.__tablename__: count for model, count in inserter.counts.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fill the database with generated users, tournaments and games.')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--tournaments', type=int, default=2000)
+    parser.add_argument('--teams', type=int, help='Default: one per 4 tournaments, at least %d.' % REGION_TEAMS)
+    parser.add_argument('--private-share', type=float, default=0.7, help='Share of private tournaments.')
+    parser.add_argument('--max-shares', type=int, default=20, help='Most users a private tournament is shared with.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-stats', action='store_true',
+                        help="Don't rebuild the statistics, brackets and ratings (see `flask stats`).")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    with app.app_context():
+        counts = generate(args.seed, args.users, args.tournaments, args.teams, args.private_share,
+                          args.max_shares, stats=not args.no_stats)
+    for table, count in counts.items():
+        print(f'{table:<20} {count:>12,}')
+    print(f'Generated in {time.perf_counter() - start:.1f}s.', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
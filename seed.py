@@ -5,6 +5,8 @@ from app.consts import *
 from app.models import Role, Hero, HeroRole, GameMode, Visibility, Map, Permission, RolePermissions
 import sqlalchemy as sa
 import sqlalchemy.exc as sa_exc
+from app.reference_cache import reference_cache
+from app.permissions import role_matrix
 
 def db_add_hero(hero_name: str, hero_role: str, hero_image:str=None):
     hero_exists = db.session.query(Hero).filter(Hero.hero_name.ilike(hero_name.casefold())).first()
@@ -83,6 +85,9 @@ def reset_tables(model_list):
             db.session.query(model).delete()
     
         db.session.commit()
+        # Bulk deletes don't trigger the caches' model events
+        reference_cache.invalidate()
+        role_matrix.invalidate()
     
     except:
         print(f"Reset failed - rolled back changes.")
@@ -100,4 +105,4 @@ if __name__ == '__main__':
         Visibility.populate_with_list('visibility', ['public', 'private'])
         map_list = [map_item['name'] for gamemode in MAPS.values() for map_item in gamemode]
         Map.populate_with_list('map_name', map_list, use_casefold=False)
-        populate_heros()
\ No newline at end of file
+        populate_heros()